@@ -0,0 +1,10 @@
+"""
+Benchmarks for the cafe_arna FastAPI/Django stack.
+
+Run them from the project directory (next to manage.py), e.g.
+
+    python -m benchmarks.crud_concurrency
+
+They use ``benchmarks.settings`` which points Django at a throwaway SQLite
+database, so nothing here ever touches the MySQL instance from ``.env``.
+"""
@@ -0,0 +1,103 @@
+"""
+Admin changelist throughput with Django mounted under /django through
+WSGIMiddleware (the old set-up) vs natively with get_asgi_application.
+
+Both apps are driven in-process over httpx's ASGI transport with a logged
+in superuser session, so the difference is the mounting overhead plus
+whatever the WSGI adapter's thread hop and body buffering cost.
+
+    python -m benchmarks.admin_mount --cafes 2000 --requests 500 --concurrency 10
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import report, seed_cafes, setup, summarize
+
+CHANGELISTS = ("/django/admin/cafes/cafe/", "/django/admin/cafes/menuitem/")
+
+
+def session_cookie() -> dict:
+    """
+    Session cookie of a benchmark superuser, created on first use.
+    """
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    User = get_user_model()
+    user = User.objects.filter(username="bench-admin").first()
+    if user is None:
+        user = User.objects.create_superuser(
+            username="bench-admin", email="admin@bench.local", password="bench-password"
+        )
+    client = Client()
+    client.force_login(user)
+    return {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+
+def mounted_apps():
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    from starlette.applications import Starlette
+    from starlette.middleware.wsgi import WSGIMiddleware
+    from starlette.routing import Mount
+
+    return {
+        "WSGIMiddleware": Starlette(
+            routes=[Mount("/django", WSGIMiddleware(get_wsgi_application()))]
+        ),
+        "native ASGI": Starlette(routes=[Mount("/django", get_asgi_application())]),
+    }
+
+
+async def drive(app, cookies: dict, total: int, concurrency: int) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost", cookies=cookies
+    ) as client:
+        # Warm up: URL resolution, template loading, first connection
+        for path in CHANGELISTS:
+            response = await client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(CHANGELISTS[i % len(CHANGELISTS)])
+                samples.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    stats = summarize(samples)
+    stats["req_per_s"] = total / elapsed
+    return stats
+
+
+async def main(args, cookies: dict) -> None:
+    rows = {}
+    for name, app in mounted_apps().items():
+        rows[name] = await drive(app, cookies, args.requests, args.concurrency)
+    report(
+        f"Admin changelists, {args.requests} requests at concurrency {args.concurrency}",
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cafes", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    seed_cafes(args.cafes)
+    asyncio.run(main(args, session_cookie()))
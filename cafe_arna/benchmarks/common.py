@@ -0,0 +1,115 @@
+import os
+import statistics
+import time
+from datetime import time as dt_time
+from typing import Callable, Dict, List
+
+import django
+
+
+def setup() -> None:
+    """
+    Configure Django for a benchmark run and bring the schema up to date.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command("migrate", verbosity=0)
+    # Readers don't block writers in WAL mode; the setting sticks to the file
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+
+def seed_cafes(count: int, batch_size: int = 5000) -> None:
+    """
+    Make sure at least `count` cafes exist, inserting the missing ones in bulk.
+    """
+    from cafes.models import Cafe
+
+    existing = Cafe.objects.count()
+    for start in range(existing, count, batch_size):
+        stop = min(start + batch_size, count)
+        Cafe.objects.bulk_create(
+            [
+                Cafe(
+                    name=f"Cafe {i:07d}",
+                    location=f"Street {i % 500}",
+                    slug=f"cafe-{i:07d}",
+                    # Spread of hours, about a sixth of them open past midnight
+                    opening_time=dt_time(5 + i % 6, 30 * (i % 2)),
+                    closing_time=dt_time((17 + i % 10) % 24, 0),
+                )
+                for i in range(start, stop)
+            ]
+        )
+
+
+def seed_menu_items(count: int, per_cafe: int = 50, batch_size: int = 5000) -> None:
+    """
+    Make sure at least `count` menu items exist, spread `per_cafe` per cafe.
+    """
+    from cafes.models import Cafe, MenuItem
+
+    seed_cafes(-(-count // per_cafe))
+    cafe_ids = list(Cafe.objects.order_by("id").values_list("id", flat=True))
+    existing = MenuItem.objects.count()
+    for start in range(existing, count, batch_size):
+        stop = min(start + batch_size, count)
+        MenuItem.objects.bulk_create(
+            [
+                MenuItem(
+                    cafe_id=cafe_ids[i // per_cafe],
+                    name=f"Item {i:08d}",
+                    description="Seeded by the benchmark suite",
+                    price=(i % 2000) / 100,
+                )
+                for i in range(start, stop)
+            ]
+        )
+
+
+def timed(func: Callable, repeat: int) -> List[float]:
+    """
+    Call `func` `repeat` times and return the wall time of each call in ms.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Reduce a list of millisecond samples to the usual latency percentiles.
+    """
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def report(title: str, rows: Dict[str, Dict[str, float]]) -> None:
+    """
+    Print a small aligned table of benchmark results.
+    """
+    print(f"\n{title}")
+    print("-" * len(title))
+    for name, stats in rows.items():
+        cells = "  ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in stats.items()
+        )
+        print(f"{name:<32} {cells}")
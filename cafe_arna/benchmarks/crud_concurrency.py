@@ -0,0 +1,82 @@
+"""
+Compare concurrent-request throughput of the sync and async CRUD paths.
+
+The sync path is dispatched the way FastAPI runs a plain ``def`` endpoint
+(``run_in_threadpool``); the async path awaits the async CRUD directly.
+Both run without the CRUD cache, so every call reaches the database.
+
+    python -m benchmarks.crud_concurrency --cafes 2000 --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import report, seed_cafes, setup, summarize
+
+
+async def drive(call, slugs, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call(random.choice(slugs))
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    stats = summarize(samples)
+    stats["req_per_s"] = total / elapsed
+    return stats
+
+
+async def main(args, slugs) -> None:
+    from starlette.concurrency import run_in_threadpool
+    from cafes.cafe_api import AsyncCafeCRUD, CafeCRUD
+    from cafes.models import Cafe
+
+    cafe_crud, async_cafe_crud = CafeCRUD(Cafe), AsyncCafeCRUD(Cafe)
+
+    async def sync_get(slug):
+        return await run_in_threadpool(cafe_crud.get, slug)
+
+    async def async_get(slug):
+        return await async_cafe_crud.get(slug)
+
+    async def sync_list(_):
+        return await run_in_threadpool(cafe_crud.get_multiple, 10, random.randrange(args.cafes - 10))
+
+    async def async_list(_):
+        return await async_cafe_crud.get_multiple(10, random.randrange(args.cafes - 10))
+
+    rows = {}
+    for name, call in (
+        ("get (sync/threadpool)", sync_get),
+        ("get (async ORM)", async_get),
+        ("get_multiple (sync/threadpool)", sync_list),
+        ("get_multiple (async ORM)", async_list),
+    ):
+        rows[name] = await drive(call, slugs, args.requests, args.concurrency)
+    report(
+        f"CRUD throughput, {args.requests} requests at concurrency {args.concurrency}",
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cafes", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    seed_cafes(args.cafes)
+
+    from cafes.models import Cafe
+
+    slugs = list(Cafe.objects.values_list("slug", flat=True)[: args.cafes])
+    asyncio.run(main(args, slugs))
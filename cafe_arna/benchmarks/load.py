@@ -0,0 +1,253 @@
+"""
+In-process load test of the FastAPI app from cafe_arna.asgi.get_application.
+
+Requests go through the whole ASGI stack (middleware, pool dependency,
+routing, validation, serialization) over httpx's ASGI transport, against a
+SQLite database seeded with `--cafes` cafes and `--menu-items` menu items.
+`--concurrency` clients send `--requests` requests in total, each picking an
+operation by the weights of the chosen `--mix`. Latency percentiles and
+requests/s are reported per route.
+
+`--save` writes the results as JSON with stable key order, so a baseline
+kept in git diffs cleanly; `--compare` prints the change against one.
+
+    python -m benchmarks.load --mix read --requests 5000 --concurrency 20 \\
+        --save benchmarks/baselines/read.json
+    python -m benchmarks.load --mix read --compare benchmarks/baselines/read.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.common import report, seed_cafes, seed_menu_items, setup, summarize
+
+API = "/api/fa/v1/cafes"
+
+
+class Context:
+    """
+    What the operations need: the client, the seeded rows and a random
+    source seeded from `--seed`, so two runs send the same requests.
+    """
+
+    def __init__(self, client, slugs: List[str], item_ids: List[int], seed: int):
+        self.client = client
+        self.slugs = slugs
+        self.item_ids = item_ids
+        self.random = random.Random(seed)
+        self.run = f"{seed}-{int(time.time())}"
+        self.created = 0
+
+
+async def list_cafes(ctx: Context):
+    return await ctx.client.get(f"{API}/cafes/", params={"limit": 20})
+
+
+async def cafe_detail(ctx: Context):
+    return await ctx.client.get(f"{API}/cafes/{ctx.random.choice(ctx.slugs)}/")
+
+
+async def list_menu_items(ctx: Context):
+    return await ctx.client.get(f"{API}/menu-items/", params={"limit": 50})
+
+
+async def cafe_menu(ctx: Context):
+    return await ctx.client.get(f"{API}/cafes/{ctx.random.choice(ctx.slugs)}/menu-items/")
+
+
+async def batched_menus(ctx: Context):
+    slugs = ctx.random.sample(ctx.slugs, min(5, len(ctx.slugs)))
+    return await ctx.client.get(f"{API}/menus/", params={"slugs": slugs})
+
+
+async def create_menu_item(ctx: Context):
+    ctx.created += 1
+    item = {"name": f"Load {ctx.run} {ctx.created}", "price": 4.5, "is_available": True}
+    return await ctx.client.post(
+        f"{API}/cafes/{ctx.random.choice(ctx.slugs)}/menu-items/bulk/", json=[item]
+    )
+
+
+async def update_menu_item(ctx: Context):
+    item_id = ctx.random.choice(ctx.item_ids)
+    item = {
+        "id": item_id,
+        "name": f"Item {item_id} {ctx.random.randrange(10**6)}",
+        "price": ctx.random.randrange(100, 2000) / 100,
+        "is_available": True,
+    }
+    return await ctx.client.put(f"{API}/menu-items/bulk/", json=[item])
+
+
+# Route label -> operation
+OPERATIONS: Dict[str, Callable[[Context], Awaitable]] = {
+    "GET /cafes/": list_cafes,
+    "GET /cafes/{slug}/": cafe_detail,
+    "GET /menu-items/": list_menu_items,
+    "GET /cafes/{slug}/menu-items/": cafe_menu,
+    "GET /menus/": batched_menus,
+    "POST /cafes/{slug}/menu-items/bulk/": create_menu_item,
+    "PUT /menu-items/bulk/": update_menu_item,
+}
+
+# Traffic mixes: relative weight of each route
+MIXES: Dict[str, Dict[str, int]] = {
+    "read": {
+        "GET /cafes/": 20,
+        "GET /cafes/{slug}/": 10,
+        "GET /menu-items/": 20,
+        "GET /cafes/{slug}/menu-items/": 40,
+        "GET /menus/": 10,
+    },
+    "mixed": {
+        "GET /cafes/": 25,
+        "GET /menu-items/": 15,
+        "GET /cafes/{slug}/menu-items/": 30,
+        "GET /menus/": 10,
+        "POST /cafes/{slug}/menu-items/bulk/": 10,
+        "PUT /menu-items/bulk/": 10,
+    },
+    "write": {
+        "GET /cafes/{slug}/menu-items/": 40,
+        "POST /cafes/{slug}/menu-items/bulk/": 30,
+        "PUT /menu-items/bulk/": 30,
+    },
+}
+
+
+async def run(app, ctx_args: dict, mix: Dict[str, int], total: int, concurrency: int) -> dict:
+    import httpx
+
+    routes, weights = list(mix), list(mix.values())
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        ctx = Context(client, **ctx_args)
+        # Warm up every route once: imports, first queries, lazy indexes
+        for route in routes:
+            await OPERATIONS[route](ctx)
+
+        remaining = total
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                route = ctx.random.choices(routes, weights)[0]
+                start = time.perf_counter()
+                response = await OPERATIONS[route](ctx)
+                samples[route].append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors[route] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    results = {}
+    for route in routes:
+        if not samples[route]:
+            continue
+        stats = summarize(samples[route])
+        stats["req_per_s"] = len(samples[route]) / elapsed
+        stats["errors"] = errors[route]
+        results[route] = stats
+    overall = summarize([sample for route in routes for sample in samples[route]])
+    overall["req_per_s"] = total / elapsed
+    overall["errors"] = sum(errors.values())
+    results["(all)"] = overall
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Print the change of each route against `baseline`; returns whether any
+    latency percentile or throughput regressed by more than `tolerance`.
+    """
+    regressed = False
+    print("\nChange against baseline")
+    print("-----------------------")
+    for route, stats in results.items():
+        before = baseline.get("routes", {}).get(route)
+        if before is None:
+            print(f"{route:<40} (new)")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "req_per_s"):
+            change = (stats[key] - before[key]) / before[key] if before[key] else 0.0
+            worse = change < -tolerance if key == "req_per_s" else change > tolerance
+            regressed |= worse
+            cells.append(f"{key}={change:+.1%}{' !' if worse else ''}")
+        print(f"{route:<40} " + "  ".join(cells))
+    return regressed
+
+
+def main(args) -> int:
+    from cafe_arna.asgi import get_application
+    from cafes.models import Cafe, MenuItem
+
+    mix = MIXES[args.mix]
+    ctx_args = {
+        "slugs": list(Cafe.objects.order_by("id").values_list("slug", flat=True)[: args.cafes]),
+        "item_ids": list(
+            MenuItem.objects.order_by("id").values_list("id", flat=True)[: args.menu_items]
+        ),
+        "seed": args.seed,
+    }
+    results = asyncio.run(
+        run(get_application(), ctx_args, mix, args.requests, args.concurrency)
+    )
+    report(
+        f"Load mix '{args.mix}', {args.requests} requests at concurrency {args.concurrency}",
+        results,
+    )
+
+    config = {
+        key: getattr(args, key)
+        for key in ("mix", "cafes", "menu_items", "requests", "concurrency", "seed")
+    }
+    if args.save:
+        rounded = {
+            route: {key: round(value, 3) for key, value in stats.items()}
+            for route, stats in results.items()
+        }
+        with open(args.save, "w") as baseline:
+            json.dump({"config": config, "routes": rounded}, baseline, indent=2, sort_keys=True)
+            baseline.write("\n")
+    if args.compare:
+        with open(args.compare) as baseline:
+            stored = json.load(baseline)
+        if stored.get("config") != config:
+            print(f"\nNote: the baseline was run with {stored.get('config')}")
+        if compare(results, stored, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--cafes", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10, help="relative change counted as a regression"
+    )
+    args = parser.parse_args()
+
+    setup()
+    seed_cafes(args.cafes)
+    seed_menu_items(args.menu_items, per_cafe=max(1, args.menu_items // args.cafes))
+    sys.exit(main(args))
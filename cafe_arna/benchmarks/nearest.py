@@ -0,0 +1,78 @@
+"""
+k-NN latency of the in-process cafe grid index vs a linear scan, with the
+points held in memory (the database only loads the matched cafes).
+
+    python -m benchmarks.nearest --sizes 10000 1000000 --k 10
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import report, setup, summarize, timed
+
+
+def city_points(count: int, seed: int = 7):
+    """
+    `count` cafes scattered over a ~30 km square, denser towards its centre.
+    """
+    rnd = random.Random(seed)
+    return [
+        (12.97 + rnd.gauss(0, 0.06), 77.59 + rnd.gauss(0, 0.06)) for _ in range(count)
+    ]
+
+
+def main(args) -> None:
+    from cafes.geo import SpatialIndex, haversine_km
+    from cafes.models import Cafe
+
+    rnd = random.Random(11)
+    queries = [(12.97 + rnd.gauss(0, 0.05), 77.59 + rnd.gauss(0, 0.05)) for _ in range(args.repeat)]
+    for size in args.sizes:
+        points = city_points(size)
+        index = SpatialIndex(Cafe, cell_degrees=args.cell)
+        start = time.perf_counter()
+        for pk, (lat, lng) in enumerate(points):
+            index.insert(pk, lat, lng)
+        index.built = True
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def linear(lat, lng):
+            return sorted(
+                (haversine_km(lat, lng, plat, plng), pk)
+                for pk, (plat, plng) in enumerate(points)
+            )[: args.k]
+
+        samples = iter(queries)
+        rows = {
+            f"grid k={args.k}": summarize(
+                timed(lambda: index.nearest(*next(samples), k=args.k), args.repeat)
+            ),
+        }
+        samples = iter(queries)
+        rows[f"grid within {args.radius} km"] = summarize(
+            timed(
+                lambda: index.nearest(*next(samples), k=100, radius_km=args.radius),
+                args.repeat,
+            )
+        )
+        scans = min(args.repeat, max(3, 2_000_000 // size))
+        samples = iter(queries)
+        rows[f"linear scan k={args.k}"] = summarize(timed(lambda: linear(*next(samples)), scans))
+        report(
+            f"Nearest cafes, {size} cafes, {len(index.cells)} cells of "
+            f"{args.cell} deg, built in {build_ms:.0f} ms",
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius", type=float, default=2.0)
+    parser.add_argument("--cell", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    main(args)
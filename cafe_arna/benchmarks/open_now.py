@@ -0,0 +1,76 @@
+"""
+Latency of the "open now" cafe filter: loading every cafe and comparing
+times in Python vs the indexed opening-interval query.
+
+    python -m benchmarks.open_now --cafes 100000
+"""
+import argparse
+from datetime import time
+
+from benchmarks.common import report, seed_cafes, setup, summarize, timed
+
+
+def open_in_python(moment: time):
+    from cafes.models import Cafe
+
+    open_ids = []
+    for pk, opening, closing in Cafe.objects.values_list(
+        "pk", "opening_time", "closing_time"
+    ).iterator(chunk_size=5000):
+        if opening == closing:
+            open_ids.append(pk)
+        elif opening < closing:
+            if opening <= moment < closing:
+                open_ids.append(pk)
+        elif moment >= opening or moment < closing:
+            open_ids.append(pk)
+    return open_ids
+
+
+def main(args) -> None:
+    from cafe_arna.pagination import keyset_filter
+    from cafes.models import Cafe, OpeningInterval
+    from cafes.opening_hours import rebuild_opening_intervals
+
+    # Seeded cafes are bulk inserted, which skips the post_save hook
+    if not OpeningInterval.objects.exists() or args.rebuild:
+        rebuild_opening_intervals(Cafe, OpeningInterval)
+
+    rows = {}
+    for moment in (time(3, 0), time(12, 0), time(23, 30)):
+        label = moment.strftime("%H:%M")
+        expected = sorted(open_in_python(moment))
+        found = sorted(Cafe.objects.all().open_at(moment).values_list("pk", flat=True))
+        assert found == expected, f"open_at({label}) disagrees with the Python filter"
+
+        rows[f"python scan {label} ({len(expected)})"] = summarize(
+            timed(lambda: open_in_python(moment), args.repeat)
+        )
+        rows[f"interval query {label}"] = summarize(
+            timed(
+                lambda: list(Cafe.objects.all().open_at(moment).values_list("pk", flat=True)),
+                args.repeat,
+            )
+        )
+        rows[f"first page {label}"] = summarize(
+            timed(
+                lambda: list(
+                    keyset_filter(Cafe.objects.all().open_at(moment), None)[: args.limit + 1]
+                ),
+                args.repeat,
+            )
+        )
+    report(f"Open-now filter, {args.cafes} cafes", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cafes", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    setup()
+    seed_cafes(args.cafes)
+    main(args)
@@ -0,0 +1,51 @@
+"""
+Latency of a deep menu-items page with offset pagination vs keyset cursors.
+
+    python -m benchmarks.pagination --rows 1000000 --page 1000 --limit 10
+"""
+import argparse
+
+from benchmarks.common import report, seed_menu_items, setup, summarize, timed
+
+
+def main(args) -> None:
+    from cafe_arna.pagination import KEYSET_FIELDS, encode_cursor
+    from cafes.cafe_api import menu_item_crud
+    from cafes.models import MenuItem
+
+    offset = args.page * args.limit
+    # Boundary row of the previous page, i.e. what a client would hold as cursor
+    boundary = (
+        MenuItem.objects.order_by(*KEYSET_FIELDS)
+        .values_list(*KEYSET_FIELDS)[offset - 1]
+    )
+    cursor = encode_cursor(boundary)
+
+    rows = {
+        f"offset page {args.page}": summarize(
+            timed(
+                lambda: menu_item_crud.get_multiple(limit=args.limit, offset=offset),
+                args.repeat,
+            )
+        ),
+        f"keyset page {args.page}": summarize(
+            timed(
+                lambda: menu_item_crud.get_page(limit=args.limit, cursor=cursor),
+                args.repeat,
+            )
+        ),
+    }
+    report(f"Menu items, {args.rows} rows, limit {args.limit}", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    seed_menu_items(args.rows)
+    main(args)
@@ -0,0 +1,332 @@
+"""
+Query plan regression check for the cafes schema.
+
+Runs each CRUD, manager and admin changelist read against a seeded
+database, captures the SQL it sends, and EXPLAINs every SELECT. The run
+fails (exit status 1) when a plan reads a whole table of checked_tables(),
+or sorts rows an index could have returned in order. A full index scan
+is accepted only for a query with a LIMIT: it is an ordered walk that
+stops early.
+
+Plans are read from SQLite's EXPLAIN QUERY PLAN, MySQL's EXPLAIN and
+PostgreSQL's EXPLAIN. The tables are ANALYZEd first, so the planner sees
+realistic statistics. To check MySQL's plans, point DJANGO_SETTINGS_MODULE
+at settings for a scratch MySQL database.
+
+    python -m benchmarks.query_plans --cafes 2000 --menu-items 50000 --users 2000
+"""
+import argparse
+import re
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import quote
+
+from benchmarks.common import seed_cafes, seed_menu_items, setup
+
+
+class Sample(NamedTuple):
+    """
+    Values the operations look up: one cafe from the middle of the table,
+    a few of its neighbours, list cursors from halfway down, and an admin
+    client logged in as a superuser.
+    """
+
+    slug: str
+    slugs: List[str]
+    cafe_cursor: str
+    menu_item_cursor: str
+    created_after: str
+    admin: Any
+
+
+class Operation(NamedTuple):
+    run: Callable[[Sample], Any]
+    # The query is expected to sort (e.g. a batch of several cafes' menus)
+    sorts: bool = False
+    # Backends whose plan is checked; all of them by default
+    vendors: Optional[Tuple[str, ...]] = None
+
+
+def admin_get(path: str) -> Callable[[Sample], Any]:
+    def run(sample: Sample) -> Any:
+        response = sample.admin.get(path.format(sample=sample))
+        assert response.status_code == 200, (path, response.status_code)
+
+    return run
+
+
+def crud_operations() -> Dict[str, Operation]:
+    from cafes.cafe_api import cafe_crud, menu_item_crud
+    from cafes.models import Cafe, MenuItem
+
+    return {
+        "CafeCRUD.get": Operation(lambda s: cafe_crud.get(s.slug)),
+        "CafeCRUD.get_version": Operation(lambda s: cafe_crud.get_version(s.slug)),
+        "CafeCRUD.get_page": Operation(lambda s: cafe_crud.get_page(limit=20)),
+        "CafeCRUD.get_page (cursor)": Operation(
+            lambda s: cafe_crud.get_page(limit=20, cursor=s.cafe_cursor)
+        ),
+        "Cafe.objects.active": Operation(lambda s: list(Cafe.objects.active()[:20])),
+        # The open cafes come from the interval indexes, then sort by name
+        "Cafe.objects.open_now": Operation(
+            lambda s: list(Cafe.objects.open_now()[:20]), sorts=True
+        ),
+        "MenuItem.objects.active": Operation(lambda s: list(MenuItem.objects.active()[:20])),
+        "MenuItemCRUD.get_page": Operation(lambda s: menu_item_crud.get_page(limit=50)),
+        "MenuItemCRUD.get_page (cursor)": Operation(
+            lambda s: menu_item_crud.get_page(limit=50, cursor=s.menu_item_cursor)
+        ),
+        "MenuItemCRUD.get_by_cafe": Operation(lambda s: menu_item_crud.get_by_cafe(s.slug)),
+        # Rows of several cafes interleave by name, so this sorts its batch
+        "MenuItemCRUD.get_by_cafes": Operation(
+            lambda s: menu_item_crud.get_by_cafes(s.slugs), sorts=True
+        ),
+        "MenuItemCRUD.get_menu_document": Operation(
+            lambda s: menu_item_crud.get_menu_document(s.slug)
+        ),
+    }
+
+
+def admin_operations() -> Dict[str, Operation]:
+    return {
+        "admin cafes": Operation(admin_get("/admin/cafes/cafe/")),
+        "admin cafes (is_active)": Operation(admin_get("/admin/cafes/cafe/?is_active__exact=1")),
+        "admin cafes (created_on)": Operation(
+            admin_get("/admin/cafes/cafe/?created_on__gte={sample.created_after}")
+        ),
+        # SQLite never uses an index for LIKE ... ESCAPE, and PostgreSQL only
+        # with an UPPER() expression index
+        "admin cafes (prefix search)": Operation(
+            admin_get("/admin/cafes/cafe/?q=Cafe+00001"), vendors=("mysql",)
+        ),
+        "admin menu items (prefix search)": Operation(
+            admin_get("/admin/cafes/menuitem/?q=Item+0001"), vendors=("mysql",)
+        ),
+        "admin menu items": Operation(admin_get("/admin/cafes/menuitem/")),
+        "admin menu items (is_available)": Operation(
+            admin_get("/admin/cafes/menuitem/?is_available__exact=1")
+        ),
+        "admin menu items (created_on)": Operation(
+            admin_get("/admin/cafes/menuitem/?created_on__gte={sample.created_after}")
+        ),
+        "admin users": Operation(admin_get("/admin/auth/user/")),
+    }
+
+
+def checked_tables() -> Set[str]:
+    from django.contrib.auth import get_user_model
+    from cafes.models import Cafe, MenuDocument, MenuItem, OpeningInterval
+
+    return {
+        model._meta.db_table
+        for model in (Cafe, MenuItem, MenuDocument, OpeningInterval, get_user_model())
+    }
+
+
+def explain(connection, sql: str) -> List[str]:
+    """
+    Problems in the plan of `sql`: full scans of checked tables and sorts.
+    Sorts are reported as "sort" so the caller can accept expected ones.
+    """
+    tables = checked_tables()
+    limited = " LIMIT " in sql.upper()
+    problems = []
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            for *_, detail in cursor.fetchall():
+                scan = re.match(r"SCAN (\w+)( USING (COVERING )?INDEX (\w+))?", detail)
+                if scan and scan.group(1) in tables:
+                    if scan.group(2) is None:
+                        problems.append(f"full scan: {detail}")
+                    elif not limited:
+                        problems.append(f"full index scan: {detail}")
+                if detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+                    problems.append(f"sort: {detail}")
+        elif connection.vendor == "mysql":
+            cursor.execute(f"EXPLAIN {sql}")
+            columns = [column[0].lower() for column in cursor.description]
+            for values in cursor.fetchall():
+                row = dict(zip(columns, values))
+                detail = f"{row['table']} type={row['type']} key={row['key']} extra={row['extra']}"
+                if row["table"] in tables:
+                    if row["type"] == "ALL":
+                        problems.append(f"full scan: {detail}")
+                    elif row["type"] == "index" and not limited:
+                        problems.append(f"full index scan: {detail}")
+                if "Using filesort" in (row["extra"] or ""):
+                    problems.append(f"sort: {detail}")
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"EXPLAIN {sql}")
+            for (line,) in cursor.fetchall():
+                scan = re.search(r"Seq Scan on (\w+)", line)
+                if scan and scan.group(1) in tables:
+                    problems.append(f"full scan: {line.strip()}")
+                if re.match(r"\s*(->\s+)?Sort\b", line):
+                    problems.append(f"sort: {line.strip()}")
+        else:
+            raise SystemExit(f"No plan check for the {connection.vendor} backend")
+    return problems
+
+
+def check(operations: Dict[str, Operation], sample: Sample, verbose: bool) -> int:
+    """
+    Run and EXPLAIN each operation; returns the number of failing queries.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from cafes.cafe_api import cafe_cache, menu_item_cache
+
+    failures = 0
+    for label, operation in operations.items():
+        if operation.vendors and connection.vendor not in operation.vendors:
+            print(f"{'skip':<5} {label} (not checked on {connection.vendor})")
+            continue
+        # Cached lookups would answer without reaching the database
+        cafe_cache.clear()
+        menu_item_cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            operation.run(sample)
+        statements = dict.fromkeys(
+            query["sql"]
+            for query in captured.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        )
+        problems = []
+        for sql in statements:
+            found = explain(connection, sql)
+            if operation.sorts:
+                found = [problem for problem in found if not problem.startswith("sort")]
+            if found:
+                problems.append((sql, found))
+        print(f"{'FAIL' if problems else 'ok':<5} {label} ({len(statements)} queries)")
+        for sql, found in problems:
+            failures += 1
+            for problem in found:
+                print(f"      {problem}")
+            if verbose:
+                print(f"      {sql}")
+    return failures
+
+
+def seed_users(count: int, batch_size: int = 5000) -> None:
+    """
+    Make sure at least `count` users exist, inserting the missing ones in bulk.
+    """
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    existing = User.objects.count()
+    for start in range(existing, count, batch_size):
+        stop = min(start + batch_size, count)
+        User.objects.bulk_create(
+            [
+                User(username=f"user{i:07d}", email=f"user{i:07d}@bench.local")
+                for i in range(start, stop)
+            ]
+        )
+
+
+def create_user_email_index() -> None:
+    """
+    Create the (email, id) index the user admin expects on auth_user. No
+    migration adds it (see users.models), so the scratch database gets it
+    here, as a DBA would on a real one.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from users.models import USER_EMAIL_INDEX
+
+    User = get_user_model()
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, User._meta.db_table)
+    if USER_EMAIL_INDEX.name not in existing:
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_index(User, USER_EMAIL_INDEX)
+
+
+def seed_menu_documents() -> None:
+    """
+    Build the menu document of every cafe without one; bulk-inserted menu
+    items don't trigger their rebuild.
+    """
+    from cafes.menu_documents import build_missing_menu_documents
+
+    build_missing_menu_documents()
+
+
+def analyze() -> None:
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            for table in sorted(checked_tables()):
+                cursor.execute(f"ANALYZE TABLE {connection.ops.quote_name(table)}")
+                cursor.fetchall()
+        else:
+            cursor.execute("ANALYZE")
+
+
+def make_sample() -> Sample:
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.utils import timezone
+    from cafe_arna.pagination import KEYSET_FIELDS, encode_cursor
+    from cafes.models import Cafe, MenuItem
+
+    cafes = Cafe.objects.order_by("id")
+    middle = cafes.count() // 2
+    slugs = list(cafes.values_list("slug", flat=True)[middle : middle + 5])
+    items = MenuItem.objects.order_by(*KEYSET_FIELDS)
+    created = timezone.localtime(cafes.values_list("created_on", flat=True)[middle])
+
+    User = get_user_model()
+    user: Optional[Any] = User.objects.filter(username="plan-admin").first()
+    if user is None:
+        user = User.objects.create_superuser(
+            username="plan-admin", email="plan-admin@bench.local", password="plan-password"
+        )
+    admin = Client()
+    admin.force_login(user)
+    if "testserver" not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    return Sample(
+        slug=slugs[0],
+        slugs=slugs,
+        cafe_cursor=encode_cursor(cafes.order_by(*KEYSET_FIELDS).values_list(*KEYSET_FIELDS)[middle]),
+        menu_item_cursor=encode_cursor(
+            items.values_list(*KEYSET_FIELDS)[items.count() // 2]
+        ),
+        # What the admin's "Today" date filter link sends
+        created_after=quote(str(created.replace(hour=0, minute=0, second=0, microsecond=0))),
+        admin=admin,
+    )
+
+
+def main(args) -> int:
+    create_user_email_index()
+    seed_menu_documents()
+    analyze()
+    sample = make_sample()
+    operations = {**crud_operations(), **admin_operations()}
+    failures = check(operations, sample, args.verbose)
+    print(f"\n{failures} queries with a full scan or an unexpected sort")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--cafes", type=int, default=2000)
+    parser.add_argument("--menu-items", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true", help="print the failing SQL")
+    args = parser.parse_args()
+
+    setup()
+    seed_cafes(args.cafes)
+    seed_menu_items(args.menu_items, per_cafe=max(1, args.menu_items // args.cafes))
+    seed_users(args.users)
+    sys.exit(main(args))
@@ -0,0 +1,115 @@
+"""
+Read-your-writes check of cafe_arna.db_router, with two SQLite files
+standing in for the primary and a read replica.
+
+The replica is a copy of the primary, taken with SQLite's backup API
+whenever the check "replicates". Between copies it lags behind, as a real
+replica would. Two clients, each with its own cookie jar, go through the
+whole ASGI app:
+
+1. the writer renames a menu item (PUT /menu-items/bulk/);
+2. the reader's GET of that cafe's menu comes from the replica and still
+   shows the old name;
+3. the writer's GET is pinned to the primary and shows the new name;
+4. once the pin has expired, the writer reads from the replica again;
+5. after replicating, the reader sees the new name too.
+
+    BENCH_REPLICA_NAME=/tmp/cafe_arna_replica.sqlite3 \\
+        python -m benchmarks.replica --pin-seconds 1
+"""
+import argparse
+import asyncio
+import sqlite3
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.common import seed_menu_items, setup
+
+API = "/api/fa/v1/cafes"
+
+
+def replicate() -> None:
+    """
+    Copy the primary's SQLite file over the replica's.
+    """
+    from django.conf import settings
+
+    source = sqlite3.connect(settings.DATABASES["default"]["NAME"])
+    target = sqlite3.connect(settings.DATABASES["replica"]["NAME"])
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+async def run(app, slug: str, item_id: int, old: str, new: str, pin_seconds: float) -> List[Tuple[str, bool]]:
+    import httpx
+
+    from asgiref.sync import sync_to_async
+
+    async def names(client) -> List[str]:
+        response = await client.get(f"{API}/cafes/{slug}/menu-items/")
+        assert response.status_code == 200, response.status_code
+        return [item["name"] for item in response.json()]
+
+    transport = httpx.ASGITransport(app=app)
+    base_url = "http://localhost"
+    async with httpx.AsyncClient(transport=transport, base_url=base_url) as writer, \
+            httpx.AsyncClient(transport=transport, base_url=base_url) as reader:
+        response = await writer.put(
+            f"{API}/menu-items/bulk/",
+            json=[{"id": item_id, "name": new, "price": 9.5, "is_available": True}],
+        )
+        assert response.status_code == 200, response.status_code
+        results = [
+            ("writer is pinned by its write", "db_pin" in writer.cookies),
+            ("reader reads the lagging replica", old in await names(reader)),
+            ("writer reads its own write", new in await names(writer)),
+        ]
+        await asyncio.sleep(pin_seconds + 0.5)
+        results.append(("writer unpinned after the window", old in await names(writer)))
+        await sync_to_async(replicate)()
+        results.append(("reader sees the write once replicated", new in await names(reader)))
+    return results
+
+
+def main(args) -> int:
+    from django.conf import settings
+
+    if "replica" not in settings.DATABASES:
+        print("Set BENCH_REPLICA_NAME to the SQLite file standing in for the replica")
+        return 2
+    settings.DB_REPLICA_PIN_SECONDS = args.pin_seconds
+
+    from cafe_arna.asgi import get_application
+    from cafes.menu_documents import rebuild_menu_document
+    from cafes.models import MenuItem
+
+    item = MenuItem.objects.select_related("cafe").order_by("id").first()
+    rebuild_menu_document(item.cafe_id)
+    replicate()
+
+    new = f"Replica check {int(time.time() * 1000)}"
+    results = asyncio.run(
+        run(get_application(), item.cafe.slug, item.id, item.name, new, args.pin_seconds)
+    )
+    print(f"\nRead-your-writes with a {args.pin_seconds:g}s pin")
+    print("-" * 40)
+    for label, passed in results:
+        print(f"{'ok' if passed else 'FAIL':<5} {label}")
+    return 0 if all(passed for _, passed in results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--menu-items", type=int, default=1000)
+    parser.add_argument("--pin-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    setup()
+    seed_menu_items(args.menu_items)
+    sys.exit(main(args))
@@ -0,0 +1,51 @@
+"""
+Latency of menu-item search with the old `icontains` scan vs ranked search.
+
+    python -m benchmarks.search --rows 200000 --limit 20
+"""
+import argparse
+
+from django.db.models import Q
+
+from benchmarks.common import report, seed_menu_items, setup, summarize, timed
+
+
+def main(args) -> None:
+    from cafes.models import MenuItem
+    from cafes.search import get_index
+
+    # Build the in-process index up front so the first timed call is not a rebuild
+    get_index(MenuItem).ensure_built()
+
+    rows = {}
+    for query in args.queries:
+        rows[f"icontains '{query}'"] = summarize(
+            timed(
+                lambda: list(
+                    MenuItem.objects.filter(
+                        Q(name__icontains=query) | Q(description__icontains=query)
+                    )[: args.limit]
+                ),
+                args.repeat,
+            )
+        )
+        rows[f"ranked '{query}'"] = summarize(
+            timed(
+                lambda: list(MenuItem.objects.full_search(query, args.limit)),
+                args.repeat,
+            )
+        )
+    report(f"Menu item search, {args.rows} rows, limit {args.limit}", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--queries", nargs="+", default=["item 00012345", "0019"])
+    args = parser.parse_args()
+
+    setup()
+    seed_menu_items(args.rows)
+    main(args)
@@ -0,0 +1,65 @@
+"""
+Per-page cost of the menu-items list response: pydantic validation of model
+instances (what FastAPI does with response_model) vs the `.values()` +
+SchemaEncoder fast path.
+
+    python -m benchmarks.serialization --rows 100000 --sizes 50 500
+"""
+import argparse
+from typing import List
+
+from benchmarks.common import report, seed_menu_items, setup, summarize, timed
+
+
+def main(args) -> None:
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    from cafe_arna.encoders import SchemaEncoder, orjson
+    from cafe_arna.pagination import KEYSET_FIELDS
+    from cafes.models import MenuItem
+    from cafes.schema import MenuItemListOut
+
+    # Same steps as FastAPI's serialize_response + JSONResponse.render
+    adapter = TypeAdapter(List[MenuItemListOut])
+
+    def pydantic_encode(objs) -> bytes:
+        value = adapter.validate_python(objs, from_attributes=True)
+        return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+    encoder = SchemaEncoder(MenuItemListOut)
+    queryset = MenuItem.objects.order_by(*KEYSET_FIELDS)
+
+    for size in args.sizes:
+        objs = list(queryset[:size])
+        values = list(queryset.values(*encoder.fields)[:size])
+        assert adapter.validate_json(pydantic_encode(objs)) == adapter.validate_json(
+            encoder.encode(values)
+        )
+        rows = {
+            "pydantic encode": summarize(timed(lambda: pydantic_encode(objs), args.repeat)),
+            "fast path encode": summarize(timed(lambda: encoder.encode(values), args.repeat)),
+            "pydantic query+encode": summarize(
+                timed(lambda: pydantic_encode(list(queryset[:size])), args.repeat)
+            ),
+            "fast path query+encode": summarize(
+                timed(
+                    lambda: encoder.encode(list(queryset.values(*encoder.fields)[:size])),
+                    args.repeat,
+                )
+            ),
+        }
+        encoder_name = "orjson" if orjson is not None else "json"
+        report(f"Menu items page of {size} ({encoder_name})", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    seed_menu_items(args.rows)
+    main(args)
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from cafe_arna.settings import *  # noqa: F401,F403
+from cafe_arna.settings import SECRET_KEY
+
+# Benchmarks run with a local SQLite database instead of MySQL. Requests
+# write from a thread each, so transactions queue for SQLite's write lock
+# instead of failing (WAL mode is switched on in common.setup())
+SECRET_KEY = SECRET_KEY or 'benchmarks-only-secret-key'
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'benchmarks.sqlite_backend',
+        'NAME': os.getenv(
+            'BENCH_DB_NAME',
+            os.path.join(tempfile.gettempdir(), 'cafe_arna_bench.sqlite3'),
+        ),
+        'OPTIONS': {'timeout': 30},
+        # A file rather than shared-cache memory, whose table locks don't
+        # wait for concurrent writers
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'cafe_arna_test.sqlite3')},
+    }
+}
+
+# With BENCH_REPLICA_NAME set, a second SQLite file stands in for a read
+# replica (see benchmarks/replica.py); there is no replication, the file is
+# a copy of the primary taken whenever the benchmark "replicates"
+DATABASE_REPLICAS = []
+if os.getenv('BENCH_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('BENCH_REPLICA_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+# Admin pages render without a `collectstatic` manifest
+STORAGES = {
+    **STORAGES,  # noqa: F405
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
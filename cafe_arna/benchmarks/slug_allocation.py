@@ -0,0 +1,81 @@
+"""
+Slug allocation for a popular cafe name, against the exists()-probing
+approaches it replaces.
+
+    python -m benchmarks.slug_allocation --taken 500
+"""
+import argparse
+from datetime import time as dt_time
+
+from benchmarks.common import report, setup, summarize, timed
+
+
+def probe_random_suffix(Model, value):
+    """
+    The removed model-based generator: probe, then retry with a random suffix.
+    """
+    from cafe_arna.utils import random_string, slugify
+
+    slug = slugify(value)
+    while Model.objects.filter(slug=slug).exists():
+        slug = f"{slugify(value)}-{random_string(4)}"
+    return slug
+
+
+def probe_numbered_suffix(Model, value):
+    """
+    Numbered suffixes found by probing one candidate at a time.
+    """
+    from cafe_arna.utils import slugify
+
+    base = slug = slugify(value)
+    number = 1
+    while Model.objects.filter(slug=slug).exists():
+        number += 1
+        slug = f"{base}-{number}"
+    return slug
+
+
+def main(args) -> None:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from cafe_arna.utils import allocate_unique_slug
+    from cafes.models import Cafe
+
+    Cafe.objects.filter(slug__startswith=args.name).delete()
+    Cafe.objects.bulk_create(
+        [
+            Cafe(
+                name=f"{args.name} {number}",
+                slug=args.name if number == 1 else f"{args.name}-{number}",
+                location="Benchmark street",
+                opening_time=dt_time(7, 0),
+                closing_time=dt_time(22, 0),
+            )
+            for number in range(1, args.taken + 1)
+        ]
+    )
+
+    rows = {}
+    for label, allocate in (
+        ("exists() + random suffix", probe_random_suffix),
+        ("exists() + numbered suffix", probe_numbered_suffix),
+        ("allocate_unique_slug", allocate_unique_slug),
+    ):
+        with CaptureQueriesContext(connection) as queries:
+            allocate(Cafe, args.name)
+        stats = summarize(timed(lambda: allocate(Cafe, args.name), args.repeat))
+        stats["queries"] = len(queries)
+        rows[label] = stats
+    report(f'Allocating a slug for "{args.name}" with {args.taken} taken', rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--name", default="starbucks")
+    parser.add_argument("--taken", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    main(args)
@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend whose transactions take the write lock up front, like
+    Django 5.1's `"transaction_mode": "IMMEDIATE"`. A deferred transaction
+    that reads and then writes fails at once with "database is locked" when
+    another connection wrote in between; an immediate one waits its turn.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
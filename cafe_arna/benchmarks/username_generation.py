@@ -0,0 +1,92 @@
+"""
+generate_username on a users table where many people share first names,
+against the count() + regex + Python sort version it replaces.
+
+    python -m benchmarks.username_generation --users 100000
+"""
+import argparse
+
+from benchmarks.common import report, setup, summarize, timed
+
+FIRST_NAMES = ("john", "mary", "james", "linda", "david", "sarah", "michael", "grace")
+
+
+def legacy_generate_username(self, full_name, Model):
+    """
+    The previous implementation, kept here for comparison.
+    """
+    name = full_name.lower()
+    name = name.split(' ')
+    lastname = name[-1]
+    firstname = name[0]
+    self.username = '%s%s' % (firstname[0], lastname)
+    if Model.objects.filter(username=self.username).count() > 0:
+        username = '%s%s' % (firstname, lastname[0])
+        if Model.objects.filter(username=self.username).count() > 0:
+            users = Model.objects.filter(username__regex=r'^%s[1-9]{1,}$' % firstname).order_by(
+                'username').values(
+                'username')
+            if len(users) > 0:
+                last_number_used = sorted(
+                    map(lambda x: int(x['username'].replace(firstname, '')), users))
+                last_number_used = last_number_used[-1]
+                number = last_number_used + 1
+                self.username = '%s%s' % (firstname, number)
+            else:
+                self.username = '%s%s' % (firstname, 1)
+    return self.username
+
+
+def seed_users(count: int, batch_size: int = 5000) -> None:
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    existing = User.objects.filter(email__endswith="@bench.local").count()
+    for start in range(existing, count, batch_size):
+        stop = min(start + batch_size, count)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i // len(FIRST_NAMES) + 1}",
+                    email=f"user{i}@bench.local",
+                )
+                for i in range(start, stop)
+            ]
+        )
+    for first in FIRST_NAMES:
+        for taken in (f"{first[0]}doe", f"{first}d"):
+            User.objects.get_or_create(username=taken)
+
+
+def main(args) -> None:
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from cafe_arna.utils import generate_username
+
+    User = get_user_model()
+    rows = {}
+    for label, generate in (
+        ("count() + regex + sort", legacy_generate_username),
+        ("generate_username", generate_username),
+    ):
+        user = User()
+        with CaptureQueriesContext(connection) as queries:
+            generate(user, "John Doe", User)
+        stats = summarize(
+            timed(lambda: generate(User(), "John Doe", User), args.repeat)
+        )
+        stats["queries"] = len(queries)
+        rows[f"{label} -> {user.username}"] = stats
+    report(f"Username for a common first name, {args.users} users", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    seed_users(args.users)
+    main(args)
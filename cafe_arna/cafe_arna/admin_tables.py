@@ -0,0 +1,188 @@
+from functools import cached_property
+from typing import Optional, Sequence, Tuple, Type
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import get_fields_from_path
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Model, Q, QuerySet
+from .pagination import encode_cursor, keyset_filter
+
+# Query string parameter holding the keyset cursor of a changelist page
+CURSOR_VAR = "after"
+
+
+def estimated_row_count(model: Type[Model], using: str) -> Optional[int]:
+    """
+    Row count of `model`'s table from the database's statistics, without
+    reading the table, or None when there are none (SQLite before ANALYZE).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES"
+                    " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [table],
+                )
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                    [connection.ops.quote_name(table)],
+                )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+                )
+                if cursor.fetchone() is None:
+                    return None
+                # The first number of every row of a table is its row count
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    count = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for a table never analyzed
+    return count if count >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count never scans a large table.
+
+    An unfiltered changelist takes the row count from the table statistics
+    once it is past ADMIN_EXACT_COUNT_LIMIT; a filtered one counts at most
+    that many rows. `count_kind` says which: "exact", "estimated" (about
+    `count` rows) or "capped" (more than `count` rows).
+    """
+
+    count_kind = "exact"
+
+    @cached_property
+    def count(self) -> int:
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.count_kind = "estimated"
+                return estimate
+        count = queryset.order_by()[: limit + 1].count()
+        if count > limit:
+            self.count_kind = "capped"
+            return limit
+        return count
+
+
+class LargeTableChangeList(ChangeList):
+    """
+    Changelist paged by keyset (`?after=<cursor>`) on the admin's
+    `keyset_ordering` instead of by page number, so every page is an index
+    seek however deep it is, projected to the admin's `list_only` fields.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR) or None
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+        # Filter, search and sort links start again from the first page
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None) -> QuerySet:
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        return queryset
+
+    def get_results(self, request) -> None:
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        fields = self.model_admin.keyset_ordering
+        try:
+            page = keyset_filter(self.queryset, self.cursor, fields)
+            result_list = page[: self.list_per_page]
+            rows = list(result_list)
+            if len(rows) == self.list_per_page:
+                last = [getattr(rows[-1], field.lstrip("-")) for field in fields]
+                cursor = encode_cursor(last)
+                if keyset_filter(self.queryset, cursor, fields).exists():
+                    self.next_cursor = cursor
+        except (ValidationError, ValueError):
+            raise IncorrectLookupParameters
+
+        self.result_count = paginator.count
+        self.count_kind = paginator.count_kind
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+    @property
+    def first_page_url(self) -> str:
+        return self.get_query_string(remove=[PAGE_VAR])
+
+    @property
+    def next_page_url(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR])
+
+
+class LargeTableAdminMixin:
+    """
+    ModelAdmin mixin for tables too large for the stock changelist.
+
+    - Counts come from EstimatedCountPaginator instead of COUNT(*).
+    - Pages are keyset pages on `keyset_ordering`, which must be unique
+      (end it with the primary key) and indexed; column sorting is off.
+    - `list_only` limits the columns loaded for the changelist rows; with
+      `list_select_related` it can name fields of the joined rows too.
+    - Search matches each `search_fields` entry by prefix against the
+      whole search term, so it can use the field's index. A field across a
+      relation becomes a subquery on the related table's index rather than
+      a join.
+    """
+
+    keyset_ordering: Tuple[str, ...] = ("-pk",)
+    list_only: Optional[Sequence[str]] = None
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    sortable_by: Sequence[str] = ()
+    change_list_template = "admin/large_table_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q()
+        for field in self.get_search_fields(request):
+            path, _, name = field.lstrip("^=@").rpartition("__")
+            if not path:
+                condition |= Q(**{f"{name}__istartswith": term})
+                continue
+            related = get_fields_from_path(self.model, path)[-1].related_model
+            matches = related._default_manager.filter(**{f"{name}__istartswith": term})
+            condition |= Q(**{f"{path}__in": matches.values("pk")})
+        return queryset.filter(condition), False
@@ -1,8 +1,53 @@
+from typing import Any
+from cafe_arna.db_pool import pool_stats
+from cafe_arna.query_stats import query_stats
 from cafes.endpoints import router as cafes_router
-from fastapi import APIRouter
+from cafes.endpoints import export_router as cafes_export_router
+from cafes.endpoints import stats_router as cafes_stats_router
+from cafes.endpoints import upload_router as cafes_upload_router
+from django.conf import settings
+from fastapi import APIRouter, Depends, HTTPException
 
 
 router = APIRouter()
 
 
-router.include_router(cafes_router, prefix='/cafes', tags=['Cafes'])
\ No newline at end of file
+router.include_router(cafes_router, prefix='/cafes', tags=['Cafes'])
+
+# Streaming uploads and exports, included by the app without the database
+# pool dependency; they take a pool slot themselves
+upload_router = APIRouter()
+upload_router.include_router(cafes_upload_router, prefix='/cafes', tags=['Cafes'])
+upload_router.include_router(cafes_export_router, prefix='/cafes', tags=['Cafes'])
+
+
+async def stats_endpoints_enabled() -> None:
+    """
+    Hide the stats endpoints unless settings.STATS_ENDPOINTS is on: they
+    show SQL shapes and the internals of the process.
+    """
+    if not settings.STATS_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+stats_router = APIRouter(dependencies=[Depends(stats_endpoints_enabled)], tags=['Health'])
+
+
+@stats_router.get('/db-pool-stats/')
+async def get_db_pool_stats() -> Any:
+    """
+    Database pool usage: slots in use, waits and connection churn.
+    """
+    return pool_stats()
+
+
+@stats_router.get('/query-stats/')
+async def get_query_stats() -> Any:
+    """
+    Per-route query counts, DB time and N+1 suspects.
+    """
+    return query_stats()
+
+
+stats_router.include_router(cafes_stats_router, prefix='/cafes')
+router.include_router(stats_router)
@@ -11,10 +11,9 @@ import os
 from importlib.util import find_spec
 from django.apps import apps
 from django.conf import settings
-from django.core.wsgi import get_wsgi_application
-from fastapi import FastAPI
+from django.core.asgi import get_asgi_application
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.wsgi import WSGIMiddleware
 from fastapi.staticfiles import StaticFiles
 
 
@@ -26,9 +25,14 @@ apps.populate(settings.INSTALLED_APPS)
 # This endpoint imports should be placed below the settings env declaration
 # Otherwise, django will throw a configure() settings error
 from .api_router import router as api_router
+from .api_router import upload_router
+from .db_pool import RequestThreadMiddleware, db_connection
+from .db_router import ReplicaRoutingMiddleware
+from .query_stats import QueryStatsMiddleware
+from .static_files import ImmutableStaticFiles, PrecompressedStaticFiles
 
-# Get the Django WSGI application we are working with
-application = get_wsgi_application()
+# Django's own ASGI application, served on the same event loop as FastAPI
+application = get_asgi_application()
 
 
 # This can be done without the function, but making it functional
@@ -52,16 +56,49 @@ def get_application() -> FastAPI:
         allow_headers=["*"],
     )
 
-    # Include all api endpoints
-    app.include_router(api_router, prefix=settings.API_V1_STR)
+    # Count the SQL each request runs and flag N+1 query patterns
+    app.add_middleware(QueryStatsMiddleware)
 
-    # Mounts an independent web URL for Django WSGI application
-    # app.mount(f"{settings.WSGI_APP_URL}", WSGIMiddleware(application))
-    app.mount("/django", WSGIMiddleware(application))
+    # Send the reads of GET requests to the read replicas, if any
+    app.add_middleware(ReplicaRoutingMiddleware)
 
-    # Mount static files
+    # Run each request's ORM calls on a thread of its own instead of the
+    # single thread `sync_to_async` shares across the process
+    app.add_middleware(RequestThreadMiddleware)
+
+    # Include all api endpoints; each request holds a database pool slot
+    app.include_router(
+        api_router,
+        prefix=settings.API_V1_STR,
+        dependencies=[Depends(db_connection)],
+    )
+    # Uploads and exports take a pool slot themselves, for just the part of
+    # the request that uses the database
+    app.include_router(upload_router, prefix=settings.API_V1_STR)
+
+    # Mounts the Django application (admin etc.) natively over ASGI; Django
+    # strips the mount's root_path from the path itself
+    app.mount("/django", application)
+
+    # Mount static files: hashed names cached forever, precompressed siblings
+    # picked by Accept-Encoding (see `collectstatic`)
+    app.mount(
+        "/static", PrecompressedStaticFiles(directory=settings.STATIC_ROOT), name="static"
+    )
+
+    # Mount uploads; thumbnail variants are content-hashed, so cache forever
+    app.mount(
+        f"{settings.MEDIA_URL}{settings.THUMBNAIL_DIR}",
+        ImmutableStaticFiles(
+            directory=os.path.join(settings.MEDIA_ROOT, settings.THUMBNAIL_DIR),
+            check_dir=False,
+        ),
+        name="thumbnails",
+    )
     app.mount(
-        "/static", StaticFiles(directory=settings.STATIC_ROOT), name="static"
+        settings.MEDIA_URL.rstrip("/"),
+        StaticFiles(directory=settings.MEDIA_ROOT, check_dir=False),
+        name="media",
     )
 
     return app
@@ -1,7 +1,28 @@
-from typing import Generic, List, Optional, Type, TypeVar
-from django.db.models import Model
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+from asgiref.sync import sync_to_async
+from datetime import datetime, timezone as dt_timezone
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+from fastapi import HTTPException
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from cafe_arna.cache import CRUDCache
+from cafe_arna.pagination import InvalidCursor, keyset_filter, next_cursor
 
 ModelType = TypeVar("ModelType", bound=Model)
 CreateSchema = TypeVar("CreateSchema", bound=BaseModel)
@@ -9,20 +30,105 @@ UpdateSchema = TypeVar("UpdateSchema", bound=BaseModel)
 SLUGTYPE = TypeVar("SLUGTYPE", "int", "str")
 
 
+def auto_now_fields(model: Type[Model]) -> List[str]:
+    """
+    Names of the `auto_now` fields of `model`, which `update_fields` saves
+    and bulk updates have to include explicitly.
+    """
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+    ]
+
+
+def python_values(model: Type[Model], values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn JSON-encoded request values back into the Python types of the
+    model's fields, so the instance a create returns (and that signal
+    receivers see) holds e.g. `time` objects rather than strings.
+    """
+    return {name: model._meta.get_field(name).to_python(value) for name, value in values.items()}
+
+
+def locked_update(
+    queryset: QuerySet,
+    slug: SLUGTYPE,
+    values: Dict[str, Any],
+    expected_updated: Optional[datetime] = None,
+    lookup_field: str = "slug",
+) -> Model:
+    """
+    Update the item whose `lookup_field` is `slug` with one locked read and
+    one UPDATE of the changed columns, returning the updated instance
+    without reading it back. Raises the model's DoesNotExist when there is
+    no such item.
+
+    When `expected_updated` is given the write only goes through if the
+    row's `updated` timestamp still matches it (optimistic concurrency).
+    """
+    model = queryset.model
+    features = connections[router.db_for_write(model)].features
+    lock = {"of": ("self",)} if features.has_select_for_update_of else {}
+    with transaction.atomic():
+        obj = queryset.select_for_update(**lock).get(**{lookup_field: slug})
+        if expected_updated is not None:
+            if timezone.is_naive(expected_updated):
+                expected_updated = timezone.make_aware(expected_updated, dt_timezone.utc)
+            if obj.updated != expected_updated:
+                raise HTTPException(
+                    status_code=409,
+                    detail="This item was changed since it was read. Reload it and retry.",
+                )
+
+        changed = []
+        for name, value in values.items():
+            field = model._meta.get_field(name)
+            attname = field.attname if field.is_relation else name
+            value = field.to_python(value)
+            if getattr(obj, attname) != value:
+                setattr(obj, attname, value)
+                changed.append(name)
+        if changed:
+            obj.save(update_fields=changed + auto_now_fields(model))
+    return obj
+
+
 class BaseCRUD(Generic[ModelType, CreateSchema, UpdateSchema, SLUGTYPE]):
     """
     Base class for all crud operations
     Methods to Create, Read, Update, Delete (CRUD).
     """
 
-    def __init__(self, model: Type[ModelType]):
+    # Field single items are looked up, and cached, by
+    lookup_field = "slug"
+
+    def __init__(self, model: Type[ModelType], cache: Optional[CRUDCache] = None):
         self.model = model
+        self.cache = cache
+
+    def cached(self, slug: SLUGTYPE, loader: Callable[[], Any]) -> Any:
+        """
+        Read `slug` through the cache, if one is configured.
+        """
+        if self.cache is None:
+            return loader()
+        return self.cache.get_or_load(slug, loader)
+
+    def invalidate(self, *slugs: SLUGTYPE) -> None:
+        """
+        Drop cached entries for the given slugs.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(*slugs)
 
     def get(self, slug: SLUGTYPE) -> Optional[ModelType]:
         """
         Get a single item.
         """
-        return self.model.objects.get(slug=slug)
+        return self.cached(
+            slug, lambda: self.model.objects.get(**{self.lookup_field: slug})
+        )
 
     def get_multiple(self, limit: int = 100, offset: int = 0) -> List[ModelType]:
         """
@@ -30,25 +136,316 @@ class BaseCRUD(Generic[ModelType, CreateSchema, UpdateSchema, SLUGTYPE]):
         """
         return self.model.objects.all()[offset : offset + limit]
 
+    def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        queryset: Optional[QuerySet] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        get the page of items after `cursor` plus the cursor of the next page.
+        `queryset` narrows the rows paged through (all rows by default);
+        with `fields` the rows are `.values()` dicts of just those fields.
+        """
+        if queryset is None:
+            queryset = self.model.objects.all()
+        try:
+            queryset = keyset_filter(queryset, cursor)
+        except InvalidCursor as error:
+            raise HTTPException(status_code=400, detail=str(error))
+        if fields:
+            queryset = queryset.values(*fields)
+        rows = list(queryset[: limit + 1])
+        return rows[:limit], next_cursor(rows, limit)
+
     def create(self, obj_in: CreateSchema) -> ModelType:
         """
         Create an item.
         """
         if not isinstance(obj_in, list):
-            obj_in = jsonable_encoder(obj_in)
+            obj_in = python_values(self.model, jsonable_encoder(obj_in))
         return self.model.objects.create(**obj_in)
 
-    def update(self, obj_in: UpdateSchema, slug: SLUGTYPE) -> ModelType:
+    def update(self, obj_in: UpdateSchema, slug: SLUGTYPE, partial: bool = False) -> ModelType:
         """
         Update an item.
         """
+        try:
+            obj = locked_update(
+                self.model.objects.all(),
+                slug,
+                jsonable_encoder(obj_in, exclude={"updated"}, exclude_unset=partial),
+                expected_updated=getattr(obj_in, "updated", None),
+                lookup_field=self.lookup_field,
+            )
+        except ObjectDoesNotExist:
+            raise HTTPException(status_code=404, detail="This item does not exist.")
+        self.invalidate(slug, getattr(obj, self.lookup_field))
+        return obj
+
+    def delete(self, slug: SLUGTYPE) -> ModelType:
+        """Delete an item."""
+        self.model.objects.filter(**{self.lookup_field: slug}).delete()
+        self.invalidate(slug)
+        return {"detail": "Successfully deleted!"}
+
+    def _existing_keys(
+        self, rows: List[Dict[str, Any]], fields: Sequence[str], exclude_pks: Sequence[Any] = ()
+    ) -> Set[Tuple]:
+        """
+        Values of `fields` already taken in the database by rows like `rows`.
+        """
+        if not fields or not rows:
+            return set()
+        lookups = {f"{field}__in": {row[field] for row in rows} for field in fields}
+        queryset = self.model.objects.filter(**lookups).exclude(pk__in=exclude_pks)
+        return set(queryset.values_list(*fields))
+
+    def create_multiple(
+        self, objs_in: List[CreateSchema], conflict_fields: Sequence[str] = (), **defaults: Any
+    ) -> List[Dict[str, Any]]:
+        """
+        Create many items in one transaction with a result for every row.
+        Rows that clash on `conflict_fields` are reported and skipped instead
+        of aborting the batch.
+        """
+        rows = [{**jsonable_encoder(obj_in), **defaults} for obj_in in objs_in]
+        results: List[Dict[str, Any]] = [{"index": index} for index in range(len(rows))]
+
+        with transaction.atomic():
+            taken = self._existing_keys(rows, conflict_fields)
+            pending = []
+            for index, row in enumerate(rows):
+                key = tuple(row[field] for field in conflict_fields)
+                if conflict_fields and key in taken:
+                    results[index].update(status="conflict", detail="Already exists.")
+                    continue
+                taken.add(key)
+                pending.append((index, self.model(**row)))
+
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create([obj for _, obj in pending])
+            except IntegrityError:
+                # A concurrent writer took one of the keys; insert row by row
+                for index, obj in pending:
+                    try:
+                        with transaction.atomic():
+                            obj.save(force_insert=True)
+                    except IntegrityError:
+                        obj.pk = None
+                        results[index].update(status="conflict", detail="Already exists.")
+
+            created = [(index, obj) for index, obj in pending if "status" not in results[index]]
+            if conflict_fields and any(obj.pk is None for _, obj in created):
+                # Backends such as MySQL don't return ids from bulk inserts
+                lookups = {
+                    f"{field}__in": {getattr(obj, field) for _, obj in created}
+                    for field in conflict_fields
+                }
+                ids = {
+                    tuple(values[:-1]): values[-1]
+                    for values in self.model.objects.filter(**lookups).values_list(
+                        *conflict_fields, "pk"
+                    )
+                }
+                for _, obj in created:
+                    obj.pk = ids.get(tuple(getattr(obj, field) for field in conflict_fields))
+            for index, obj in created:
+                results[index].update(status="created", id=obj.pk)
+        return results
+
+    def update_multiple(
+        self, objs_in: List[UpdateSchema], conflict_fields: Sequence[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Update many items, addressed by `id`, in one transaction with a result
+        for every row. Missing rows and rows that would clash on
+        `conflict_fields` are reported and skipped.
+        """
+        rows = [jsonable_encoder(obj_in) for obj_in in objs_in]
+        results: List[Dict[str, Any]] = [
+            {"index": index, "id": row["id"]} for index, row in enumerate(rows)
+        ]
+        fields = sorted({field for row in rows for field in row} - {"id"})
+        auto_now = auto_now_fields(self.model)
 
+        with transaction.atomic():
+            existing = self.model.objects.select_for_update().in_bulk(
+                [row["id"] for row in rows]
+            )
+            merged = []
+            for index, row in enumerate(rows):
+                obj = existing.get(row["id"])
+                if obj is None:
+                    results[index].update(status="not_found", detail="Does not exist.")
+                    continue
+                merged.append(
+                    (index, obj, {**{f: getattr(obj, f) for f in conflict_fields}, **row})
+                )
+
+            taken = self._existing_keys(
+                [values for _, _, values in merged], conflict_fields, list(existing)
+            )
+            changed = []
+            now = timezone.now()
+            for index, obj, values in merged:
+                key = tuple(values[field] for field in conflict_fields)
+                if conflict_fields and key in taken:
+                    results[index].update(status="conflict", detail="Already exists.")
+                    continue
+                taken.add(key)
+                for field in fields:
+                    setattr(obj, field, values[field])
+                for field in auto_now:
+                    setattr(obj, field, now)
+                changed.append((index, obj))
+                results[index]["status"] = "updated"
+
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_update(
+                        [obj for _, obj in changed], fields + auto_now
+                    )
+            except IntegrityError:
+                # Either a concurrent writer took one of the keys or rows of this
+                # batch swap keys; update row by row, retrying failed rows
+                # while other rows still make progress.
+                remaining = changed
+                while remaining:
+                    failed = []
+                    for index, obj in remaining:
+                        try:
+                            with transaction.atomic():
+                                obj.save(update_fields=fields + auto_now)
+                        except IntegrityError:
+                            failed.append((index, obj))
+                    if len(failed) == len(remaining):
+                        break
+                    remaining = failed
+                for index, _ in remaining:
+                    results[index].update(status="conflict", detail="Already exists.")
+
+        if changed and self.cache is not None:
+            self.cache.clear()
+        return results
+
+    def delete_multiple(self, pks: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Delete many items by primary key with a result for every id.
+        """
+        with transaction.atomic():
+            found = set(
+                self.model.objects.filter(pk__in=pks).values_list("pk", flat=True)
+            )
+            self.model.objects.filter(pk__in=found).delete()
+
+        if found and self.cache is not None:
+            self.cache.clear()
+        return [
+            {"index": index, "id": pk, "status": "deleted"}
+            if pk in found
+            else {"index": index, "id": pk, "status": "not_found", "detail": "Does not exist."}
+            for index, pk in enumerate(pks)
+        ]
+
+
+class AsyncBaseCRUD(Generic[ModelType, CreateSchema, UpdateSchema, SLUGTYPE]):
+    """
+    Async counterpart of BaseCRUD built on Django's async ORM.
+    Used by `async def` endpoints so requests don't hold a threadpool slot.
+    """
+
+    lookup_field = "slug"
+
+    def __init__(self, model: Type[ModelType], cache: Optional[CRUDCache] = None):
+        self.model = model
+        self.cache = cache
+
+    async def cached(self, slug: SLUGTYPE, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Read `slug` through the cache, if one is configured.
+        """
+        if self.cache is None:
+            return await loader()
+        return await self.cache.aget_or_load(slug, loader)
+
+    async def invalidate(self, *slugs: SLUGTYPE) -> None:
+        """
+        Drop cached entries for the given slugs.
+        """
+        if self.cache is not None:
+            await self.cache.ainvalidate(*slugs)
+
+    async def get(self, slug: SLUGTYPE) -> Optional[ModelType]:
+        """
+        Get a single item.
+        """
+        return await self.cached(
+            slug, lambda: self.model.objects.aget(**{self.lookup_field: slug})
+        )
+
+    async def get_multiple(self, limit: int = 100, offset: int = 0) -> List[ModelType]:
+        """
+        get multiple items using a query limiting flag.
+        """
+        return [obj async for obj in self.model.objects.all()[offset : offset + limit]]
+
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        queryset: Optional[QuerySet] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        get the page of items after `cursor` plus the cursor of the next page.
+        `queryset` narrows the rows paged through (all rows by default);
+        with `fields` the rows are `.values()` dicts of just those fields.
+        """
+        if queryset is None:
+            queryset = self.model.objects.all()
+        try:
+            queryset = keyset_filter(queryset, cursor)
+        except InvalidCursor as error:
+            raise HTTPException(status_code=400, detail=str(error))
+        if fields:
+            queryset = queryset.values(*fields)
+        queryset = queryset[: limit + 1]
+        rows = [obj async for obj in queryset]
+        return rows[:limit], next_cursor(rows, limit)
+
+    async def create(self, obj_in: CreateSchema) -> ModelType:
+        """
+        Create an item.
+        """
         if not isinstance(obj_in, list):
-            obj_in = jsonable_encoder(obj_in)
+            obj_in = python_values(self.model, jsonable_encoder(obj_in))
+        return await self.model.objects.acreate(**obj_in)
 
-        return self.model.objects.filter(slug=slug).update(**obj_in)
+    async def update(
+        self, obj_in: UpdateSchema, slug: SLUGTYPE, partial: bool = False
+    ) -> ModelType:
+        """
+        Update an item.
+        """
+        # The row lock needs a transaction, so this runs in Django's sync thread
+        try:
+            obj = await sync_to_async(locked_update)(
+                self.model.objects.all(),
+                slug,
+                jsonable_encoder(obj_in, exclude={"updated"}, exclude_unset=partial),
+                expected_updated=getattr(obj_in, "updated", None),
+                lookup_field=self.lookup_field,
+            )
+        except ObjectDoesNotExist:
+            raise HTTPException(status_code=404, detail="This item does not exist.")
+        await self.invalidate(slug, getattr(obj, self.lookup_field))
+        return obj
 
-    def delete(self, slug: SLUGTYPE) -> ModelType:
+    async def delete(self, slug: SLUGTYPE) -> ModelType:
         """Delete an item."""
-        self.model.objects.filter(slug=slug).delete()
+        await self.model.objects.filter(**{self.lookup_field: slug}).adelete()
+        await self.invalidate(slug)
         return {"detail": "Successfully deleted!"}
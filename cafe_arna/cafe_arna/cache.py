@@ -0,0 +1,282 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from django.conf import settings
+from .db_router import is_pinned, reads_from_replica
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Return the cached value or `MISSING`.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class CRUDCache:
+    """
+    Read-through cache for CRUD lookups keyed by slug (or id).
+
+    Lookups hit the in-process LRU first and then, when `shared_alias` names a
+    Django `CACHES` entry, the shared backend. The LRU is per process and
+    can't see writes made by other processes, so with a shared backend it
+    keeps entries for only CRUD_CACHE_LOCAL_TTL seconds; without one there
+    is only this process to write, and entries last the full TTL.
+    Every caller gets its own copy of a cached instance, so a request that
+    changes the instance it got can't leak into what other requests see.
+
+    A value loaded while the cache was invalidated or cleared may predate
+    that write, so it is returned but not kept.
+
+    With read replicas (cafe_arna.db_router) a value loaded from a replica
+    may predate a write that has not reached it yet, so it is only kept
+    for DB_REPLICA_PIN_SECONDS; a client that just wrote reads past the
+    cache, from the primary.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        shared_alias: Optional[str] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl if ttl is not None else settings.CRUD_CACHE_TTL
+        self.shared_alias = shared_alias or settings.CRUD_CACHE_SHARED_ALIAS
+        local_ttl = self.ttl
+        if self.shared_alias:
+            local_ttl = min(self.ttl, settings.CRUD_CACHE_LOCAL_TTL)
+        self.local = LRUCache(
+            max_entries=max_entries or settings.CRUD_CACHE_MAX_ENTRIES, ttl=local_ttl
+        )
+        # Bumped by every invalidate()/clear() of this process
+        self.local_generation = 0
+        self._lock = threading.Lock()
+        self.shared_hits = 0
+        self.shared_misses = 0
+        registry[namespace] = self
+
+    @property
+    def shared(self):
+        if not self.shared_alias:
+            return None
+        from django.core.cache import caches
+
+        return caches[self.shared_alias]
+
+    def key(self, slug: Any) -> str:
+        return f"crud:{self.namespace}:{slug}"
+
+    @property
+    def generation_key(self) -> str:
+        return f"crud:{self.namespace}:__generation__"
+
+    def _unpack(self, found: Dict[str, Any], key: str) -> Any:
+        # Shared entries are stored as (generation, value); anything written
+        # before the last clear() carries an old generation and counts as a miss.
+        entry = found.get(key)
+        if entry is None or entry[0] != found.get(self.generation_key, 0):
+            self.shared_misses += 1
+            return MISSING
+        self.shared_hits += 1
+        return entry[1]
+
+    def _keep_local(
+        self, key: str, value: Any, local_generation: int, ttl: Optional[float] = None
+    ) -> None:
+        with self._lock:
+            if self.local_generation != local_generation:
+                return
+            ttl = self.local.ttl if ttl is None else min(ttl, self.local.ttl)
+            self.local.set(key, copy.deepcopy(value), ttl)
+
+    def load_ttl(self) -> float:
+        """
+        How long a value loaded by the current request may be kept.
+        """
+        if reads_from_replica():
+            return min(self.ttl, settings.DB_REPLICA_PIN_SECONDS)
+        return self.ttl
+
+    def get_or_load(self, slug: Any, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `slug`, calling `loader` on a miss.
+        """
+        key = self.key(slug)
+        fresh = is_pinned()
+        value = MISSING if fresh else self.local.get(key)
+        if value is not MISSING:
+            return copy.deepcopy(value)
+
+        local_generation = self.local_generation
+        shared = self.shared
+        if shared is not None:
+            found = shared.get_many([key, self.generation_key])
+            generation = found.get(self.generation_key, 0)
+            value = MISSING if fresh else self._unpack(found, key)
+            if value is not MISSING:
+                self._keep_local(key, value, local_generation)
+                return value
+
+        value = loader()
+        ttl = self.load_ttl()
+        if shared is not None:
+            if shared.get(self.generation_key, 0) != generation:
+                return value
+            shared.set(key, (generation, value), ttl)
+        self._keep_local(key, value, local_generation, ttl)
+        return value
+
+    async def aget_or_load(self, slug: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of `get_or_load`; `loader` is a coroutine function.
+        """
+        key = self.key(slug)
+        fresh = is_pinned()
+        value = MISSING if fresh else self.local.get(key)
+        if value is not MISSING:
+            return copy.deepcopy(value)
+
+        local_generation = self.local_generation
+        shared = self.shared
+        if shared is not None:
+            found = await shared.aget_many([key, self.generation_key])
+            generation = found.get(self.generation_key, 0)
+            value = MISSING if fresh else self._unpack(found, key)
+            if value is not MISSING:
+                self._keep_local(key, value, local_generation)
+                return value
+
+        value = await loader()
+        ttl = self.load_ttl()
+        if shared is not None:
+            if await shared.aget(self.generation_key, 0) != generation:
+                return value
+            await shared.aset(key, (generation, value), ttl)
+        self._keep_local(key, value, local_generation, ttl)
+        return value
+
+    def _drop_local(self, keys: List[str]) -> None:
+        with self._lock:
+            self.local_generation += 1
+            for key in keys:
+                self.local.delete(key)
+
+    def invalidate(self, *slugs: Any) -> None:
+        """
+        Drop the given slugs from both cache levels.
+        """
+        keys = [self.key(slug) for slug in slugs if slug]
+        self._drop_local(keys)
+        if keys and self.shared is not None:
+            self.shared.delete_many(keys)
+
+    async def ainvalidate(self, *slugs: Any) -> None:
+        keys = [self.key(slug) for slug in slugs if slug]
+        self._drop_local(keys)
+        if keys and self.shared is not None:
+            await self.shared.adelete_many(keys)
+
+    def clear(self) -> None:
+        """
+        Drop every entry of this namespace.
+        """
+        with self._lock:
+            self.local_generation += 1
+            self.local.clear()
+        shared = self.shared
+        if shared is not None:
+            shared.add(self.generation_key, 0, None)
+            shared.incr(self.generation_key)
+
+    async def aclear(self) -> None:
+        with self._lock:
+            self.local_generation += 1
+            self.local.clear()
+        shared = self.shared
+        if shared is not None:
+            await shared.aadd(self.generation_key, 0, None)
+            await shared.aincr(self.generation_key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "local": self.local.stats(),
+            "shared": {
+                "alias": self.shared_alias,
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+            },
+            "ttl": self.ttl,
+            "local_ttl": self.local.ttl,
+        }
+
+
+# Every CRUDCache registers itself here so its counters can be reported
+registry: Dict[str, CRUDCache] = {}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Hit/miss/eviction counters for every registered CRUD cache.
+    """
+    return {namespace: cache.stats() for namespace, cache in registry.items()}
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from fastapi import HTTPException
+
+
+class ConnectionPool:
+    """
+    Bounds how many FastAPI requests may hold a database connection at once.
+
+    Each request runs its ORM calls on a thread of its own
+    (`RequestThreadMiddleware`) and Django keeps one connection per thread,
+    so a slot is that thread's connection: it is opened by the request's
+    first query and closed by `release`. At most `size` connections are
+    open at a time; a request that finds every slot taken waits for one,
+    and answers 503 after `timeout` seconds.
+
+    An asyncio semaphore only works on the event loop it was first used on,
+    so there is one per loop. A server process runs a single loop, which
+    makes `size` the process-wide bound; test clients that start a loop
+    per request get a fresh semaphore for each.
+    """
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        # Event loop -> its semaphore
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_ms = 0.0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        The semaphore of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.size)
+        return semaphore
+
+    async def acquire(self) -> None:
+        """
+        Take a slot, waiting up to `timeout` seconds.
+        """
+        semaphore = self.semaphore
+        if semaphore.locked():
+            start = time.perf_counter()
+            with self._lock:
+                self.waits += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="All database connections are busy. Try again shortly.",
+                )
+            finally:
+                with self._lock:
+                    self.wait_ms += (time.perf_counter() - start) * 1000
+        else:
+            await semaphore.acquire()
+
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    async def release(self) -> None:
+        """
+        Close the slot's connection and give the slot back.
+        """
+        try:
+            await sync_to_async(self.close)()
+        finally:
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+        self.semaphore.release()
+
+    async def stream_body(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Wrap a response body that queries the database as it is sent, so it
+        holds a slot until it is done.
+
+        A yield dependency such as `db_connection` is exited before a
+        StreamingResponse sends its body, so a streamed body can't count on
+        its slot. This one is taken here, before the response starts, and a
+        full pool still answers 503. The returned body gives it back when it
+        is finished, fails or is closed.
+        """
+        body = self._hold(stream)
+        # Runs the body up to its first yield, i.e. through acquire()
+        await body.__anext__()
+        return body
+
+    async def _hold(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        await self.acquire()
+        try:
+            yield b""
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await self.release()
+
+    def close(self) -> None:
+        """
+        Close this thread's connections.
+
+        Runs through `sync_to_async`, i.e. on the same thread as the async
+        ORM calls, because Django connections are per thread.
+        """
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None:
+                connection.close()
+                with self._lock:
+                    self.closed += 1
+
+    def on_connection_created(self, sender: Any, connection: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_ms": self.wait_ms,
+                "timeouts": self.timeouts,
+                "connections_opened": self.opened,
+                "connections_closed": self.closed,
+            }
+
+
+pool = ConnectionPool(size=settings.DB_POOL_SIZE, timeout=settings.DB_POOL_TIMEOUT)
+connection_created.connect(pool.on_connection_created, dispatch_uid="db_pool_opened")
+
+
+async def db_connection() -> AsyncIterator[None]:
+    """
+    FastAPI dependency holding a pool slot for the duration of a request.
+    """
+    await pool.acquire()
+    try:
+        yield
+    finally:
+        await pool.release()
+
+
+def pool_stats() -> Dict[str, Any]:
+    return pool.stats()
+
+
+def close_connections() -> None:
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+
+
+class RequestThreadMiddleware:
+    """
+    ASGI middleware giving every HTTP request a thread of its own for the
+    ORM, as Django's ASGIHandler does for its views.
+
+    `sync_to_async` (which the async ORM methods use) runs thread-sensitive
+    code on one process-wide thread unless a `ThreadSensitiveContext` is
+    active, which would serialize every query of every request. Inside the
+    context each request gets its own thread, and so its own connection,
+    which is closed when the request ends because the thread goes with it
+    (routes holding a `ConnectionPool` slot have closed it already).
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with ThreadSensitiveContext():
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                await sync_to_async(close_connections)()
@@ -0,0 +1,193 @@
+import random
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from starlette.requests import HTTPConnection
+
+# Cookie marking a client that wrote recently; its reads stay on the primary
+# until the cookie expires, after DB_REPLICA_PIN_SECONDS
+PIN_COOKIE = "db_pin"
+# The same pin as a signed, timestamped token for clients without a cookie
+# jar: sent with the cookie, and honoured when echoed back in this header
+PIN_HEADER = "X-DB-Pin"
+PIN_SALT = "cafe_arna.db_router.pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Statements that change rows, and so pin the client once committed
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def replicas() -> List[str]:
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+class RequestRouting:
+    """
+    Where one request's reads go. `pinned` is set for a client that wrote
+    recently and `wrote` by the request's first use of the primary for
+    writing (locking reads included); either keeps its reads on the
+    primary. `committed` is set once a statement changing rows has been
+    committed, and is what pins the client for its next requests.
+    """
+
+    def __init__(self, read_alias: str, pinned: bool = False):
+        self.read_alias = read_alias
+        self.pinned = pinned
+        self.wrote = False
+        self.committed = False
+
+
+current: ContextVar[Optional[RequestRouting]] = ContextVar("db_routing", default=None)
+
+
+def is_pinned() -> bool:
+    """
+    Whether the current request must see the client's own recent writes.
+    """
+    state = current.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+def reads_from_replica() -> bool:
+    state = current.get()
+    return state is not None and state.read_alias != DEFAULT_DB_ALIAS and not state.wrote
+
+
+def flag_committed_writes(execute: Callable, sql: str, params: Any, many: bool, context: Dict) -> Any:
+    """
+    Database execute wrapper setting `committed` on the current request's
+    routing once a statement changing rows is committed: right away in
+    autocommit mode, else when the surrounding transaction commits. A
+    rolled back transaction drops the callback, and so never pins.
+    """
+    result = execute(sql, params, many, context)
+    state = current.get()
+    if state is None or state.committed:
+        return result
+    if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        connection = context["connection"]
+        if connection.in_atomic_block:
+            transaction.on_commit(
+                lambda: setattr(state, "committed", True), using=connection.alias
+            )
+        else:
+            state.committed = True
+    return result
+
+
+def install_wrapper(sender: Any = None, connection: Any = None, **kwargs: Any) -> None:
+    # As cafe_arna.query_stats: once per connection object
+    if flag_committed_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(flag_committed_writes)
+
+
+connection_created.connect(install_wrapper, dispatch_uid="db_router_write_wrapper")
+
+
+def pin_token() -> str:
+    return signing.TimestampSigner(salt=PIN_SALT).sign("1")
+
+
+def is_pin_token(token: str, max_age: float) -> bool:
+    try:
+        signing.TimestampSigner(salt=PIN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of safe (GET/HEAD) requests to the
+    replica picked for the request, and every write to the primary.
+
+    The choice is made per request by ReplicaRoutingMiddleware and found
+    through a context variable, which `sync_to_async` carries over to the
+    thread the ORM runs on. Without one (management commands, background
+    workers, on_commit callbacks outside a request) everything goes to the
+    primary. So do reads inside a transaction on the primary, which must
+    see its own writes and locks, and reads after the request wrote.
+    """
+
+    def db_for_read(self, model: Any, **hints: Any) -> str:
+        state = current.get()
+        if state is None or state.wrote or state.read_alias == DEFAULT_DB_ALIAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model: Any, **hints: Any) -> str:
+        state = current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Any, obj2: Any, **hints: Any) -> Optional[bool]:
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> Optional[bool]:
+        # Replicas get the schema through replication
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    ASGI middleware choosing where each HTTP request reads from.
+
+    A safe request reads from a random replica unless its client carries
+    the pin cookie, or echoes the pin token in the `X-DB-Pin` header. A
+    request that committed a write sends both, valid for `pin_seconds`, so
+    the client's next reads see its writes even if the replicas lag behind;
+    one that failed or only read doesn't. Without DATABASE_REPLICAS
+    configured it does nothing.
+    """
+
+    def __init__(self, app: Any, pin_seconds: Optional[float] = None):
+        self.app = app
+        self.pin_seconds = (
+            settings.DB_REPLICA_PIN_SECONDS if pin_seconds is None else pin_seconds
+        )
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        aliases = replicas()
+        if scope["type"] != "http" or not aliases:
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        token = connection.headers.get(PIN_HEADER)
+        pinned = PIN_COOKIE in connection.cookies or (
+            token is not None and is_pin_token(token, self.pin_seconds)
+        )
+        safe = scope["method"] in SAFE_METHODS
+        state = RequestRouting(
+            random.choice(aliases) if safe and not pinned else DEFAULT_DB_ALIAS, pinned
+        )
+        reset_token = current.set(state)
+
+        async def send_with_pin(message: Dict) -> None:
+            if message["type"] == "http.response.start" and state.committed:
+                cookie = (
+                    f"{PIN_COOKIE}=1; Max-Age={max(1, round(self.pin_seconds))}; Path=/; "
+                    "HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode()),
+                    (PIN_HEADER.lower().encode(), pin_token().encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            current.reset(reset_token)
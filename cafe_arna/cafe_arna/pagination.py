@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from django.db.models import Model, Q, QuerySet
+
+# Keyset ordering used by the list endpoints; `id` breaks ties on `name`
+KEYSET_FIELDS: Tuple[str, ...] = ("name", "id")
+
+
+class InvalidCursor(ValueError):
+    """
+    A cursor that `encode_cursor` didn't make, or made for other fields.
+    """
+
+
+def cursor_value(value: Any) -> Any:
+    """
+    JSON form of a keyset value JSON can't hold; filters parse it back.
+    Datetimes keep their microseconds, unlike DjangoJSONEncoder's.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Pack the keyset values of the last row into an opaque cursor.
+    """
+    raw = json.dumps(list(values), separators=(",", ":"), default=cursor_value).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fields: Sequence[str] = KEYSET_FIELDS) -> List[Any]:
+    """
+    Unpack a cursor made by `encode_cursor`; raises `InvalidCursor`.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor("Invalid cursor.")
+    return values
+
+
+def keyset_filter(
+    queryset: QuerySet, cursor: Optional[str], fields: Sequence[str] = KEYSET_FIELDS
+) -> QuerySet:
+    """
+    Order `queryset` by `fields` and keep only the rows after `cursor`.
+
+    (a, b) > (x, y) is spelled out as `a >= x AND (a > x OR (a = x AND b > y))`;
+    the redundant `a >= x` bound lets the database seek on the composite
+    index instead of scanning it from the start. A field prefixed with "-"
+    is descending, and compared with < instead.
+    """
+    queryset = queryset.order_by(*fields)
+    if not cursor:
+        return queryset
+
+    values = decode_cursor(cursor, fields)
+    names = [field.lstrip("-") for field in fields]
+    after = ["lt" if field.startswith("-") else "gt" for field in fields]
+    condition = Q()
+    for position, name in enumerate(names):
+        step = Q(**{f"{name}__{after[position]}": values[position]})
+        for previous, value in zip(names[:position], values[:position]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return queryset.filter(Q(**{f"{names[0]}__{after[0]}e": values[0]}), condition)
+
+
+def next_cursor(
+    rows: List[Union[Model, Dict[str, Any]]], limit: int, fields: Sequence[str] = KEYSET_FIELDS
+) -> Optional[str]:
+    """
+    Cursor for the page after `rows`, or None when `rows` is the last page.
+
+    `rows` is expected to hold up to `limit + 1` rows; the extra row only
+    signals that another page exists and is dropped by the caller. Rows may
+    be model instances or `.values()` dicts.
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    names = [field.lstrip("-") for field in fields]
+    if isinstance(last, dict):
+        return encode_cursor([last[name] for name in names])
+    return encode_cursor([getattr(last, name) for name in names])
@@ -0,0 +1,201 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# Collapse what varies between otherwise identical statements: IN lists of any
+# length, quoted literals and numbers that were inlined instead of bound.
+IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalise `sql` so statements that differ only by parameters compare equal.
+    """
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    return SPACE_RE.sub(" ", sql).strip()
+
+
+class RequestQueries:
+    """
+    Queries run while serving one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.statements: Counter = Counter()
+        self.fingerprints: Counter = Counter()
+
+    def record(self, sql: str, params: Any, duration_ms: float) -> None:
+        self.count += 1
+        self.duration_ms += duration_ms
+        self.statements[(sql, repr(params))] += 1
+        self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> int:
+        """
+        Extra runs of a statement with exactly the same parameters.
+        """
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def n_plus_one(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        Fingerprints run at least `threshold` times with differing parameters,
+        the usual shape of a query issued once per row of an earlier result.
+        """
+        distinct: Counter = Counter()
+        for sql, _ in self.statements:
+            distinct[fingerprint(sql)] += 1
+        return [
+            (sql, self.fingerprints[sql])
+            for sql, variants in distinct.most_common()
+            if variants > 1 and self.fingerprints[sql] >= threshold
+        ]
+
+
+current: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def record_query(execute: Callable, sql: str, params: Any, many: bool, context: Dict) -> Any:
+    """
+    Database execute wrapper feeding the request's `RequestQueries`, if any.
+
+    It is installed on every connection, and the current request is found
+    through a context variable, which `sync_to_async` carries over to the
+    thread the ORM runs on.
+    """
+    queries = current.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.record(sql, params, (time.perf_counter() - start) * 1000)
+
+
+def install_wrapper(sender: Any = None, connection: Any = None, **kwargs: Any) -> None:
+    # Wrappers live on the per-thread connection object, which outlives
+    # reconnects, so only add it once.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_wrapper, dispatch_uid="query_stats_wrapper")
+
+
+class RouteStats:
+    """
+    Aggregated query counters per route, kept when headers are not sent.
+    """
+
+    def __init__(self, max_suspects: int = 5):
+        self.max_suspects = max_suspects
+        self.routes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, route: str, queries: RequestQueries, suspects: List[Tuple[str, int]]) -> None:
+        with self._lock:
+            stats = self.routes.setdefault(
+                route,
+                {
+                    "requests": 0,
+                    "queries": 0,
+                    "max_queries": 0,
+                    "db_ms": 0.0,
+                    "duplicates": 0,
+                    "n_plus_one_requests": 0,
+                    "n_plus_one_suspects": {},
+                },
+            )
+            stats["requests"] += 1
+            stats["queries"] += queries.count
+            stats["max_queries"] = max(stats["max_queries"], queries.count)
+            stats["db_ms"] += queries.duration_ms
+            stats["duplicates"] += queries.duplicates
+            if suspects:
+                stats["n_plus_one_requests"] += 1
+                known = stats["n_plus_one_suspects"]
+                for sql, count in suspects:
+                    if sql in known or len(known) < self.max_suspects:
+                        known[sql] = max(known.get(sql, 0), count)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                route: {
+                    **stats,
+                    "avg_queries": stats["queries"] / stats["requests"],
+                    "avg_db_ms": stats["db_ms"] / stats["requests"],
+                    "n_plus_one_suspects": dict(stats["n_plus_one_suspects"]),
+                }
+                for route, stats in self.routes.items()
+            }
+
+
+route_stats = RouteStats()
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware counting the SQL run by each HTTP request.
+
+    With `headers` on (`QUERY_STATS_HEADERS`, DEBUG by default) the counts
+    go out as `X-DB-*` response headers; otherwise they are folded into
+    `route_stats`. Headers are written when the response starts, so a
+    streamed response only reports the queries run before its first chunk.
+    """
+
+    def __init__(self, app: Any, headers: Optional[bool] = None, threshold: Optional[int] = None):
+        self.app = app
+        self.headers = settings.QUERY_STATS_HEADERS if headers is None else headers
+        self.threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current.set(queries)
+
+        async def send_with_headers(message: Dict) -> None:
+            if message["type"] == "http.response.start":
+                suspects = queries.n_plus_one(self.threshold)
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-db-query-count", str(queries.count).encode()),
+                    (b"x-db-time-ms", f"{queries.duration_ms:.2f}".encode()),
+                    (b"x-db-duplicate-queries", str(queries.duplicates).encode()),
+                    (b"x-db-n-plus-one", str(len(suspects)).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.headers else send)
+        finally:
+            current.reset(token)
+            if not self.headers:
+                # Group by route template; mounted apps (the Django admin)
+                # by their mount point, so raw paths never become keys
+                route = scope.get("route")
+                path = getattr(route, "path", None) or scope.get("root_path") or "(unmatched)"
+                route_stats.add(
+                    f"{scope['method']} {path}", queries, queries.n_plus_one(self.threshold)
+                )
+
+
+def query_stats() -> Dict[str, Dict[str, Any]]:
+    return route_stats.snapshot()
@@ -84,10 +84,88 @@ DATABASES = {
         'USER': DB_USER,
         'PASSWORD': DB_PASSWORD,
         'HOST': DB_HOST,
-        'PORT': DB_PORT
+        'PORT': DB_PORT,
+        # Every request queries on a thread of its own (cafe_arna.db_pool),
+        # so a connection can't outlive its request; reusing connections
+        # takes a pooler in front of MySQL, such as ProxySQL
+        'CONN_MAX_AGE': 0,
     }
 }
 
+# Read replicas (cafe_arna.db_router): one alias per host in DB_REPLICA_HOSTS,
+# with the primary's credentials. GET requests read from a random replica;
+# a client that wrote reads from the primary for DB_REPLICA_PIN_SECONDS
+DB_REPLICA_HOSTS = [host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host]
+DATABASE_REPLICAS = []
+for number, host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['cafe_arna.db_router.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+# FastAPI requests allowed to hold a database connection at once, and how
+# long a request waits for a free slot before a 503 (cafe_arna.db_pool)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cafe-arna',
+    }
+}
+
+# Optional cache shared by every worker process (e.g. redis://localhost:6379/1)
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL')
+if REDIS_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+
+# Read-through cache in front of the CRUD lookups (cafe_arna.cache)
+CRUD_CACHE_MAX_ENTRIES = int(os.getenv('CRUD_CACHE_MAX_ENTRIES', 1024))
+CRUD_CACHE_TTL = int(os.getenv('CRUD_CACHE_TTL', 300))
+CRUD_CACHE_SHARED_ALIAS = 'shared' if REDIS_CACHE_URL else None
+# With the shared cache, how long a process keeps its own copy of an entry,
+# i.e. how late it may see a write made by another process
+CRUD_CACHE_LOCAL_TTL = float(os.getenv('CRUD_CACHE_LOCAL_TTL', 1))
+
+# Per-request query counting (cafe_arna.query_stats): X-DB-* response headers
+# when enabled, aggregated per-route stats otherwise
+QUERY_STATS_HEADERS = DEBUG
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+# Serve the stats endpoints (/query-stats/, /db-pool-stats/, /cache-stats/
+# and the like); they answer 404 unless STATS_ENDPOINTS=1
+STATS_ENDPOINTS = bool(int(os.getenv('STATS_ENDPOINTS', 0)))
+
+# Size, in degrees, of the grid cells of the nearest-cafe index (cafes.geo);
+# 0.01 is about 1.1 km north-south
+GEO_CELL_DEGREES = float(os.getenv('GEO_CELL_DEGREES', 0.01))
+# Cache whose generation counter makes every process rebuild its copy of the
+# index after a cafe moves; without a shared cache there is one process
+GEO_INDEX_CACHE_ALIAS = 'shared' if REDIS_CACHE_URL else None
+
+# Resized thumbnail variants (cafes.thumbnails): widths generated for each
+# upload, never wider than the original, in each of the formats, by a pool
+# of THUMBNAIL_WORKERS background threads
+THUMBNAIL_DIR = 'cafe_thumbnail_variants'
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+THUMBNAIL_FORMATS = ('webp', 'jpeg')
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', 80))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Admin changelists of large tables (cafe_arna.admin_tables) count rows
+# exactly up to this many, and estimate from table statistics beyond it
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', 10000))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -117,6 +195,17 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# `collectstatic` writes content-hashed copies, .gz/.br siblings and the
+# staticfiles.json manifest that cafe_arna.static_files serves them from
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'cafe_arna.static_files.CompressedManifestStaticFilesStorage'},
+}
+
+# Uploaded files (cafe thumbnails and their resized variants)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
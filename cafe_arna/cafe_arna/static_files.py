@@ -0,0 +1,233 @@
+import gzip
+import hashlib
+import json
+import os
+from mimetypes import guess_type
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is in requirements.txt
+    brotli = None
+
+# A year, the longest lifetime caches are expected to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+
+# Precompressed sibling of a static file for each content coding, in the
+# order they are preferred when a client accepts several equally
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_EXTENSIONS = (
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml",
+    ".ico", ".ttf", ".otf", ".eot",
+)
+# Files smaller than this gain nothing from compression
+MIN_COMPRESS_SIZE = 256
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """
+    gzip and, when Brotli is installed, br encodings of `data`, both at
+    their highest level since this runs once at build time.
+    """
+    encoded = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(data, quality=11)
+    return encoded
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    `collectstatic` storage that, on top of the hashed copies and the
+    `staticfiles.json` manifest of ManifestStaticFilesStorage, writes `.gz`
+    and `.br` siblings of every compressible file that they make smaller
+    and lists them in the manifest under "encodings".
+    """
+
+    def post_process(self, paths: Dict[str, Any], dry_run: bool = False, **options: Any):
+        self.encodings: Dict[str, List[str]] = {}
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        # A hashed copy usually has the same bytes as its original; compress
+        # each distinct content once
+        compressed: Dict[bytes, Dict[str, bytes]] = {}
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            written = []
+            digest = hashlib.blake2b(data).digest()
+            if digest not in compressed:
+                compressed[digest] = compress(data)
+            for encoding, content in compressed[digest].items():
+                if len(content) >= len(data):
+                    continue
+                sibling = name + ENCODING_SUFFIXES[encoding]
+                if self.exists(sibling):
+                    self.delete(sibling)
+                self._save(sibling, ContentFile(content))
+                written.append(encoding)
+            if written:
+                self.encodings[name] = [e for e in ENCODING_SUFFIXES if e in written]
+        self.save_manifest()
+
+    def save_manifest(self) -> None:
+        # As ManifestFilesMixin.save_manifest, plus the "encodings" key;
+        # load_manifest() ignores keys it doesn't know
+        self.manifest_hash = self.file_hash(
+            None, ContentFile(json.dumps(sorted(self.hashed_files.items())).encode())
+        )
+        payload = {
+            "paths": self.hashed_files,
+            "version": self.manifest_version,
+            "hash": self.manifest_hash,
+            "encodings": getattr(self, "encodings", {}),
+        }
+        if self.manifest_storage.exists(self.manifest_name):
+            self.manifest_storage.delete(self.manifest_name)
+        contents = json.dumps(payload).encode()
+        self.manifest_storage._save(self.manifest_name, ContentFile(contents))
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """
+    Content codings of an Accept-Encoding header with their q-values.
+    """
+    accepted: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header: Optional[str], available: Sequence[str]) -> Optional[str]:
+    """
+    The best of the `available` codings the client accepts, or None to
+    send the file as is.
+    """
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse that hands the whole file to the server through the ASGI
+    `http.response.zerocopysend` extension (sendfile) when the server
+    offers it, and otherwise streams it in larger chunks.
+    """
+
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if not self.zero_copy or send_header_only:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({"type": "http.response.zerocopysend", "file": file, "more_body": False})
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files whose names change whenever their content does (content
+    hashes), so every response may be cached forever without revalidation.
+    """
+
+    def file_response(self, full_path: Any, stat_result: Any, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Serves a `collectstatic` directory built by
+    CompressedManifestStaticFilesStorage.
+
+    The manifest tells which files are hashed copies, cached forever, and
+    which have `.br`/`.gz` siblings. Those are sent with the matching
+    Content-Encoding when Accept-Encoding allows, so nothing is compressed
+    per request. Unhashed names are revalidated with their ETag. Without a
+    manifest every file is served as is.
+    """
+
+    def __init__(self, *args: Any, manifest_name: str = "staticfiles.json", **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.manifest_name = manifest_name
+        self._hashed: Optional[Set[str]] = None
+        self._encodings: Dict[str, List[str]] = {}
+
+    def load_manifest(self) -> None:
+        self._hashed, self._encodings = set(), {}
+        if self.directory is None:
+            return
+        try:
+            with open(os.path.join(self.directory, self.manifest_name), "rb") as manifest:
+                stored = json.load(manifest)
+        except (OSError, ValueError):
+            return
+        self._hashed = set(stored.get("paths", {}).values())
+        self._encodings = stored.get("encodings", {})
+
+    def file_response(self, full_path: Any, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        if self._hashed is None:
+            self.load_manifest()
+        name = os.path.relpath(full_path, os.path.realpath(self.directory))
+        name = name.replace(os.sep, "/")
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if name in self._hashed else "no-cache"
+        }
+        request_headers = Headers(scope=scope)
+        path, media_type = full_path, guess_type(str(full_path))[0]
+        available = self._encodings.get(name)
+        if available:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate_encoding(request_headers.get("accept-encoding"), available)
+            if encoding is not None:
+                try:
+                    sibling = f"{full_path}{ENCODING_SUFFIXES[encoding]}"
+                    stat_result = os.stat(sibling)
+                    path = sibling
+                    headers["Content-Encoding"] = encoding
+                except OSError:
+                    pass
+
+        response = ZeroCopyFileResponse(
+            path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
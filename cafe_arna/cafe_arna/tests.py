@@ -0,0 +1,582 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import mock
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from benchmarks import load
+from benchmarks.common import summarize
+from cafe_arna import db_router
+from cafe_arna.asgi import app
+from cafe_arna.cache import CRUDCache, registry
+from cafe_arna.db_pool import ConnectionPool, RequestThreadMiddleware
+from cafe_arna.db_pool import pool as db_pool
+from cafe_arna.encoders import SchemaEncoder
+from cafe_arna.pagination import InvalidCursor, decode_cursor, encode_cursor
+from cafe_arna.query_stats import QueryStatsMiddleware, RequestQueries, fingerprint, route_stats
+from cafe_arna.static_files import (
+    IMMUTABLE_CACHE_CONTROL,
+    CompressedManifestStaticFilesStorage,
+    PrecompressedStaticFiles,
+    negotiate_encoding,
+)
+from cafe_arna.uploads import sniff_image
+from cafes.cafe_api import cafe_cache, menu_item_cache, menu_item_crud
+from cafes.models import Cafe, MenuItem
+from cafes.schema import CafeListOut, MenuItemListOut
+from cafes.tests import API, APITestCase, image_bytes, make_cafe, make_menu_item
+
+
+class CRUDCacheTests(TestCase):
+    def setUp(self):
+        cafe_cache.clear()
+        menu_item_cache.clear()
+        self.item = make_menu_item(make_cafe())
+
+    def test_menu_items_are_cached_by_id(self):
+        with self.assertNumQueries(1):
+            menu_item_crud.get(self.item.pk)
+        with self.assertNumQueries(0):
+            cached = menu_item_crud.get(self.item.pk)
+        self.assertEqual(cached.cafe.name, "Blue Door")
+
+    def test_callers_get_their_own_copy(self):
+        first = menu_item_crud.get(self.item.pk)
+        first.name = "Changed by one request"
+        first.cafe.name = "Changed too"
+        second = menu_item_crud.get(self.item.pk)
+        self.assertEqual(second.name, "Latte")
+        self.assertEqual(second.cafe.name, "Blue Door")
+
+    def shared_cache(self, namespace):
+        # The "default" cache stands in for the one shared by every process
+        cache = CRUDCache(namespace, shared_alias="default")
+        self.addCleanup(registry.pop, namespace, None)
+        self.addCleanup(cache.clear)
+        return cache
+
+    @override_settings(CRUD_CACHE_LOCAL_TTL=1)
+    def test_a_shared_backend_limits_how_long_the_process_copy_lasts(self):
+        here = self.shared_cache("crud-test")
+        elsewhere = self.shared_cache("crud-test")
+        with mock.patch("cafe_arna.cache.time.monotonic", return_value=100):
+            here.get_or_load("slug", lambda: "before")
+            elsewhere.invalidate("slug")
+            self.assertEqual(here.get_or_load("slug", lambda: "after"), "before")
+        with mock.patch("cafe_arna.cache.time.monotonic", return_value=102):
+            self.assertEqual(here.get_or_load("slug", lambda: "after"), "after")
+
+    def test_a_load_overlapping_a_clear_elsewhere_is_not_kept(self):
+        cache = self.shared_cache("crud-test")
+        elsewhere = self.shared_cache("crud-test")
+
+        def load_while_another_process_clears():
+            elsewhere.clear()
+            return "stale"
+
+        self.assertEqual(cache.get_or_load("slug", load_while_another_process_clears), "stale")
+        self.assertEqual(cache.get_or_load("slug", lambda: "fresh"), "fresh")
+
+    def test_a_load_overlapping_an_invalidation_is_not_kept(self):
+        def load_while_the_row_changes():
+            cafe_cache.invalidate("blue-door")
+            return "stale"
+
+        cafe_cache.get_or_load("blue-door", load_while_the_row_changes)
+        self.assertEqual(cafe_cache.get_or_load("blue-door", lambda: "fresh"), "fresh")
+
+
+class KeysetPaginationTests(APITestCase):
+    def pages(self, path):
+        names, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.api.get(f"{API}{path}", params=params)
+            self.assertEqual(response.status_code, 200)
+            names.extend(row["name"] for row in response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                return names
+
+    def test_cursor_pages_list_every_cafe_once(self):
+        for name in ["Echo", "Bravo", "Delta", "Alpha", "Charlie"]:
+            make_cafe(name)
+        self.assertEqual(self.pages("/cafes/"), ["Alpha", "Bravo", "Charlie", "Delta", "Echo"])
+
+    def test_cursor_pages_break_name_ties_by_id(self):
+        for name in ["One", "Two", "Three"]:
+            make_menu_item(make_cafe(name), "Latte")
+        self.assertEqual(self.pages("/menu-items/"), ["Latte"] * 3)
+
+    def test_invalid_cursor_is_400(self):
+        make_cafe()
+        response = self.api.get(f"{API}/cafes/", params={"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_cursors_raise_invalid_cursor(self):
+        for cursor in ("not-a-cursor", encode_cursor(["Blue Door"]), encode_cursor({"id": 1})):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_cursor_round_trip(self):
+        moment = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor([moment, Decimal("3.50"), 7])
+        self.assertEqual(
+            decode_cursor(cursor, ("-created_on", "price", "id")),
+            [moment.isoformat(), "3.50", 7],
+        )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_streamed_body_holds_a_slot_until_sent(self):
+        pool = ConnectionPool(size=1, timeout=0.05)
+        seen = []
+
+        async def rows():
+            for chunk in (b"a", b"b"):
+                seen.append(pool.in_use)
+                yield chunk
+
+        async def send():
+            body = await pool.stream_body(rows())
+            self.assertEqual(pool.in_use, 1)
+            return b"".join([chunk async for chunk in body])
+
+        self.assertEqual(asyncio.run(send()), b"ab")
+        self.assertEqual(seen, [1, 1])
+        self.assertEqual(pool.in_use, 0)
+
+    def test_full_pool_answers_503_before_the_body_starts(self):
+        pool = ConnectionPool(size=1, timeout=0.05)
+
+        async def export_while_busy():
+            await pool.acquire()
+            try:
+                await pool.stream_body(iter_empty())
+            finally:
+                await pool.release()
+
+        async def iter_empty():
+            return
+            yield
+
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(export_while_busy())
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(pool.in_use, 0)
+
+    def test_each_event_loop_gets_its_own_semaphore(self):
+        pool = ConnectionPool(size=1, timeout=0.05)
+
+        async def wait_on_a_busy_pool():
+            await pool.acquire()
+            try:
+                with self.assertRaises(HTTPException):
+                    await pool.acquire()
+            finally:
+                await pool.release()
+
+        # The second loop would fail with "bound to a different event loop"
+        # on a semaphore shared with the first
+        asyncio.run(wait_on_a_busy_pool())
+        asyncio.run(wait_on_a_busy_pool())
+        self.assertEqual(pool.timeouts, 2)
+
+
+class ConnectionPoolSlotTests(TransactionTestCase):
+    def test_each_slot_holds_a_connection_of_its_own(self):
+        pool = ConnectionPool(size=2, timeout=1)
+        barrier = threading.Barrier(2, timeout=5)
+        held = []
+        inner = FastAPI()
+
+        @inner.get("/")
+        async def query_while_the_other_slot_is_taken():
+            def query():
+                connection.ensure_connection()
+                held.append(connection.connection)
+                barrier.wait()
+
+            await pool.acquire()
+            try:
+                await sync_to_async(query)()
+            finally:
+                await pool.release()
+
+        async def send_concurrently():
+            transport = httpx.ASGITransport(app=RequestThreadMiddleware(inner))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*(client.get("/") for _ in range(2)))
+
+        responses = asyncio.run(send_concurrently())
+        self.assertEqual([response.status_code for response in responses], [200] * 2)
+        self.assertEqual(pool.peak_in_use, 2)
+        self.assertIsNot(held[0], held[1])
+        # Giving a slot back closes its connection
+        self.assertEqual(pool.closed, 2)
+
+
+class RequestThreadMiddlewareTests(SimpleTestCase):
+    def test_requests_run_sync_code_on_threads_of_their_own(self):
+        # Each request waits for the others inside sync_to_async: on one
+        # shared thread the barrier would time out
+        barrier = threading.Barrier(3, timeout=5)
+        threads = set()
+        inner = FastAPI()
+
+        @inner.get("/")
+        async def wait_for_the_others():
+            def wait():
+                threads.add(threading.get_ident())
+                barrier.wait()
+
+            await sync_to_async(wait)()
+
+        async def send_concurrently():
+            transport = httpx.ASGITransport(app=RequestThreadMiddleware(inner))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*(client.get("/") for _ in range(3)))
+
+        responses = asyncio.run(send_concurrently())
+        self.assertEqual([response.status_code for response in responses], [200] * 3)
+        self.assertEqual(len(threads), 3)
+
+
+class ExportPoolTests(APITestCase):
+    def test_export_gives_its_slot_back(self):
+        make_cafe()
+        response = self.api.get(f"{API}/export/cafes/")
+        self.assertEqual(len(response.text.splitlines()), 1)
+        self.assertEqual(db_pool.in_use, 0)
+        self.assertGreater(db_pool.acquired, 0)
+
+
+class QueryStatsTests(SimpleTestCase):
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+
+    def test_per_row_queries_are_n_plus_one(self):
+        queries = RequestQueries()
+        for pk in range(5):
+            queries.record("SELECT * FROM t WHERE id = %s", (pk,), 1.0)
+        self.assertEqual(queries.n_plus_one(5), [("SELECT * FROM t WHERE id = %s", 5)])
+        self.assertEqual(queries.n_plus_one(6), [])
+        self.assertEqual(queries.duplicates, 0)
+
+    def test_repeating_one_statement_is_a_duplicate(self):
+        queries = RequestQueries()
+        for _ in range(5):
+            queries.record("SELECT * FROM t WHERE id = %s", (1,), 1.0)
+        self.assertEqual(queries.n_plus_one(2), [])
+        self.assertEqual(queries.duplicates, 4)
+
+
+class QueryStatsMiddlewareTests(APITestCase):
+    def client_for(self, **options):
+        inner = FastAPI()
+
+        @inner.get("/menus/")
+        async def menus():
+            def names():
+                return [
+                    [item.name for item in MenuItem.objects.filter(cafe=cafe)]
+                    for cafe in Cafe.objects.all()
+                ]
+
+            return await sync_to_async(names)()
+
+        return TestClient(QueryStatsMiddleware(inner, **options))
+
+    def test_headers_report_the_request_queries(self):
+        for name in ("Blue Door", "Red Door", "Green Door"):
+            make_menu_item(make_cafe(name))
+        response = self.client_for(headers=True, threshold=3).get("/menus/")
+        self.assertEqual(response.headers["x-db-query-count"], "4")
+        self.assertEqual(response.headers["x-db-duplicate-queries"], "0")
+        self.assertEqual(response.headers["x-db-n-plus-one"], "1")
+
+    def test_without_headers_counts_are_kept_per_route(self):
+        route_stats.routes.clear()
+        make_cafe()
+        response = self.client_for(headers=False).get("/menus/")
+        self.assertNotIn("x-db-query-count", response.headers)
+        stats = route_stats.snapshot()["GET /menus/"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["queries"], 2)
+
+
+class SchemaEncoderTests(TestCase):
+    def assertEncodesLikeSchema(self, schema, queryset):
+        encoder = SchemaEncoder(schema)
+        expected = [json.loads(schema.model_validate(obj).model_dump_json()) for obj in queryset]
+        self.assertEqual(json.loads(encoder.encode(queryset.values(*encoder.fields))), expected)
+
+    def test_menu_items_encode_like_their_schema(self):
+        cafe = make_cafe()
+        make_menu_item(cafe, price="3.50")
+        make_menu_item(cafe, "Cake", price="12.05", description="Lemon")
+        self.assertEncodesLikeSchema(MenuItemListOut, MenuItem.objects.order_by("id"))
+
+    def test_cafes_encode_like_their_schema(self):
+        make_cafe(latitude=51.5, longitude=-0.1)
+        make_cafe("Red Door")
+        self.assertEncodesLikeSchema(CafeListOut, Cafe.objects.order_by("id"))
+
+    def test_prices_are_numbers(self):
+        row = SchemaEncoder(MenuItemListOut).row(
+            {field: None for field in MenuItemListOut.model_fields} | {"price": Decimal("3.50")}
+        )
+        self.assertEqual(row["price"], 3.5)
+        self.assertIsInstance(row["price"], float)
+
+
+class UploadTests(SimpleTestCase):
+    def test_sniffing_ignores_the_claimed_type(self):
+        self.assertEqual(sniff_image(image_bytes(format="PNG")[:12]), ("image/png", "png"))
+        self.assertEqual(sniff_image(image_bytes(format="WEBP")[:12]), ("image/webp", "webp"))
+        self.assertIsNone(sniff_image(b"<svg xmlns='"))
+
+
+class PrecompressedStaticFilesTests(SimpleTestCase):
+    CSS = b"body { color: #333; }\n" * 40
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        for name, content in (("site.css", self.CSS), ("tiny.css", b"p{}")):
+            with open(os.path.join(self.root, name), "wb") as file:
+                file.write(content)
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        paths = {name: (storage, name) for name in ("site.css", "tiny.css")}
+        list(storage.post_process(paths))
+        self.hashed = storage.hashed_files["site.css"]
+        self.client = TestClient(PrecompressedStaticFiles(directory=self.root))
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, br", ["br", "gzip"]), "br")
+        self.assertEqual(negotiate_encoding("br;q=0.5, gzip", ["br", "gzip"]), "gzip")
+        self.assertEqual(negotiate_encoding("*;q=0.1, br;q=0", ["br", "gzip"]), "gzip")
+        self.assertIsNone(negotiate_encoding("identity", ["br", "gzip"]))
+        self.assertIsNone(negotiate_encoding(None, ["br", "gzip"]))
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        response = self.client.get(f"/{self.hashed}", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.content, self.CSS)
+
+        response = self.client.get(f"/{self.hashed}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.content, self.CSS)
+
+    def test_identity_when_no_encoding_is_accepted(self):
+        response = self.client.get(f"/{self.hashed}", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.content, self.CSS)
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get("/site.css")
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        response = self.client.get("/site.css", headers={"If-None-Match": response.headers["etag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_files_are_not_compressed(self):
+        self.assertFalse(os.path.exists(os.path.join(self.root, "tiny.css.gz")))
+        response = self.client.get("/tiny.css", headers={"Accept-Encoding": "gzip, br"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertNotIn("vary", response.headers)
+
+
+class StatsEndpointsTests(APITestCase):
+    PATHS = [
+        "/api/fa/v1/db-pool-stats/",
+        "/api/fa/v1/query-stats/",
+        f"{API}/cache-stats/",
+        f"{API}/search/stats/",
+        f"{API}/cafes/nearby/stats/",
+        f"{API}/cafes/thumbnails/stats/",
+    ]
+
+    def test_hidden_by_default(self):
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                self.assertEqual(self.api.get(path).status_code, 404)
+
+    @override_settings(STATS_ENDPOINTS=True)
+    def test_served_when_enabled(self):
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                self.assertEqual(self.api.get(path).status_code, 200)
+
+
+class DjangoAdminMountTests(APITestCase):
+    def test_admin_is_served_under_the_mount(self):
+        response = self.api.get("/django/admin/", follow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers["location"], "/django/admin/login/?next=/django/admin/")
+        response = self.api.get("/django/admin/login/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('action="/django/admin/login/"', response.text)
+
+    def test_login_and_changelist(self):
+        get_user_model().objects.create_superuser("admin", "admin@example.com", "secret")
+        make_cafe()
+        self.api.get("/django/admin/login/")
+        response = self.api.post(
+            "/django/admin/login/?next=/django/admin/cafes/cafe/",
+            data={
+                "username": "admin",
+                "password": "secret",
+                "csrfmiddlewaretoken": self.api.cookies["csrftoken"],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url.path, "/django/admin/cafes/cafe/")
+        self.assertIn("Blue Door", response.text)
+
+
+class LoadHarnessTests(APITestCase):
+    def test_every_mix_runs_without_errors(self):
+        cafes = [make_cafe(name) for name in ("Blue Door", "Red Door", "Green Door")]
+        items = [make_menu_item(cafe) for cafe in cafes]
+        ctx_args = {
+            "slugs": [cafe.slug for cafe in cafes],
+            "item_ids": [item.pk for item in items],
+            "seed": 1,
+        }
+        for name, mix in load.MIXES.items():
+            with self.subTest(mix=name):
+                results = asyncio.run(load.run(app, ctx_args, mix, 30, 3))
+                self.assertEqual(results["(all)"]["count"], 30)
+                self.assertEqual(
+                    {route: stats["errors"] for route, stats in results.items()},
+                    dict.fromkeys(results, 0),
+                )
+
+    def test_summarize(self):
+        stats = summarize([float(ms) for ms in range(100, 0, -1)])
+        self.assertEqual(
+            (stats["count"], stats["mean_ms"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]),
+            (100, 50.5, 51.0, 95.0, 99.0),
+        )
+
+    def test_compare_flags_regressions_beyond_the_tolerance(self):
+        before = {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "req_per_s": 100.0}
+        baseline = {"routes": {"GET /cafes/": before}}
+        slower = {**before, "p95_ms": 23.0}
+        fewer = {**before, "req_per_s": 85.0}
+        with mock.patch("builtins.print"):
+            self.assertFalse(load.compare({"GET /cafes/": before}, baseline, 0.10))
+            self.assertTrue(load.compare({"GET /cafes/": slower}, baseline, 0.10))
+            self.assertTrue(load.compare({"GET /cafes/": fewer}, baseline, 0.10))
+            self.assertFalse(load.compare({"GET /menus/": slower}, baseline, 0.10))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def route(self, state):
+        token = db_router.current.set(state)
+        self.addCleanup(db_router.current.reset, token)
+        return db_router.ReplicaRouter()
+
+    def test_reads_go_to_the_request_replica_until_it_writes(self):
+        state = db_router.RequestRouting("replica")
+        router = self.route(state)
+        self.assertEqual(router.db_for_read(Cafe), "replica")
+        self.assertEqual(router.db_for_write(Cafe), "default")
+        self.assertEqual(router.db_for_read(Cafe), "default")
+        # Routing for a write isn't a committed write
+        self.assertFalse(state.committed)
+
+    def test_without_a_request_everything_uses_the_primary(self):
+        router = db_router.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Cafe), "default")
+        self.assertEqual(router.db_for_write(Cafe), "default")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaPinningTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        inner = FastAPI()
+
+        @inner.get("/read-alias/")
+        async def read_alias():
+            return db_router.current.get().read_alias
+
+        @inner.post("/cafes/")
+        async def create(fail: bool = False, rollback: bool = False):
+            def write():
+                with transaction.atomic():
+                    make_cafe()
+                    if rollback:
+                        raise IntegrityError
+
+            if fail:
+                raise HTTPException(status_code=400)
+            try:
+                await sync_to_async(write)()
+            except IntegrityError:
+                raise HTTPException(status_code=409)
+
+        @inner.post("/lock/")
+        async def lock():
+            def read_for_update():
+                with transaction.atomic():
+                    list(Cafe.objects.select_for_update())
+
+            await sync_to_async(read_for_update)()
+
+        self.client = TestClient(db_router.ReplicaRoutingMiddleware(inner, pin_seconds=5))
+
+    def test_a_committed_write_pins_the_client(self):
+        self.assertEqual(self.client.get("/read-alias/").json(), "replica")
+        response = self.client.post("/cafes/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Max-Age=5", response.headers["set-cookie"])
+        self.assertEqual(self.client.get("/read-alias/").json(), "default")
+
+    def test_clients_without_cookies_pin_with_the_header(self):
+        token = self.client.post("/cafes/").headers["x-db-pin"]
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get("/read-alias/").json(), "replica")
+        headers = {"X-DB-Pin": token}
+        self.assertEqual(self.client.get("/read-alias/", headers=headers).json(), "default")
+        forged = {"X-DB-Pin": token[:-1] + ("A" if token[-1] != "A" else "B")}
+        self.assertEqual(self.client.get("/read-alias/", headers=forged).json(), "replica")
+        with mock.patch("django.core.signing.time.time", return_value=time.time() + 6):
+            self.assertEqual(self.client.get("/read-alias/", headers=headers).json(), "replica")
+
+    def test_a_failed_request_does_not_pin(self):
+        response = self.client.post("/cafes/", params={"fail": True})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("set-cookie", response.headers)
+        self.assertNotIn("x-db-pin", response.headers)
+
+    def test_a_rolled_back_write_does_not_pin(self):
+        response = self.client.post("/cafes/", params={"rollback": True})
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn("set-cookie", response.headers)
+        self.assertFalse(Cafe.objects.exists())
+
+    def test_a_locking_read_does_not_pin(self):
+        response = self.client.post("/lock/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("set-cookie", response.headers)
+        self.assertEqual(self.client.get("/read-alias/").json(), "replica")
@@ -0,0 +1,100 @@
+import hashlib
+import tempfile
+from typing import IO, Optional, Tuple
+
+from django.conf import settings
+from fastapi import HTTPException, Request
+
+# Leading bytes of each accepted image format: (offset, signature)
+IMAGE_SIGNATURES = (
+    (((0, b"\xff\xd8\xff"),), ("image/jpeg", "jpg")),
+    (((0, b"\x89PNG\r\n\x1a\n"),), ("image/png", "png")),
+    (((0, b"GIF87a"),), ("image/gif", "gif")),
+    (((0, b"GIF89a"),), ("image/gif", "gif")),
+    (((0, b"RIFF"), (8, b"WEBP")), ("image/webp", "webp")),
+)
+# Bytes needed to tell the formats above apart
+SNIFF_BYTES = 12
+
+
+def sniff_image(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    `(content type, extension)` of an image from its first bytes, whatever
+    name or Content-Type the client sent; None for anything else.
+    """
+    for signature, kind in IMAGE_SIGNATURES:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in signature):
+            return kind
+    return None
+
+
+class StreamedUpload:
+    """
+    A request body spooled to memory, or to a temporary file past
+    `FILE_UPLOAD_MAX_MEMORY_SIZE`, with its size and SHA-256 worked out
+    while it was read.
+    """
+
+    def __init__(self) -> None:
+        self.file: IO[bytes] = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        self.size = 0
+        self.head = b""
+        self.content_type: Optional[str] = None
+        self.extension: Optional[str] = None
+        self._hash = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+
+    def close(self) -> None:
+        self.file.close()
+
+
+async def receive_image(request: Request, max_size: int) -> StreamedUpload:
+    """
+    Read an image request body chunk by chunk. Fails with 413 as soon as
+    it grows past `max_size` bytes (or declares so in Content-Length) and
+    with 415 as soon as its first bytes aren't a supported image, without
+    reading the rest.
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_size:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {max_size} bytes.")
+
+    upload = StreamedUpload()
+    try:
+        async for chunk in request.stream():
+            upload.write(chunk)
+            if upload.size > max_size:
+                raise HTTPException(
+                    status_code=413, detail=f"Uploads are limited to {max_size} bytes."
+                )
+            if upload.content_type is None and len(upload.head) >= SNIFF_BYTES:
+                kind = sniff_image(upload.head)
+                if kind is None:
+                    raise HTTPException(
+                        status_code=415, detail="Only JPEG, PNG, GIF and WebP images are accepted."
+                    )
+                upload.content_type, upload.extension = kind
+        if upload.size == 0:
+            raise HTTPException(status_code=400, detail="The upload is empty.")
+        if upload.content_type is None:
+            # Shorter than SNIFF_BYTES: too short to be an image
+            raise HTTPException(
+                status_code=415, detail="Only JPEG, PNG, GIF and WebP images are accepted."
+            )
+    except BaseException:
+        upload.close()
+        raise
+    upload.file.seek(0)
+    return upload
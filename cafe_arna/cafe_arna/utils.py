@@ -7,6 +7,9 @@ import string
 import unicodedata
 
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
 from django.utils.html import strip_tags
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
@@ -19,7 +22,7 @@ from django.utils.translation import gettext_lazy as _
 # 100MB 104857600
 # 250MB - 214958080
 # 500MB - 429916160
-MAX_UPLOAD_SIZE = "5242880"
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
 
 
 def random_string_generator(size=10, chars=string.ascii_lowercase + string.digits):
@@ -27,31 +30,12 @@ def random_string_generator(size=10, chars=string.ascii_lowercase + string.digit
 
 
 def unique_key_generator(instance):
-    size = random.randint(30, 45)
-    key_id = random_string_generator(size=size)
-
-    Klass = instance.__class__
-    qs_exists = Klass.objects.filter(key=key_id).exists()
-    if qs_exists:
-        return unique_slug_generator(instance)
-    return key_id
-
-
-def unique_slug_generator(instance, new_slug=None):
-    if new_slug is not None:
-        slug = new_slug
-    else:
-        slug = slugify(instance.title)
-
     Klass = instance.__class__
-    qs_exists = Klass.objects.filter(slug=slug).exists()
-    if qs_exists:
-        new_slug = "{slug}-{randstr}".format(
-            slug=slug,
-            randstr=random_string_generator(size=4)
-        )
-        return unique_slug_generator(instance, new_slug=new_slug)
-    return slug
+    while True:
+        size = random.randint(30, 45)
+        key_id = random_string_generator(size=size)
+        if not Klass.objects.filter(key=key_id).exists():
+            return key_id
 
 
 def get_ip_address(request):
@@ -94,14 +78,14 @@ def validate_doc_image_file_extension(value):
         return value
 
 
-# Size less than # 5MB - 5242880
+# Size less than MAX_UPLOAD_SIZE
 def validate_file_size(value):
     filesize = value.size
-    if filesize < 0 or filesize > 5242880:
+    if filesize < 0 or filesize > MAX_UPLOAD_SIZE:
         raise ValidationError(
-            _("The file size is unacceptable! Enter size less than 5MB."),
+            _("The file size is unacceptable! Enter size less than %(limit)sMB."),
             code='invalid',
-            params={'value': value},
+            params={'value': value, 'limit': MAX_UPLOAD_SIZE // (1024 * 1024)},
         )
     else:
         return value
@@ -141,28 +125,56 @@ def get_last_name(self):
 
 
 def generate_username(self, full_name, Model):
-    name = full_name.lower()
-    name = name.split(' ')
+    """
+    Pick a free username for `full_name` and set it on `self`.
+
+    Tries "<first initial><last name>", then "<first name><last initial>"
+    (one query for both), then "<first name><n>" where n follows the largest
+    number in use. That maximum comes from one aggregate over the index
+    range "<first name>0" <= username < "<first name>:" (":" sorts right
+    after "9"), so the regex only checks usernames already known to be the
+    first name followed by a digit.
+    """
+    name = full_name.lower().split()
     lastname = name[-1]
     firstname = name[0]
-    self.username = '%s%s' % (firstname[0], lastname)
-    if Model.objects.filter(username=self.username).count() > 0:
-        username = '%s%s' % (firstname, lastname[0])
-        if Model.objects.filter(username=self.username).count() > 0:
-            users = Model.objects.filter(username__regex=r'^%s[1-9]{1,}$' % firstname).order_by(
-                'username').values(
-                'username')
-            if len(users) > 0:
-                last_number_used = sorted(
-                    map(lambda x: int(x['username'].replace(firstname, '')), users))
-                last_number_used = last_number_used[-1]
-                number = last_number_used + 1
-                self.username = '%s%s' % (firstname, number)
-            else:
-                self.username = '%s%s' % (firstname, 1)
+    candidates = ['%s%s' % (firstname[0], lastname), '%s%s' % (firstname, lastname[0])]
+    taken = set(
+        Model.objects.filter(username__in=candidates).values_list('username', flat=True)
+    )
+    for candidate in candidates:
+        if candidate not in taken:
+            self.username = candidate
+            return self.username
+
+    last_number_used = Model.objects.filter(
+        username__gte='%s0' % firstname,
+        username__lt='%s:' % firstname,
+        username__regex=r'^%s[0-9]+$' % re.escape(firstname),
+    ).aggregate(
+        number=Max(Cast(Substr('username', len(firstname) + 1), BigIntegerField()))
+    )['number'] or 0
+    self.username = '%s%s' % (firstname, last_number_used + 1)
     return self.username
 
 
+def save_with_generated_username(instance, full_name, attempts=5):
+    """
+    Save `instance` under a username from `generate_username`, generating a
+    new one when a concurrent signup takes it first.
+    """
+    Model = instance.__class__
+    for _ in range(attempts):
+        generate_username(instance, full_name, Model)
+        try:
+            with transaction.atomic():
+                instance.save()
+            return instance
+        except IntegrityError:
+            if not Model.objects.filter(username=instance.username).exists():
+                raise
+    raise IntegrityError('Could not find a free username for %r.' % full_name)
+
 
 def random_string(size: int, chars: str = string.ascii_lowercase+string.digits) -> str:
     """
@@ -200,6 +212,39 @@ def unique_slug_generator(value, new_slug=False):
     return slugify(value)
 
 
+# Room kept at the end of a slug for a "-<number>" collision suffix
+SLUG_SUFFIX_ROOM = 8
+
+
+def allocate_unique_slug(Model, value, field='slug'):
+    """
+    Return a slug for `value` that is free in `Model`, using one query.
+    All slugs starting with the base slug are fetched at once and the
+    next free "-<number>" suffix is picked in memory, so popular names
+    don't cost one exists() probe per collision.
+
+    Two concurrent callers can still pick the same slug; the unique
+    constraint catches that and the caller should allocate again.
+    """
+    max_length = Model._meta.get_field(field).max_length
+    base = slugify(value)[:max_length - SLUG_SUFFIX_ROOM].strip('-_')
+    if not base:
+        base = random_string(SLUG_SUFFIX_ROOM)
+
+    pattern = re.compile(r'^%s(?:-(\d+))?$' % re.escape(base))
+    taken = Model.objects.filter(
+        **{f'{field}__startswith': base}
+    ).values_list(field, flat=True)
+    suffixes = []
+    for slug in taken:
+        match = pattern.match(slug)
+        if match:
+            suffixes.append(int(match.group(1) or 1))
+    if not suffixes:
+        return base
+    return f"{base}-{max(suffixes) + 1}"
+
+
 def count_words(content):
     """Count all the words received from a parameter."""
     matching_words = re.findall(r'\w+', content)
@@ -1,45 +1,80 @@
 from django.contrib import admin
+from cafe_arna.admin_tables import LargeTableAdminMixin
+from .cafe_api import cafe_cache, menu_item_cache
 from .models import Cafe, MenuItem
 
 
 # Register your models here.
-class CafeAdmin(admin.ModelAdmin):
+class CafeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
-    Admin for the Cafe Model
+    Admin for the Cafe Model, in large-table mode (cafe_arna.admin_tables)
     """
     list_display = ['name', 'location', 'opening_time', 'closing_time', 'is_active', 'created_on', 'updated']
     list_display_links = ['name']
     list_filter = ['is_active', 'created_on', 'updated']
-    search_fields = ['name', 'location']
+    search_fields = ['^name', '^location']
     list_editable = ['is_active']
     list_per_page = 10
     ordering = ('-created_on',)
+    keyset_ordering = ('-created_on', '-id')
 
     def save_model(self, request, obj, form, change):
         if not obj.created_by:
             obj.created_by = request.user
         obj.updated_by = request.user
         super().save_model(request, obj, form, change)
+        cafe_cache.invalidate(form.initial.get('slug'), obj.slug)
+        menu_item_cache.clear()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cafe_cache.invalidate(obj.slug)
+        menu_item_cache.clear()
+
+    def delete_queryset(self, request, queryset):
+        slugs = list(queryset.values_list('slug', flat=True))
+        super().delete_queryset(request, queryset)
+        cafe_cache.invalidate(*slugs)
+        menu_item_cache.clear()
 
 admin.site.register(Cafe, CafeAdmin)
 
 
-class MenuItemAdmin(admin.ModelAdmin):
+class MenuItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
-    Admin for the MenuItem Model
+    Admin for the MenuItem Model, in large-table mode (cafe_arna.admin_tables)
     """
     list_display = ['name', 'cafe', 'price', 'is_available', 'created_on', 'updated']
     list_display_links = ['name']
     list_filter = ['is_available', 'created_on', 'updated']
-    search_fields = ['name', 'description', 'cafe__name']
+    search_fields = ['^name', '^cafe__name']
     list_editable = ['is_available']
     list_per_page = 10
     ordering = ('-created_on',)
+    keyset_ordering = ('-created_on', '-id')
+    # The cafe's name comes with the row instead of one query per row, and
+    # the description is left out
+    list_select_related = ['cafe']
+    list_only = [
+        'id', 'name', 'cafe', 'cafe__name', 'price', 'is_available',
+        'created_on', 'updated', 'created_by', 'updated_by',
+    ]
 
     def save_model(self, request, obj, form, change):
         if not obj.created_by:
             obj.created_by = request.user
         obj.updated_by = request.user
         super().save_model(request, obj, form, change)
+        menu_item_cache.invalidate(obj.pk)
+
+    def delete_model(self, request, obj):
+        # delete() clears obj.pk
+        pk = obj.pk
+        super().delete_model(request, obj)
+        menu_item_cache.invalidate(pk)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        menu_item_cache.clear()
 
 admin.site.register(MenuItem, MenuItemAdmin)
\ No newline at end of file
@@ -1,93 +1,686 @@
-from typing import List, Optional
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from asgiref.sync import sync_to_async
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
-from cafe_arna.base_crud import SLUGTYPE, BaseCRUD
-from cafes.models import Cafe, MenuItem
+from cafe_arna.base_crud import (
+    SLUGTYPE,
+    AsyncBaseCRUD,
+    BaseCRUD,
+    locked_update,
+    python_values,
+)
+from cafe_arna.cache import CRUDCache
+from cafe_arna.uploads import StreamedUpload
+from cafes.menu_documents import menu_encoder, menu_rows, rebuild_on_commit
+from cafes.models import Cafe, MenuDocument, MenuItem, ThumbnailVariant, upload_image_path
+from cafes.geo import cafe_locations
+from cafes.search import get_index
 from cafes.schema import (
+    BulkUpdateMenuItem,
     CreateCafe,
+    PatchCafe,
+    PatchMenuItem,
     UpdateCafe,
     CreateMenuItem,
     UpdateMenuItem,
 )
-from cafe_arna.utils import unique_slug_generator
+from cafe_arna.utils import allocate_unique_slug
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import QuerySet
+from PIL import Image
+
+# Read-through caches shared by the sync and async CRUD objects
+cafe_cache = CRUDCache("cafe")
+menu_item_cache = CRUDCache("menu_item")
+
+# How often create() re-allocates a slug taken by a concurrent insert
+SLUG_ATTEMPTS = 5
+# Largest number of rows accepted by a single bulk request
+MAX_BULK_ITEMS = 1000
+# A cafe can't list two menu items with the same name (unique_menu_item)
+MENU_ITEM_CONFLICT_FIELDS = ("cafe_id", "name")
+# Most cafes whose menus can be fetched in one request
+MAX_MENU_CAFES = 100
+# Most cafes a nearest-cafe lookup returns
+MAX_NEARBY_CAFES = 100
+# Most cafes, and most menu items, a search returns
+MAX_SEARCH_RESULTS = 100
+# Menu item fields a batched menu request may project to
+MENU_FIELDS = ("id", "name", "description", "price", "is_available", "created_on", "updated")
+# What a conditional menu request needs of its MenuDocument
+MENU_DOCUMENT_FIELDS = ("cafe_id", "version", "updated")
+
+
+def check_bulk_size(rows: List) -> None:
+    if len(rows) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A bulk request can't hold more than {MAX_BULK_ITEMS} items.",
+        )
+
+
+def menu_request(
+    cafe_slugs: List[SLUGTYPE], fields: Optional[List[str]]
+) -> Tuple[List[SLUGTYPE], List[str]]:
+    """
+    Validate a batched menu request; returns the de-duplicated slugs in
+    request order and the menu item fields to select.
+    """
+    slugs = list(dict.fromkeys(cafe_slugs))
+    if len(slugs) > MAX_MENU_CAFES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Menus for at most {MAX_MENU_CAFES} cafes can be fetched at once.",
+        )
+    fields = list(dict.fromkeys(fields or MENU_FIELDS))
+    unknown = [field for field in fields if field not in MENU_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown menu item fields: {', '.join(unknown)}."
+        )
+    return slugs, fields
+
+
+def group_menus(
+    slugs: List[SLUGTYPE], cafes: List[Dict], items: List[Dict]
+) -> Dict[str, List]:
+    """
+    Arrange menu item rows under their cafes, in the order the slugs were asked for.
+    """
+    by_slug = {cafe["slug"]: {**cafe, "menu_items": []} for cafe in cafes}
+    by_id = {cafe["id"]: cafe for cafe in by_slug.values()}
+    for item in items:
+        # Match the float prices of the other menu item schemas
+        if "price" in item:
+            item["price"] = float(item["price"])
+        by_id[item.pop("cafe_id")]["menu_items"].append(item)
+    return {
+        "menus": [by_slug[slug] for slug in slugs if slug in by_slug],
+        "missing": [slug for slug in slugs if slug not in by_slug],
+    }
+
+
+def unbuilt_document(cafe_slug: SLUGTYPE) -> Dict:
+    """
+    Answer for a cafe whose MenuDocument wasn't found, in the shape of
+    `get_menu_document`, read from the primary. Documents are only written
+    by menu writes and `build_menu_documents`, never by a GET, so a replica
+    that hasn't caught up doesn't make reads bump versions. A cafe with no
+    document at all gets its menu encoded as is, with no version (and so
+    no validators) to revalidate against.
+    """
+    fields = MENU_DOCUMENT_FIELDS + ("body",)
+    primary = DEFAULT_DB_ALIAS
+    try:
+        return MenuDocument.objects.using(primary).values(*fields).get(cafe__slug=cafe_slug)
+    except MenuDocument.DoesNotExist:
+        pass
+    cafe_id = (
+        Cafe.objects.using(primary).filter(slug=cafe_slug).values_list("id", flat=True).first()
+    )
+    if cafe_id is None:
+        raise HTTPException(status_code=404, detail="Cafe not found.")
+    return {
+        "cafe_id": cafe_id,
+        "version": None,
+        "updated": None,
+        "body": menu_encoder.encode(menu_rows(cafe_id, using=primary)),
+    }
+
+
+def with_fields(queryset: QuerySet, fields: Optional[Sequence[str]]) -> QuerySet:
+    """
+    Narrow `queryset` to `.values()` dicts of `fields`, when given.
+    """
+    return queryset.values(*fields) if fields else queryset
+
+
+def cafe_list_queryset(open_now: bool = False) -> QuerySet:
+    if open_now:
+        return Cafe.objects.open_now()
+    return Cafe.objects.all()
 
 
 class CafeCRUD(BaseCRUD[Cafe, CreateCafe, UpdateCafe, SLUGTYPE]):
     def get(self, slug: SLUGTYPE) -> Optional[Cafe]:
         try:
-            query = Cafe.objects.select_related("created_by", "updated_by").get(
-                slug=slug
+            query = self.cached(
+                slug,
+                lambda: Cafe.objects.select_related("created_by", "updated_by").get(
+                    slug=slug
+                ),
             )
             return query
         except ObjectDoesNotExist:
             raise HTTPException(status_code=404, detail="This cafe does not exist.")
 
-    def get_multiple(self, limit: int = 100, offset: int = 0) -> List[Cafe]:
-        query = Cafe.objects.all()[offset : offset + limit]
+    def get_version(self, slug: SLUGTYPE) -> Tuple[int, datetime]:
+        """
+        `(id, updated)` of a cafe, for conditional GETs without loading it.
+        """
+        version = Cafe.objects.filter(slug=slug).values_list("id", "updated").first()
+        if version is None:
+            raise HTTPException(status_code=404, detail="This cafe does not exist.")
+        return version
+
+    def get_multiple(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        open_now: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Cafe]:
+        query = with_fields(cafe_list_queryset(open_now), fields)[offset : offset + limit]
         if not query:
             raise HTTPException(status_code=404, detail="No cafes found.")
         return list(query)
 
+    def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        open_now: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Cafe], Optional[str]]:
+        cafes, next_cursor = super().get_page(
+            limit=limit,
+            cursor=cursor,
+            queryset=cafe_list_queryset(open_now),
+            fields=fields,
+        )
+        if not cafes:
+            raise HTTPException(status_code=404, detail="No cafes found.")
+        return cafes, next_cursor
+
     def create(self, obj_in: CreateCafe) -> Cafe:
-        slug = unique_slug_generator(obj_in.name)
-        obj_in = jsonable_encoder(obj_in)
-        obj_in["slug"] = slug
-        query = Cafe.objects.create(**obj_in)
-        return query
+        obj_in = python_values(Cafe, jsonable_encoder(obj_in))
+        for _ in range(SLUG_ATTEMPTS):
+            obj_in["slug"] = allocate_unique_slug(Cafe, obj_in["name"])
+            try:
+                with transaction.atomic():
+                    query = Cafe.objects.create(**obj_in)
+                return query
+            except IntegrityError:
+                if Cafe.objects.filter(name=obj_in["name"]).exists():
+                    raise HTTPException(
+                        status_code=409, detail="A cafe with this name already exists."
+                    )
+                # A concurrent create took the slug; allocate again
+        raise HTTPException(
+            status_code=409, detail="Could not allocate a unique slug, please retry."
+        )
 
-    def update(self, obj_in: UpdateCafe, slug: SLUGTYPE) -> Cafe:
-        self.get(slug=slug)
-        obj_in = jsonable_encoder(obj_in)
-        Cafe.objects.filter(slug=slug).update(**obj_in)
-        return self.get(slug=slug)
+    def update(
+        self, obj_in: Union[UpdateCafe, PatchCafe], slug: SLUGTYPE, partial: bool = False
+    ) -> Cafe:
+        try:
+            query = locked_update(
+                Cafe.objects.select_related("created_by", "updated_by"),
+                slug,
+                jsonable_encoder(obj_in, exclude={"updated"}, exclude_unset=partial),
+                expected_updated=obj_in.updated,
+            )
+        except ObjectDoesNotExist:
+            raise HTTPException(status_code=404, detail="This cafe does not exist.")
+        self.invalidate(slug, query.slug)
+        # Cached menu items embed their cafe
+        menu_item_cache.clear()
+        return query
 
     def delete(self, slug: SLUGTYPE) -> dict:
         Cafe.objects.filter(slug=slug).delete()
+        self.invalidate(slug)
+        menu_item_cache.clear()
         return {"detail": "Successfully deleted!"}
 
 
 class MenuItemCRUD(BaseCRUD[MenuItem, CreateMenuItem, UpdateMenuItem, SLUGTYPE]):
-    def get(self, slug: SLUGTYPE) -> Optional[MenuItem]:
+    # Menu items have no slug; they are addressed, and cached, by id
+    lookup_field = "pk"
+
+    def get(self, pk: int) -> Optional[MenuItem]:
         try:
-            query = MenuItem.objects.select_related(
-                "cafe", "created_by", "updated_by"
-            ).get(slug=slug)
+            query = self.cached(
+                pk,
+                lambda: MenuItem.objects.select_related(
+                    "cafe", "created_by", "updated_by"
+                ).get(pk=pk),
+            )
             return query
         except ObjectDoesNotExist:
             raise HTTPException(
                 status_code=404, detail="This menu item does not exist."
             )
 
-    def get_multiple(self, limit: int = 100, offset: int = 0) -> List[MenuItem]:
-        query = MenuItem.objects.all()[offset : offset + limit]
+    def get_version(self, pk: int) -> Tuple[int, datetime]:
+        """
+        `(id, updated)` of a menu item, for conditional GETs without loading it.
+        """
+        version = MenuItem.objects.filter(pk=pk).values_list("id", "updated").first()
+        if version is None:
+            raise HTTPException(
+                status_code=404, detail="This menu item does not exist."
+            )
+        return version
+
+    def get_multiple(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[MenuItem]:
+        query = with_fields(MenuItem.objects.all(), fields)[offset : offset + limit]
         if not query:
             raise HTTPException(status_code=404, detail="No menu items found.")
         return list(query)
 
-    def get_by_cafe(self, cafe_slug: SLUGTYPE) -> List[MenuItem]:
+    def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[MenuItem], Optional[str]]:
+        items, next_cursor = super().get_page(limit=limit, cursor=cursor, fields=fields)
+        if not items:
+            raise HTTPException(status_code=404, detail="No menu items found.")
+        return items, next_cursor
+
+    def get_menu_document(self, cafe_slug: SLUGTYPE, body: bool = True) -> Dict:
+        """
+        The cafe's MenuDocument as a dict of `cafe_id`, `version`, `updated`
+        and, unless `body` is False, the encoded menu. A miss is answered by
+        `unbuilt_document`, body included.
+        """
+        fields = MENU_DOCUMENT_FIELDS + (("body",) if body else ())
+        try:
+            # get() rather than first(), which would add an ORDER BY
+            return MenuDocument.objects.values(*fields).get(cafe__slug=cafe_slug)
+        except MenuDocument.DoesNotExist:
+            return unbuilt_document(cafe_slug)
+
+    def get_by_cafe(
+        self, cafe_slug: SLUGTYPE, fields: Optional[Sequence[str]] = None
+    ) -> List[MenuItem]:
         cafe = Cafe.objects.filter(slug=cafe_slug).first()
         if not cafe:
             raise HTTPException(status_code=404, detail="Cafe not found.")
-        query = MenuItem.objects.filter(cafe=cafe)
+        query = with_fields(MenuItem.objects.filter(cafe=cafe), fields)
         return list(query)
 
+    def get_by_cafes(
+        self, cafe_slugs: List[SLUGTYPE], fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """
+        Menus of several cafes with two queries in total: one `slug__in` for
+        the cafes and one `cafe_id__in` for their items.
+        """
+        slugs, fields = menu_request(cafe_slugs, fields)
+        cafes = list(Cafe.objects.filter(slug__in=slugs).values("id", "slug", "name"))
+        items = MenuItem.objects.filter(
+            cafe_id__in=[cafe["id"] for cafe in cafes]
+        ).order_by("cafe_id", "name", "id")
+        return group_menus(slugs, cafes, list(items.values("cafe_id", *fields)))
+
     def create(self, obj_in: CreateMenuItem) -> MenuItem:
-        obj_in = jsonable_encoder(obj_in)
+        obj_in = python_values(MenuItem, jsonable_encoder(obj_in))
         query = MenuItem.objects.create(**obj_in)
         return query
 
-    def update(self, obj_in: UpdateMenuItem, slug: SLUGTYPE) -> MenuItem:
-        self.get(slug=slug)
-        obj_in = jsonable_encoder(obj_in)
-        MenuItem.objects.filter(slug=slug).update(**obj_in)
-        return self.get(slug=slug)
+    def update(
+        self,
+        obj_in: Union[UpdateMenuItem, PatchMenuItem],
+        pk: int,
+        partial: bool = False,
+    ) -> MenuItem:
+        try:
+            query = locked_update(
+                MenuItem.objects.select_related("cafe", "created_by", "updated_by"),
+                pk,
+                jsonable_encoder(obj_in, exclude={"updated"}, exclude_unset=partial),
+                expected_updated=obj_in.updated,
+                lookup_field=self.lookup_field,
+            )
+        except ObjectDoesNotExist:
+            raise HTTPException(
+                status_code=404, detail="This menu item does not exist."
+            )
+        self.invalidate(pk)
+        return query
 
-    def delete(self, slug: SLUGTYPE) -> dict:
-        MenuItem.objects.filter(slug=slug).delete()
+    def delete(self, pk: int) -> dict:
+        MenuItem.objects.filter(pk=pk).delete()
+        self.invalidate(pk)
         return {"detail": "Successfully deleted!"}
 
+    def create_multiple(
+        self, cafe_slug: SLUGTYPE, objs_in: List[CreateMenuItem]
+    ) -> List[Dict]:
+        check_bulk_size(objs_in)
+        cafe = Cafe.objects.filter(slug=cafe_slug).first()
+        if not cafe:
+            raise HTTPException(status_code=404, detail="Cafe not found.")
+        results = super().create_multiple(
+            objs_in, conflict_fields=MENU_ITEM_CONFLICT_FIELDS, cafe_id=cafe.id
+        )
+        # Bulk inserts don't send post_save, so index the new rows here
+        get_index(MenuItem).refresh(row["id"] for row in results if row.get("id"))
+        if any(row.get("id") for row in results):
+            rebuild_on_commit([cafe.id])
+        return results
+
+    def update_multiple(self, objs_in: List[BulkUpdateMenuItem]) -> List[Dict]:
+        check_bulk_size(objs_in)
+        results = super().update_multiple(
+            objs_in, conflict_fields=MENU_ITEM_CONFLICT_FIELDS
+        )
+        updated = [row["id"] for row in results if row["status"] == "updated"]
+        get_index(MenuItem).refresh(updated)
+        if updated:
+            rebuild_on_commit(
+                MenuItem.objects.filter(pk__in=updated)
+                .values_list("cafe_id", flat=True)
+                .distinct()
+            )
+        return results
+
+    def delete_multiple(self, pks: List[int]) -> List[Dict]:
+        check_bulk_size(pks)
+        return super().delete_multiple(pks)
+
+
+class AsyncCafeCRUD(AsyncBaseCRUD[Cafe, CreateCafe, UpdateCafe, SLUGTYPE]):
+    async def get(self, slug: SLUGTYPE) -> Optional[Cafe]:
+        try:
+            query = await self.cached(
+                slug,
+                lambda: Cafe.objects.select_related("created_by", "updated_by").aget(
+                    slug=slug
+                ),
+            )
+            return query
+        except ObjectDoesNotExist:
+            raise HTTPException(status_code=404, detail="This cafe does not exist.")
+
+    async def get_version(self, slug: SLUGTYPE) -> Tuple[int, datetime]:
+        version = await Cafe.objects.filter(slug=slug).values_list("id", "updated").afirst()
+        if version is None:
+            raise HTTPException(status_code=404, detail="This cafe does not exist.")
+        return version
+
+    async def get_multiple(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        open_now: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Cafe]:
+        queryset = with_fields(cafe_list_queryset(open_now), fields)
+        query = [cafe async for cafe in queryset[offset : offset + limit]]
+        if not query:
+            raise HTTPException(status_code=404, detail="No cafes found.")
+        return query
+
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        open_now: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Cafe], Optional[str]]:
+        cafes, next_cursor = await super().get_page(
+            limit=limit,
+            cursor=cursor,
+            queryset=cafe_list_queryset(open_now),
+            fields=fields,
+        )
+        if not cafes:
+            raise HTTPException(status_code=404, detail="No cafes found.")
+        return cafes, next_cursor
+
+    async def create(self, obj_in: CreateCafe) -> Cafe:
+        # Slug retries need a savepoint, so run the sync create
+        return await sync_to_async(cafe_crud.create)(obj_in)
+
+    async def update(
+        self, obj_in: Union[UpdateCafe, PatchCafe], slug: SLUGTYPE, partial: bool = False
+    ) -> Cafe:
+        # The locked read needs a transaction, so run the sync update
+        return await sync_to_async(cafe_crud.update)(obj_in, slug, partial)
+
+    async def delete(self, slug: SLUGTYPE) -> dict:
+        await Cafe.objects.filter(slug=slug).adelete()
+        await self.invalidate(slug)
+        await menu_item_cache.aclear()
+        return {"detail": "Successfully deleted!"}
+
+
+class AsyncMenuItemCRUD(
+    AsyncBaseCRUD[MenuItem, CreateMenuItem, UpdateMenuItem, SLUGTYPE]
+):
+    lookup_field = "pk"
+
+    async def get(self, pk: int) -> Optional[MenuItem]:
+        try:
+            query = await self.cached(
+                pk,
+                lambda: MenuItem.objects.select_related(
+                    "cafe", "created_by", "updated_by"
+                ).aget(pk=pk),
+            )
+            return query
+        except ObjectDoesNotExist:
+            raise HTTPException(
+                status_code=404, detail="This menu item does not exist."
+            )
+
+    async def get_version(self, pk: int) -> Tuple[int, datetime]:
+        version = await MenuItem.objects.filter(pk=pk).values_list(
+            "id", "updated"
+        ).afirst()
+        if version is None:
+            raise HTTPException(
+                status_code=404, detail="This menu item does not exist."
+            )
+        return version
+
+    async def get_multiple(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[MenuItem]:
+        queryset = with_fields(MenuItem.objects.all(), fields)
+        query = [item async for item in queryset[offset : offset + limit]]
+        if not query:
+            raise HTTPException(status_code=404, detail="No menu items found.")
+        return query
+
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[MenuItem], Optional[str]]:
+        items, next_cursor = await super().get_page(
+            limit=limit, cursor=cursor, fields=fields
+        )
+        if not items:
+            raise HTTPException(status_code=404, detail="No menu items found.")
+        return items, next_cursor
+
+    async def get_menu_document(self, cafe_slug: SLUGTYPE, body: bool = True) -> Dict:
+        fields = MENU_DOCUMENT_FIELDS + (("body",) if body else ())
+        try:
+            return await MenuDocument.objects.values(*fields).aget(cafe__slug=cafe_slug)
+        except MenuDocument.DoesNotExist:
+            return await sync_to_async(unbuilt_document)(cafe_slug)
+
+    async def get_by_cafe(
+        self, cafe_slug: SLUGTYPE, fields: Optional[Sequence[str]] = None
+    ) -> List[MenuItem]:
+        cafe = await Cafe.objects.filter(slug=cafe_slug).afirst()
+        if not cafe:
+            raise HTTPException(status_code=404, detail="Cafe not found.")
+        queryset = with_fields(MenuItem.objects.filter(cafe=cafe), fields)
+        query = [item async for item in queryset]
+        return query
+
+    async def get_by_cafes(
+        self, cafe_slugs: List[SLUGTYPE], fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        slugs, fields = menu_request(cafe_slugs, fields)
+        cafes = [
+            cafe
+            async for cafe in Cafe.objects.filter(slug__in=slugs).values("id", "slug", "name")
+        ]
+        items = MenuItem.objects.filter(
+            cafe_id__in=[cafe["id"] for cafe in cafes]
+        ).order_by("cafe_id", "name", "id")
+        return group_menus(
+            slugs, cafes, [item async for item in items.values("cafe_id", *fields)]
+        )
+
+    async def create(self, obj_in: CreateMenuItem) -> MenuItem:
+        obj_in = python_values(MenuItem, jsonable_encoder(obj_in))
+        query = await MenuItem.objects.acreate(**obj_in)
+        # MenuItemOut nests the cafe; lazy FK loads are not allowed on the
+        # event loop, so reload the row with its relations attached.
+        return await MenuItem.objects.select_related(
+            "cafe", "created_by", "updated_by"
+        ).aget(pk=query.pk)
+
+    async def update(
+        self,
+        obj_in: Union[UpdateMenuItem, PatchMenuItem],
+        pk: int,
+        partial: bool = False,
+    ) -> MenuItem:
+        # The locked read needs a transaction, so run the sync update
+        return await sync_to_async(menu_item_crud.update)(obj_in, pk, partial)
+
+    async def delete(self, pk: int) -> dict:
+        await MenuItem.objects.filter(pk=pk).adelete()
+        await self.invalidate(pk)
+        return {"detail": "Successfully deleted!"}
+
+    # Bulk writes need a transaction, which the async ORM can't hold open,
+    # so they run the sync implementation in Django's sync thread.
+    async def create_multiple(
+        self, cafe_slug: SLUGTYPE, objs_in: List[CreateMenuItem]
+    ) -> List[Dict]:
+        return await sync_to_async(menu_item_crud.create_multiple)(cafe_slug, objs_in)
+
+    async def update_multiple(self, objs_in: List[BulkUpdateMenuItem]) -> List[Dict]:
+        return await sync_to_async(menu_item_crud.update_multiple)(objs_in)
+
+    async def delete_multiple(self, pks: List[int]) -> List[Dict]:
+        return await sync_to_async(menu_item_crud.delete_multiple)(pks)
+
+
+def search_catalogue(query: str, limit: int = 20) -> Dict[str, List[Dict]]:
+    """
+    Ranked full-text search over active cafes and available menu items.
+    """
+    cafes = Cafe.objects.filtered_search(query, limit).values(
+        "id", "name", "slug", "location", "score"
+    )
+    menu_items = MenuItem.objects.filtered_search(query, limit).values(
+        "id", "name", "price", "cafe_id", "score"
+    )
+    return {"cafes": list(cafes), "menu_items": list(menu_items)}
+
+
+def nearby_cafes(
+    latitude: float, longitude: float, k: int = 10, radius_km: Optional[float] = None
+) -> List[Dict]:
+    """
+    The `k` active cafes nearest to a point, optionally within `radius_km`,
+    nearest first. The spatial index picks the cafes; one query loads them.
+    """
+    if not 1 <= k <= MAX_NEARBY_CAFES:
+        raise HTTPException(
+            status_code=400, detail=f"k must be between 1 and {MAX_NEARBY_CAFES}."
+        )
+    hits = cafe_locations.nearest(latitude, longitude, k=k, radius_km=radius_km)
+    # The index may still hold a cafe deactivated by another process
+    rows = Cafe.objects.filter(pk__in=[pk for pk, _ in hits], is_active=True).values(
+        "id", "name", "slug", "location", "latitude", "longitude"
+    )
+    by_id = {row["id"]: row for row in rows}
+    return [
+        {**by_id[pk], "distance_km": distance} for pk, distance in hits if pk in by_id
+    ]
+
+
+def cafe_thumbnail(
+    slug: SLUGTYPE, width: Optional[int] = None, format: Optional[str] = None
+) -> Dict:
+    """
+    The thumbnail variant of a cafe that best fits `width` and `format`,
+    falling back to the uploaded image while its variants are being made.
+    """
+    cafe = Cafe.objects.filter(slug=slug).values("id", "thumbnail").first()
+    if cafe is None:
+        raise HTTPException(status_code=404, detail="This cafe does not exist.")
+    if not cafe["thumbnail"]:
+        raise HTTPException(status_code=404, detail="This cafe has no thumbnail.")
+    variant = ThumbnailVariant.pick(
+        ThumbnailVariant.objects.filter(cafe_id=cafe["id"], source=cafe["thumbnail"]),
+        width,
+        format,
+    )
+    if variant is None:
+        storage = Cafe._meta.get_field("thumbnail").storage
+        return {"url": storage.url(cafe["thumbnail"]), "ready": False}
+    return {
+        "url": variant.file.url,
+        "width": variant.width,
+        "height": variant.height,
+        "format": variant.format,
+        "ready": True,
+    }
+
+
+def store_thumbnail(slug: SLUGTYPE, upload: StreamedUpload) -> Dict:
+    """
+    Make a streamed image the cafe's thumbnail. The file is named after its
+    content hash, so uploading the image the cafe already has writes
+    nothing and doesn't re-render its variants.
+    """
+    cafe = Cafe.objects.filter(slug=slug).first()
+    if cafe is None:
+        raise HTTPException(status_code=404, detail="This cafe does not exist.")
+    try:
+        # Reads just the header: rejects truncated files and decompression bombs
+        with Image.open(upload.file) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="The upload is not a readable image.")
+    upload.file.seek(0)
+
+    root, extension = os.path.splitext(upload_image_path(cafe, "upload." + upload.extension))
+    name = f"{root}-{upload.sha256[:16]}{extension}"
+    duplicate = cafe.thumbnail.name == name
+    if not duplicate:
+        storage = cafe.thumbnail.storage
+        if not storage.exists(name):
+            name = storage.save(name, File(upload.file))
+        cafe.thumbnail.name = name
+        cafe.save(update_fields=["thumbnail", "updated"])
+        cafe_cache.invalidate(slug)
+        # Cached menu items embed their cafe
+        menu_item_cache.clear()
+    return {
+        "url": cafe.thumbnail.url,
+        "content_type": upload.content_type,
+        "size": upload.size,
+        "width": width,
+        "height": height,
+        "sha256": upload.sha256,
+        "duplicate": duplicate,
+    }
+
 
 # CRUD objects
-cafe_crud = CafeCRUD(Cafe)
-menu_item_crud = MenuItemCRUD(MenuItem)
+cafe_crud = CafeCRUD(Cafe, cache=cafe_cache)
+menu_item_crud = MenuItemCRUD(MenuItem, cache=menu_item_cache)
+async_cafe_crud = AsyncCafeCRUD(Cafe, cache=cafe_cache)
+async_menu_item_crud = AsyncMenuItemCRUD(MenuItem, cache=menu_item_cache)
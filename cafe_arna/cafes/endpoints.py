@@ -1,105 +1,426 @@
-from typing import Any, List
-from fastapi import APIRouter
-from cafes.cafe_api import cafe_crud, menu_item_crud
+from typing import Any, List, Literal, Optional
+from asgiref.sync import sync_to_async
+from fastapi import APIRouter, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from cafe_arna.cache import cache_stats
+from cafe_arna.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    validator_headers,
+)
+from cafe_arna.db_pool import pool
+from cafe_arna.encoders import SchemaEncoder
+from cafe_arna.uploads import receive_image
+from cafe_arna.utils import MAX_UPLOAD_SIZE
+from cafes.cafe_api import (
+    MAX_SEARCH_RESULTS,
+    async_cafe_crud,
+    async_menu_item_crud,
+    cafe_thumbnail,
+    nearby_cafes,
+    search_catalogue,
+    store_thumbnail,
+)
+from cafes.geo import geo_stats
+from cafes.search import search_stats, timed_search
+from cafes.thumbnails import thumbnail_stats
+from cafes.export import (
+    CAFE_EXPORT_FIELDS,
+    EXPORT_MEDIA_TYPES,
+    MENU_ITEM_EXPORT_FIELDS,
+    cafe_export_queryset,
+    export_stream,
+    menu_item_export_queryset,
+)
 from cafes.schema import (
+    BulkDeleteMenuItems,
+    BulkItemResult,
+    BulkUpdateMenuItem,
     CafeListOut,
+    CafeMenusOut,
     CafeOut,
     CreateCafe,
     CreateMenuItem,
     MenuItemListOut,
     MenuItemOut,
+    NearbyCafe,
+    PatchCafe,
+    PatchMenuItem,
+    SearchResults,
+    ThumbnailOut,
+    ThumbnailUploadOut,
     UpdateCafe,
     UpdateMenuItem,
 )
 
 router = APIRouter()
+# Routes that stream a request body before touching the database; mounted
+# without the pool dependency so a slow client doesn't hold a slot
+upload_router = APIRouter()
+# Routes that stream a response body from the database. The pool dependency
+# would release its slot before the body is sent, so they take their own
+# slot for as long as the body runs (ConnectionPool.stream_body).
+export_router = APIRouter()
+# Operational stats, only served with settings.STATS_ENDPOINTS
+stats_router = APIRouter()
+
+# List endpoints encode `.values()` rows directly; see cafe_arna.encoders
+cafe_list_encoder = SchemaEncoder(CafeListOut)
+menu_item_list_encoder = SchemaEncoder(MenuItemListOut)
 
 
 # Cafes Endpoints
 @router.get("/cafes/", response_model=List[CafeListOut])
-def get_multiple_cafes(offset: int = 0, limit: int = 10) -> Any:
+async def get_multiple_cafes(
+    offset: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    open_now: bool = False,
+) -> Any:
     """
     Endpoint to get multiple cafes based on offset and limit values.
+    The first page and any request with a `cursor` use keyset pagination and
+    return the cursor of the next page in the `X-Next-Cursor` header.
+    `open_now` keeps only the cafes open at the current local time.
     """
-    return cafe_crud.get_multiple(offset=offset, limit=limit)
+    fields = cafe_list_encoder.fields
+    if offset and cursor is None:
+        cafes = await async_cafe_crud.get_multiple(
+            offset=offset, limit=limit, open_now=open_now, fields=fields
+        )
+        return cafe_list_encoder.response(cafes)
+    cafes, next_cursor = await async_cafe_crud.get_page(
+        limit=limit, cursor=cursor, open_now=open_now, fields=fields
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return cafe_list_encoder.response(cafes, headers)
+
+
+# Declared before "/cafes/{slug}/" so "nearby" isn't taken as a slug
+@router.get("/cafes/nearby/", response_model=List[NearbyCafe])
+async def get_nearby_cafes(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = 10,
+    radius_km: Optional[float] = Query(None, gt=0),
+) -> Any:
+    """
+    The `k` active cafes nearest to (`lat`, `lng`), nearest first; with
+    `radius_km`, only those within that distance.
+    """
+    return await sync_to_async(nearby_cafes)(lat, lng, k, radius_km)
+
+
+@stats_router.get("/cafes/nearby/stats/")
+async def get_nearby_stats() -> Any:
+    """
+    Size of the in-process nearest-cafe index.
+    """
+    return geo_stats()
+
+
+@stats_router.get("/cafes/thumbnails/stats/")
+async def get_thumbnail_stats() -> Any:
+    """
+    Progress of the background thumbnail workers in this process.
+    """
+    return thumbnail_stats()
 
 
 @router.post("/cafes/", status_code=201, response_model=CafeOut)
-def create_cafe(request: CreateCafe) -> Any:
+async def create_cafe(request: CreateCafe) -> Any:
     """
     Endpoint to create a single cafe.
     """
-    return cafe_crud.create(obj_in=request)
+    return await async_cafe_crud.create(obj_in=request)
 
 
 @router.get("/cafes/{slug}/", response_model=CafeOut)
-def get_cafe(slug: str) -> Any:
+async def get_cafe(
+    slug: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+) -> Any:
     """
     Get a single cafe by slug.
+    Sends `ETag`/`Last-Modified`; a matching conditional request gets a 304
+    after a single `(id, updated)` lookup.
+    """
+    if if_none_match is not None or if_modified_since is not None:
+        pk, updated = await async_cafe_crud.get_version(slug=slug)
+        etag = make_etag("cafe", pk, updated.isoformat())
+        if is_not_modified(etag, updated, if_none_match, if_modified_since):
+            return not_modified_response(etag, updated)
+    cafe = await async_cafe_crud.get(slug=slug)
+    response.headers.update(
+        validator_headers(make_etag("cafe", cafe.pk, cafe.updated.isoformat()), cafe.updated)
+    )
+    return cafe
+
+
+@router.get("/cafes/{slug}/thumbnail/", response_model=ThumbnailOut)
+async def get_cafe_thumbnail(
+    slug: str,
+    width: Optional[int] = Query(None, ge=1),
+    format: Optional[Literal["webp", "jpeg"]] = None,
+) -> Any:
+    """
+    URL of the cafe's thumbnail variant that best fits `width` pixels.
+    Variant URLs are content-hashed and served with immutable caching.
     """
-    return cafe_crud.get(slug=slug)
+    return await sync_to_async(cafe_thumbnail)(slug, width, format)
+
+
+@upload_router.put("/cafes/{slug}/thumbnail/", response_model=ThumbnailUploadOut)
+async def upload_cafe_thumbnail(slug: str, request: Request, response: Response) -> Any:
+    """
+    Replace the cafe's thumbnail with the image sent as the raw request body
+    (JPEG, PNG, GIF or WebP, up to MAX_UPLOAD_SIZE bytes). Answers 201, or
+    200 with `duplicate` when the cafe already has this exact image.
+    """
+    upload = await receive_image(request, MAX_UPLOAD_SIZE)
+    try:
+        await pool.acquire()
+        try:
+            stored = await sync_to_async(store_thumbnail)(slug, upload)
+        finally:
+            await pool.release()
+    finally:
+        upload.close()
+    response.status_code = 200 if stored["duplicate"] else 201
+    return stored
 
 
 @router.put("/cafes/{slug}/", response_model=CafeOut)
-def update_cafe(slug: str, request: UpdateCafe) -> Any:
+async def update_cafe(slug: str, request: UpdateCafe) -> Any:
     """
     Update a single cafe by slug.
     """
-    return cafe_crud.update(slug=slug, obj_in=request)
+    return await async_cafe_crud.update(slug=slug, obj_in=request)
+
+
+@router.patch("/cafes/{slug}/", response_model=CafeOut)
+async def patch_cafe(slug: str, request: PatchCafe) -> Any:
+    """
+    Partially update a single cafe by slug; only the fields sent are written.
+    """
+    return await async_cafe_crud.update(slug=slug, obj_in=request, partial=True)
 
 
 @router.delete("/cafes/{slug}/")
-def delete_cafe(slug: str) -> Any:
+async def delete_cafe(slug: str) -> Any:
     """
     Delete a single cafe by slug.
     """
-    return cafe_crud.delete(slug=slug)
+    return await async_cafe_crud.delete(slug=slug)
 
 
 # Menu Items Endpoints
 @router.get("/menu-items/", response_model=List[MenuItemListOut])
-def get_multiple_menu_items(offset: int = 0, limit: int = 10) -> Any:
+async def get_multiple_menu_items(
+    offset: int = 0, limit: int = 10, cursor: Optional[str] = None
+) -> Any:
     """
     Endpoint to get multiple menu items based on offset and limit values.
+    The first page and any request with a `cursor` use keyset pagination and
+    return the cursor of the next page in the `X-Next-Cursor` header.
     """
-    return menu_item_crud.get_multiple(offset=offset, limit=limit)
+    fields = menu_item_list_encoder.fields
+    if offset and cursor is None:
+        items = await async_menu_item_crud.get_multiple(
+            offset=offset, limit=limit, fields=fields
+        )
+        return menu_item_list_encoder.response(items)
+    items, next_cursor = await async_menu_item_crud.get_page(
+        limit=limit, cursor=cursor, fields=fields
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return menu_item_list_encoder.response(items, headers)
 
 
 @router.post("/menu-items/", status_code=201, response_model=MenuItemOut)
-def create_menu_item(request: CreateMenuItem) -> Any:
+async def create_menu_item(request: CreateMenuItem) -> Any:
     """
     Endpoint to create a single menu item.
     """
-    return menu_item_crud.create(obj_in=request)
+    return await async_menu_item_crud.create(obj_in=request)
+
+
+# Declared before the "/menu-items/{item_id}/" routes so "bulk" isn't taken as an id
+@router.put("/menu-items/bulk/", response_model=List[BulkItemResult])
+async def update_menu_items_bulk(request: List[BulkUpdateMenuItem]) -> Any:
+    """
+    Update many menu items by id in one transaction.
+    """
+    return await async_menu_item_crud.update_multiple(objs_in=request)
+
+
+@router.post("/menu-items/bulk-delete/", response_model=List[BulkItemResult])
+async def delete_menu_items_bulk(request: BulkDeleteMenuItems) -> Any:
+    """
+    Delete many menu items by id in one transaction.
+    """
+    return await async_menu_item_crud.delete_multiple(pks=request.ids)
 
 
-@router.get("/menu-items/{slug}/", response_model=MenuItemOut)
-def get_menu_item(slug: str) -> Any:
+@router.get("/menu-items/{item_id}/", response_model=MenuItemOut)
+async def get_menu_item(
+    item_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+) -> Any:
     """
-    Get a single menu item by slug.
+    Get a single menu item by id, with the same validators as `get_cafe`.
     """
-    return menu_item_crud.get(slug=slug)
+    if if_none_match is not None or if_modified_since is not None:
+        pk, updated = await async_menu_item_crud.get_version(pk=item_id)
+        etag = make_etag("menu_item", pk, updated.isoformat())
+        if is_not_modified(etag, updated, if_none_match, if_modified_since):
+            return not_modified_response(etag, updated)
+    item = await async_menu_item_crud.get(pk=item_id)
+    response.headers.update(
+        validator_headers(
+            make_etag("menu_item", item.pk, item.updated.isoformat()), item.updated
+        )
+    )
+    return item
 
 
-@router.put("/menu-items/{slug}/", response_model=MenuItemOut)
-def update_menu_item(slug: str, request: UpdateMenuItem) -> Any:
+@router.put("/menu-items/{item_id}/", response_model=MenuItemOut)
+async def update_menu_item(item_id: int, request: UpdateMenuItem) -> Any:
     """
-    Update a single menu item by slug.
+    Update a single menu item by id.
     """
-    return menu_item_crud.update(slug=slug, obj_in=request)
+    return await async_menu_item_crud.update(pk=item_id, obj_in=request)
 
 
-@router.delete("/menu-items/{slug}/")
-def delete_menu_item(slug: str) -> Any:
+@router.patch("/menu-items/{item_id}/", response_model=MenuItemOut)
+async def patch_menu_item(item_id: int, request: PatchMenuItem) -> Any:
     """
-    Delete a single menu item by slug.
+    Partially update a single menu item by id; only the fields sent are written.
     """
-    return menu_item_crud.delete(slug=slug)
+    return await async_menu_item_crud.update(pk=item_id, obj_in=request, partial=True)
+
+
+@router.delete("/menu-items/{item_id}/")
+async def delete_menu_item(item_id: int) -> Any:
+    """
+    Delete a single menu item by id.
+    """
+    return await async_menu_item_crud.delete(pk=item_id)
+
+
+@router.get("/menus/", response_model=CafeMenusOut)
+async def get_menus_by_cafes(
+    slugs: List[str] = Query(...), fields: Optional[List[str]] = Query(None)
+) -> Any:
+    """
+    Get the menus of several cafes at once, grouped by cafe in the order
+    of `slugs` (e.g. `?slugs=a&slugs=b`). `fields` limits which menu item
+    fields are returned.
+    """
+    return await async_menu_item_crud.get_by_cafes(cafe_slugs=slugs, fields=fields)
 
 
 @router.get("/cafes/{slug}/menu-items/", response_model=List[MenuItemListOut])
-def get_menu_items_by_cafe(slug: str) -> Any:
+async def get_menu_items_by_cafe(
+    slug: str,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+) -> Any:
     """
     Get all menu items for a specific cafe by its slug.
+    The response is the cafe's MenuDocument, encoded when its menu last
+    changed, and its ETag is the document's version, so neither case loads
+    a menu item. A cafe whose document hasn't been built yet is answered
+    from its menu items, without validators.
+    """
+    conditional = if_none_match is not None or if_modified_since is not None
+    document = await async_menu_item_crud.get_menu_document(
+        cafe_slug=slug, body=not conditional
+    )
+    if document["version"] is None:
+        # No document built yet: nothing to validate against
+        return Response(content=bytes(document["body"]), media_type="application/json")
+    etag = make_etag("menu", document["cafe_id"], document["version"])
+    if conditional:
+        if is_not_modified(etag, document["updated"], if_none_match, if_modified_since):
+            return not_modified_response(etag, document["updated"])
+        document = await async_menu_item_crud.get_menu_document(cafe_slug=slug)
+        etag = make_etag("menu", document["cafe_id"], document["version"])
+    return Response(
+        content=bytes(document["body"]),
+        media_type="application/json",
+        headers=validator_headers(etag, document["updated"]),
+    )
+
+
+@router.post("/cafes/{slug}/menu-items/bulk/", response_model=List[BulkItemResult])
+async def create_menu_items_bulk(slug: str, request: List[CreateMenuItem]) -> Any:
+    """
+    Create many menu items for a cafe in one transaction.
+    Items whose name is already on the cafe's menu are reported as conflicts.
+    """
+    return await async_menu_item_crud.create_multiple(cafe_slug=slug, objs_in=request)
+
+
+@stats_router.get("/cache-stats/")
+async def get_cache_stats() -> Any:
+    """
+    Hit/miss/eviction counters of the CRUD read-through caches.
+    """
+    return cache_stats()
+
+
+# Catalogue export endpoints
+@export_router.get("/export/cafes/", response_class=StreamingResponse)
+async def export_cafes(
+    format: Literal["ndjson", "csv"] = "ndjson", chunk_size: int = 2000
+) -> Any:
+    """
+    Stream every cafe as NDJSON or CSV.
+    """
+    return StreamingResponse(
+        await pool.stream_body(
+            export_stream(cafe_export_queryset(), CAFE_EXPORT_FIELDS, format, chunk_size)
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+    )
+
+
+@export_router.get("/export/menu-items/", response_class=StreamingResponse)
+async def export_menu_items(
+    format: Literal["ndjson", "csv"] = "ndjson", chunk_size: int = 2000
+) -> Any:
+    """
+    Stream every menu item, with its cafe slug, as NDJSON or CSV.
+    """
+    return StreamingResponse(
+        await pool.stream_body(
+            export_stream(
+                menu_item_export_queryset(), MENU_ITEM_EXPORT_FIELDS, format, chunk_size
+            )
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+    )
+
+
+# Search endpoints
+@router.get("/search/", response_model=SearchResults)
+async def search(q: str, limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS)) -> Any:
+    """
+    Ranked full-text search over cafe name/location and menu name/description;
+    up to `limit` of each, best match first.
+    """
+    return await sync_to_async(timed_search)(search_catalogue, q, limit)
+
+
+@stats_router.get("/search/stats/")
+async def get_search_stats() -> Any:
+    """
+    Search latency percentiles and in-process index sizes.
     """
-    return menu_item_crud.get_by_cafe(cafe_slug=slug)
+    return search_stats()
@@ -0,0 +1,106 @@
+import csv
+import io
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+from django.db.models import F, QuerySet
+from cafe_arna.encoders import dumps
+from cafes.models import Cafe, MenuItem
+
+CAFE_EXPORT_FIELDS = (
+    "id",
+    "name",
+    "slug",
+    "location",
+    "opening_time",
+    "closing_time",
+    "is_active",
+    "updated",
+)
+MENU_ITEM_EXPORT_FIELDS = (
+    "id",
+    "cafe_id",
+    "cafe_slug",
+    "name",
+    "description",
+    "price",
+    "is_available",
+    "updated",
+)
+MAX_CHUNK_SIZE = 10000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def cafe_export_queryset() -> QuerySet:
+    return Cafe.objects.values(*CAFE_EXPORT_FIELDS)
+
+
+def menu_item_export_queryset() -> QuerySet:
+    fields = [field for field in MENU_ITEM_EXPORT_FIELDS if field != "cafe_slug"]
+    return MenuItem.objects.values(*fields, cafe_slug=F("cafe__slug"))
+
+
+async def iter_chunks(queryset: QuerySet, chunk_size: int) -> AsyncIterator[List[Dict]]:
+    """
+    Yield the rows of a `.values()` queryset in primary-key order, one chunk
+    at a time. Each chunk is its own `pk > last` query, so memory stays flat
+    whatever the table size and no cursor is held open between chunks.
+    """
+    chunk_size = min(max(chunk_size, 1), MAX_CHUNK_SIZE)
+    last_pk = 0
+    while True:
+        chunk = [
+            row
+            async for row in queryset.filter(pk__gt=last_pk).order_by("pk")[:chunk_size]
+        ]
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1]["id"]
+
+
+def json_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Prices go out as numbers, as in the JSON endpoints (cafe_arna.encoders)
+    return {
+        name: float(value) if isinstance(value, Decimal) else value
+        for name, value in row.items()
+    }
+
+
+async def ndjson_stream(chunks: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        yield b"".join(dumps(json_row(row)) + b"\n" for row in chunk)
+
+
+async def csv_stream(
+    chunks: AsyncIterator[List[Dict]], fields: Sequence[str]
+) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    async for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Empty tables still get the header line
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def export_stream(
+    queryset: QuerySet, fields: Sequence[str], format: str, chunk_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Stream `queryset` as NDJSON or CSV.
+    """
+    chunks = iter_chunks(queryset, chunk_size)
+    if format == "csv":
+        return csv_stream(chunks, fields)
+    return ndjson_stream(chunks)
@@ -0,0 +1,239 @@
+import heapq
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from .models import Cafe
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle distance between two points, in kilometres.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    In-process grid index over cafe coordinates for nearest-neighbour and
+    radius lookups.
+
+    Points are bucketed into `cell_degrees` squares. A query scans rings of
+    cells outward from its own cell and stops once no unscanned ring can
+    hold anything closer than the k-th best match (or the radius). Like the
+    search index it is built on first use and kept current through
+    `add`/`remove`; every process holds its own copy.
+
+    With `cache_alias`, a generation counter in that (shared) cache tells
+    the copies apart: `add`/`remove` bump it once their transaction commits,
+    and a copy built at an older generation is rebuilt before its next
+    query, so changes made by other processes show up there too.
+    """
+
+    def __init__(
+        self,
+        model: Type[Model],
+        cell_degrees: Optional[float] = None,
+        cache_alias: Optional[str] = None,
+    ):
+        self.model = model
+        self.cell_degrees = cell_degrees or settings.GEO_CELL_DEGREES
+        self.columns = round(360 / self.cell_degrees)
+        self.cells: Dict[Tuple[int, int], Dict[Any, Tuple[float, float]]] = {}
+        self.points: Dict[Any, Tuple[int, int]] = {}
+        self.built = False
+        self.cache_alias = cache_alias
+        # Shared generation this copy is current with
+        self.generation: Optional[int] = None
+        self._lock = threading.RLock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    @property
+    def generation_key(self) -> str:
+        return f"geo:{self.model._meta.label_lower}:__generation__"
+
+    def cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        row = math.floor((lat + 90) / self.cell_degrees)
+        column = math.floor((lng + 180) / self.cell_degrees) % self.columns
+        return row, column
+
+    def build(self) -> None:
+        with self._lock:
+            # Read before the rows: a change committed meanwhile bumps it again
+            cache = self.cache
+            self.generation = cache.get(self.generation_key, 0) if cache is not None else None
+            self.cells.clear()
+            self.points.clear()
+            rows = self.model._default_manager.filter(
+                is_active=True, latitude__isnull=False, longitude__isnull=False
+            ).values_list("pk", "latitude", "longitude")
+            for pk, lat, lng in rows.iterator(chunk_size=5000):
+                self.insert(pk, lat, lng)
+            self.built = True
+
+    def ensure_built(self) -> None:
+        cache = self.cache
+        if self.built and cache is not None:
+            self.built = cache.get(self.generation_key, 0) == self.generation
+        if not self.built:
+            self.build()
+
+    def insert(self, pk: Any, lat: float, lng: float) -> None:
+        with self._lock:
+            self.discard(pk)
+            key = self.cell(lat, lng)
+            self.cells.setdefault(key, {})[pk] = (lat, lng)
+            self.points[pk] = key
+
+    def discard(self, pk: Any) -> None:
+        with self._lock:
+            key = self.points.pop(pk, None)
+            if key is None:
+                return
+            bucket = self.cells[key]
+            del bucket[pk]
+            if not bucket:
+                del self.cells[key]
+
+    def add(self, obj: Model) -> None:
+        """
+        Index `obj` at its current coordinates, or drop it when it is
+        inactive or has none.
+        """
+        self.changed()
+        with self._lock:
+            if not self.built:
+                return
+            if obj.is_active and obj.latitude is not None and obj.longitude is not None:
+                self.insert(obj.pk, obj.latitude, obj.longitude)
+            else:
+                self.discard(obj.pk)
+
+    def remove(self, pk: Any) -> None:
+        self.changed()
+        with self._lock:
+            if self.built:
+                self.discard(pk)
+
+    def changed(self) -> None:
+        """
+        Have the other processes' copies rebuild once the current
+        transaction commits.
+        """
+        if self.cache is not None:
+            transaction.on_commit(self._bump_generation)
+
+    def _bump_generation(self) -> None:
+        cache = self.cache
+        cache.add(self.generation_key, 0, None)
+        generation = cache.incr(self.generation_key)
+        with self._lock:
+            # This copy has the change already; it is current unless another
+            # process bumped the generation too
+            if self.built and self.generation == generation - 1:
+                self.generation = generation
+
+    def _ring(self, row: int, column: int, radius: int) -> Iterable[Tuple[int, int]]:
+        if radius == 0:
+            yield row, column
+            return
+        for drow in range(-radius, radius + 1):
+            step = 1 if abs(drow) == radius else 2 * radius
+            for dcolumn in range(-radius, radius + 1, step):
+                yield row + drow, (column + dcolumn) % self.columns
+
+    def _ring_distance_km(self, lat: float, radius: int) -> float:
+        """
+        Lower bound on the distance from a point to any cell `radius` rings
+        away: at least `radius - 1` whole cells north/south, or east/west
+        at the narrowest longitude spacing those rings reach.
+        """
+        span = (radius - 1) * self.cell_degrees
+        if span <= 0:
+            return 0.0
+        widest_lat = min(90.0, abs(lat) + (radius + 1) * self.cell_degrees)
+        return span * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+
+    def nearest(
+        self, lat: float, lng: float, k: int = 10, radius_km: Optional[float] = None
+    ) -> List[Tuple[Any, float]]:
+        """
+        Return up to `k` `(pk, distance_km)` pairs closest to the point,
+        nearest first, optionally only those within `radius_km`.
+        """
+        with self._lock:
+            self.ensure_built()
+            if not self.points:
+                return []
+            row, column = self.cell(lat, lng)
+            best: List[Tuple[float, Any]] = []  # max-heap of (-distance, pk)
+            seen: Set[Tuple[int, int]] = set()
+            scanned = 0
+
+            def scan(key: Tuple[int, int]) -> None:
+                nonlocal scanned
+                seen.add(key)
+                bucket = self.cells.get(key)
+                if not bucket:
+                    return
+                scanned += len(bucket)
+                for pk, (plat, plng) in bucket.items():
+                    # The latitude gap alone is a lower bound on the distance;
+                    # skip the haversine for points it already rules out
+                    limit = -best[0][0] if len(best) == k else radius_km
+                    if limit is not None and abs(plat - lat) * KM_PER_DEGREE > limit:
+                        continue
+                    distance = haversine_km(lat, lng, plat, plng)
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, pk))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, pk))
+
+            radius = 0
+            while scanned < len(self.points):
+                bound = self._ring_distance_km(lat, radius)
+                if radius_km is not None and bound > radius_km:
+                    break
+                if len(best) == k and bound > -best[0][0]:
+                    break
+                if 8 * radius > len(self.cells):
+                    # Sparse data: the next ring has more cells than are
+                    # occupied, so finish with the occupied cells instead
+                    for key in list(self.cells):
+                        if key not in seen:
+                            scan(key)
+                    break
+                for key in self._ring(row, column, radius):
+                    if key not in seen:
+                        scan(key)
+                radius += 1
+        return [(pk, -negative) for negative, pk in sorted(best, reverse=True)]
+
+
+cafe_locations = SpatialIndex(Cafe, cache_alias=settings.GEO_INDEX_CACHE_ALIAS)
+
+
+def geo_stats() -> Dict[str, Any]:
+    return {
+        "built": cafe_locations.built,
+        "cafes": len(cafe_locations.points),
+        "cells": len(cafe_locations.cells),
+        "cell_degrees": cafe_locations.cell_degrees,
+        "generation": cafe_locations.generation,
+    }
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cafes.menu_documents import build_missing_menu_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the menu document of every cafe that has none, e.g. after "
+        "deploying menu documents or bulk-loading menu items."
+    )
+
+    def handle(self, *args, **options):
+        built = build_missing_menu_documents()
+        self.stdout.write(f"Built {built} menu document(s).")
@@ -1,5 +1,8 @@
 from datetime import timezone
 from django.db import models
+from django.utils import timezone as django_timezone
+from .opening_hours import minute_of_day
+from .search import ranked_search
 
 
 # Custom QuerySet for Cafe
@@ -10,16 +13,29 @@ class CafeQuerySet(models.query.QuerySet):
         """
         return super(CafeQuerySet, self).filter(is_active=True)
 
-    def search(self, query):
+    def open_at(self, moment):
         """
-        Search cafes by name, description, or address.
+        Get the cafes open at the time of day `moment`, answered from the
+        indexed opening intervals.
         """
-        lookups = (
-            models.Q(name__icontains=query)
-            | models.Q(description__icontains=query)
-            | models.Q(address__icontains=query)
+        minute = minute_of_day(moment)
+        OpeningInterval = self.model._meta.get_field("opening_intervals").related_model
+        intervals = OpeningInterval.objects.filter(
+            start_minute__lte=minute, end_minute__gt=minute
         )
-        return self.filter(lookups).distinct()
+        return self.filter(id__in=intervals.values("cafe_id"))
+
+    def open_now(self):
+        """
+        Get the cafes open at the current local time.
+        """
+        return self.open_at(django_timezone.localtime().time())
+
+    def search(self, query, limit=None):
+        """
+        Full-text search cafes by name or location, best match first.
+        """
+        return ranked_search(self, query, limit)
 
 
 # Manager for CafeCategory
@@ -57,37 +73,38 @@ class CafeManager(models.Manager):
         """
         return self.get_queryset().active()
 
-    def full_search(self, query):
+    def open_now(self):
         """
-        Perform a full search for cafes based on name, description, or address.
+        Get the cafes that are open right now.
         """
-        return self.get_queryset().search(query)
+        return self.get_queryset().open_now()
 
-    def filtered_search(self, query):
+    def full_search(self, query, limit=None):
+        """
+        Perform a full search for cafes based on name or location.
+        """
+        return self.get_queryset().search(query, limit)
+
+    def filtered_search(self, query, limit=None):
         """
         Perform a filtered search for active cafes.
         """
-        return self.get_queryset().active().search(query)
+        return self.get_queryset().active().search(query, limit)
 
 
 # Custom QuerySet for MenuItem
 class MenuItemQuerySet(models.query.QuerySet):
     def active(self, *args, **kwargs):
         """
-        Get all active menu items.
+        Get all available menu items.
         """
-        return super(MenuItemQuerySet, self).filter(is_active=True)
+        return super(MenuItemQuerySet, self).filter(is_available=True)
 
-    def search(self, query):
+    def search(self, query, limit=None):
         """
-        Search menu items by name, description, or category.
+        Full-text search menu items by name or description, best match first.
         """
-        lookups = (
-            models.Q(name__icontains=query)
-            | models.Q(description__icontains=query)
-            | models.Q(category__name__icontains=query)
-        )
-        return self.filter(lookups).distinct()
+        return ranked_search(self, query, limit)
 
 
 # Manager for MenuItem
@@ -110,14 +127,14 @@ class MenuItemManager(models.Manager):
         """
         return self.get_queryset().active()
 
-    def full_search(self, query):
+    def full_search(self, query, limit=None):
         """
-        Perform a full search for menu items based on name, description, or category.
+        Perform a full search for menu items based on name or description.
         """
-        return self.get_queryset().search(query)
+        return self.get_queryset().search(query, limit)
 
-    def filtered_search(self, query):
+    def filtered_search(self, query, limit=None):
         """
-        Perform a search for active menu items based on name, description, or category.
+        Perform a search for available menu items based on name or description.
         """
-        return self.get_queryset().active().search(query)
+        return self.get_queryset().active().search(query, limit)
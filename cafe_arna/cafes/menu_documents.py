@@ -0,0 +1,114 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from cafe_arna.encoders import SchemaEncoder
+from .models import Cafe, MenuDocument, MenuItem
+from .schema import MenuItemListOut
+
+# The menu endpoint's response body, encoded once per change
+menu_encoder = SchemaEncoder(MenuItemListOut)
+
+
+def menu_rows(cafe_id: int, using: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    The `.values()` rows of a cafe's menu, in the order the endpoint lists them.
+    """
+    rows = MenuItem.objects.using(using).filter(cafe_id=cafe_id).order_by("name", "id")
+    return list(rows.values(*menu_encoder.fields))
+
+
+def rebuild_menu_document(cafe_id: int) -> Optional[MenuDocument]:
+    """
+    Re-encode a cafe's menu into its MenuDocument and bump the version.
+
+    The document row is locked before the menu is read, so two rebuilds
+    racing for the same cafe run one after the other and the last one to
+    commit has read the latest menu. Returns None when the cafe is gone.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                document = (
+                    MenuDocument.objects.select_for_update()
+                    .only("cafe_id", "version")
+                    .filter(cafe_id=cafe_id)
+                    .first()
+                )
+                created = document is None
+                if created:
+                    if not Cafe.objects.filter(pk=cafe_id).exists():
+                        return None
+                    document = MenuDocument(cafe_id=cafe_id, version=0)
+                rows = menu_rows(cafe_id)
+                document.body = menu_encoder.encode(rows)
+                document.item_count = len(rows)
+                document.version += 1
+                document.updated = timezone.now()
+                if created:
+                    document.save(force_insert=True)
+                else:
+                    document.save(update_fields=["body", "item_count", "version", "updated"])
+                return document
+        except IntegrityError:
+            # Created concurrently (lock that row and go again) or the cafe
+            # was deleted meanwhile (the retry returns None)
+            continue
+    return None
+
+
+def build_missing_menu_documents() -> int:
+    """
+    Build the document of every cafe that has none, e.g. cafes created
+    before menu documents existed or filled by bulk inserts that sent no
+    signals. Returns the number built.
+    """
+    built = 0
+    missing = Cafe.objects.filter(menu_document__isnull=True).order_by("pk")
+    for cafe_id in missing.values_list("pk", flat=True).iterator():
+        if rebuild_menu_document(cafe_id) is not None:
+            built += 1
+    return built
+
+
+# Cafes whose documents the open transaction of each thread will rebuild,
+# by database alias; connections, and so transactions, are per thread
+pending = threading.local()
+
+
+def pending_cafe_ids(using: str) -> Set[int]:
+    if not hasattr(pending, "cafe_ids"):
+        pending.cafe_ids = {}
+    return pending.cafe_ids.setdefault(using, set())
+
+
+def rebuild_pending(using: str) -> None:
+    """
+    on_commit callback rebuilding the documents of the cafes pending on
+    `using`, each once. The first callback of a transaction takes the whole
+    set; the others find it empty.
+    """
+    cafe_ids = pending_cafe_ids(using)
+    batch = sorted(cafe_ids)
+    cafe_ids.clear()
+    for cafe_id in batch:
+        rebuild_menu_document(cafe_id)
+
+
+def rebuild_on_commit(cafe_ids: Iterable[int], using: Optional[str] = None) -> None:
+    """
+    Rebuild the menu documents of `cafe_ids` once the current transaction
+    commits, or right away outside one. Writes to many items of one cafe
+    inside a transaction rebuild its document once.
+
+    Every call queues a callback, because a rolled back transaction drops
+    its callbacks without a trace. Ids it left pending are rebuilt by the
+    next commit on the thread: a wasted rebuild, never a missed one.
+    """
+    cafe_ids = {cafe_id for cafe_id in cafe_ids if cafe_id is not None}
+    if not cafe_ids:
+        return
+    using = using or DEFAULT_DB_ALIAS
+    pending_cafe_ids(using).update(cafe_ids)
+    transaction.on_commit(lambda: rebuild_pending(using), using=using)
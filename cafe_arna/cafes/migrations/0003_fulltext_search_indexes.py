@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# MySQL-only FULLTEXT indexes backing `ranked_search`; other backends use
+# the in-process index in cafes/search.py and skip this migration.
+FULLTEXT_INDEXES = [
+    ('cafes_cafe', 'cafe_search_idx', 'name, location'),
+    ('cafes_menuitem', 'menu_item_search_idx', 'name, description'),
+]
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, columns in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE {table} ADD FULLTEXT {name} ({columns})')
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, columns in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafes', '0002_menuitem_name_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_indexes, drop_fulltext_indexes),
+    ]
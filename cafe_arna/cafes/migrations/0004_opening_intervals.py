@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from cafes.opening_hours import rebuild_opening_intervals
+
+
+def backfill_opening_intervals(apps, schema_editor):
+    rebuild_opening_intervals(
+        apps.get_model('cafes', 'Cafe'), apps.get_model('cafes', 'OpeningInterval')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafes', '0003_fulltext_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.PositiveSmallIntegerField()),
+                ('end_minute', models.PositiveSmallIntegerField()),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='cafes.cafe')),
+            ],
+            options={
+                'verbose_name': 'opening interval',
+                'verbose_name_plural': 'opening intervals',
+                'indexes': [models.Index(fields=['start_minute', 'end_minute', 'cafe'], name='opening_start_idx'), models.Index(fields=['end_minute', 'start_minute', 'cafe'], name='opening_end_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_opening_intervals, migrations.RunPython.noop),
+    ]
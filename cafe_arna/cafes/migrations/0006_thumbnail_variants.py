@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 12:13
+
+import cafes.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafes', '0005_cafe_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=8)),
+                ('width', models.PositiveSmallIntegerField()),
+                ('height', models.PositiveSmallIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('file', models.FileField(max_length=255, upload_to=cafes.models.thumbnail_variant_path)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_variants', to='cafes.cafe')),
+            ],
+            options={
+                'verbose_name': 'thumbnail variant',
+                'verbose_name_plural': 'thumbnail variants',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='thumbnailvariant',
+            constraint=models.UniqueConstraint(fields=('cafe', 'source', 'format', 'width'), name='unique_thumbnail_variant'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafes', '0006_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuDocument',
+            fields=[
+                ('cafe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='menu_document', serialize=False, to='cafes.cafe')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('body', models.BinaryField()),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'menu document',
+                'verbose_name_plural': 'menu documents',
+            },
+        ),
+    ]
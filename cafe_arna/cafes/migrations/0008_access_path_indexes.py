@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-18 12:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafes', '0007_menu_documents'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cafe',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='cafe_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cafe',
+            index=models.Index(fields=['created_on', 'id'], name='cafe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cafe',
+            index=models.Index(fields=['is_active', 'created_on', 'id'], name='cafe_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['cafe', 'name', 'id'], name='menu_item_cafe_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['is_available', 'name', 'id'], name='menu_item_avail_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['created_on', 'id'], name='menu_item_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['is_available', 'created_on', 'id'], name='menu_item_avail_created_idx'),
+        ),
+    ]
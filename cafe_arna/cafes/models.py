@@ -1,9 +1,10 @@
 from datetime import date, datetime
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from pathlib import Path
 from pydantic import AnyUrl
-from typing import Any, Callable, List, Union
+from typing import Any, Callable, Iterable, List, Optional, Union
 from .managers import CafeManager, MenuItemManager
 
 
@@ -31,6 +32,12 @@ class Cafe(models.Model):
     closing_time: datetime = models.TimeField()
     is_active: bool = models.BooleanField(default=True)
     thumbnail: Union[AnyUrl, str] = models.ImageField(upload_to=upload_image_path, null=True, blank=True)
+    latitude: float = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude: float = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
     created_on: datetime = models.DateTimeField(auto_now_add=True)
     updated: datetime = models.DateTimeField(auto_now=True)
 
@@ -48,6 +55,13 @@ class Cafe(models.Model):
         constraints: List[Any] = [
             models.UniqueConstraint(fields=['name', 'slug'], name='unique_cafe')
         ]
+        indexes: List[Any] = [
+            # active() in name order, and its keyset pages
+            models.Index(fields=['is_active', 'name', 'id'], name='cafe_active_name_idx'),
+            # The admin changelist: newest first, unfiltered or by is_active
+            models.Index(fields=['created_on', 'id'], name='cafe_created_idx'),
+            models.Index(fields=['is_active', 'created_on', 'id'], name='cafe_active_created_idx'),
+        ]
         verbose_name: str = "cafe"
         verbose_name_plural: str = "cafes"
         ordering: List[str] = ["name"]
@@ -58,12 +72,90 @@ class Cafe(models.Model):
     def __str__(self) -> str:
         return self.name
 
-    def get_thumbnail_url(self) -> Union[Path, str, AnyUrl]:
-        timestamp = f"{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        if self.thumbnail and hasattr(self.thumbnail, 'url'):
-            return f"{self.thumbnail.url}?enc={timestamp}"
-        
-    
+
+class OpeningInterval(models.Model):
+    """
+    Minute-of-day span during which a cafe is open, derived from its
+    opening and closing times (see cafes.opening_hours).
+    """
+    cafe: Any = models.ForeignKey(
+        Cafe, on_delete=models.CASCADE, related_name="opening_intervals"
+    )
+    start_minute: int = models.PositiveSmallIntegerField()
+    end_minute: int = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes: List[Any] = [
+            # "Open at minute m" is start <= m < end; with both orders indexed
+            # the database seeks on whichever bound is more selective at m
+            models.Index(fields=['start_minute', 'end_minute', 'cafe'], name='opening_start_idx'),
+            models.Index(fields=['end_minute', 'start_minute', 'cafe'], name='opening_end_idx'),
+        ]
+        verbose_name: str = "opening interval"
+        verbose_name_plural: str = "opening intervals"
+
+    def __repr__(self) -> str:
+        return f"<OpeningInterval {self.cafe_id} {self.start_minute}-{self.end_minute}>"
+
+
+def thumbnail_variant_path(instance: Any, file_name: str) -> str:
+    return "%s/%s/%s" % (settings.THUMBNAIL_DIR, instance.cafe.slug, file_name)
+
+
+class ThumbnailVariant(models.Model):
+    """
+    Resized copy of a cafe's thumbnail (see cafes.thumbnails). The file name
+    carries a hash of its content, so the file can be cached forever.
+    """
+    FORMATS: List[Any] = [("webp", "WebP"), ("jpeg", "JPEG")]
+
+    cafe: Any = models.ForeignKey(
+        Cafe, on_delete=models.CASCADE, related_name="thumbnail_variants"
+    )
+    # Name of the uploaded thumbnail this variant was made from
+    source: str = models.CharField(max_length=255)
+    format: str = models.CharField(max_length=8, choices=FORMATS)
+    width: int = models.PositiveSmallIntegerField()
+    height: int = models.PositiveSmallIntegerField()
+    size: int = models.PositiveIntegerField()
+    file: Any = models.FileField(upload_to=thumbnail_variant_path, max_length=255)
+
+    class Meta:
+        constraints: List[Any] = [
+            models.UniqueConstraint(
+                fields=['cafe', 'source', 'format', 'width'], name='unique_thumbnail_variant'
+            )
+        ]
+        verbose_name: str = "thumbnail variant"
+        verbose_name_plural: str = "thumbnail variants"
+
+    def __repr__(self) -> str:
+        return f"<ThumbnailVariant {self.cafe_id} {self.width}w {self.format}>"
+
+    @staticmethod
+    def pick(
+        variants: Iterable["ThumbnailVariant"],
+        width: Optional[int] = None,
+        format: Optional[str] = None,
+    ) -> Optional["ThumbnailVariant"]:
+        """
+        The narrowest variant at least `width` wide, else the widest one;
+        in `format` when that was generated, else in any format (WebP first).
+        Without a width the widest variant is returned.
+        """
+        variants = list(variants)
+        preferred = [format] if format else []
+        for name in preferred + [name for name, _ in ThumbnailVariant.FORMATS]:
+            candidates = [variant for variant in variants if variant.format == name]
+            if not candidates:
+                continue
+            wide_enough = [v for v in candidates if width is not None and v.width >= width]
+            if wide_enough:
+                return min(wide_enough, key=lambda variant: variant.width)
+            return max(candidates, key=lambda variant: variant.width)
+        return None
+
+
 class MenuItem(models.Model):
     """
     Model for menu items offered by cafes.
@@ -92,6 +184,18 @@ class MenuItem(models.Model):
         constraints: List[Any] = [
             models.UniqueConstraint(fields=['name', 'cafe'], name='unique_menu_item')
         ]
+        indexes: List[Any] = [
+            # Keyset pagination of the menu-items list seeks on (name, id)
+            models.Index(fields=['name', 'id'], name='menu_item_name_id_idx'),
+            # A cafe's menu in name order (get_by_cafe, get_by_cafes, menu
+            # documents) without sorting
+            models.Index(fields=['cafe', 'name', 'id'], name='menu_item_cafe_name_idx'),
+            # active() in name order
+            models.Index(fields=['is_available', 'name', 'id'], name='menu_item_avail_name_idx'),
+            # The admin changelist: newest first, unfiltered or by is_available
+            models.Index(fields=['created_on', 'id'], name='menu_item_created_idx'),
+            models.Index(fields=['is_available', 'created_on', 'id'], name='menu_item_avail_created_idx'),
+        ]
         verbose_name: str = "menu item"
         verbose_name_plural: str = "menu items"
         ordering: List[str] = ["name"]
@@ -100,4 +204,25 @@ class MenuItem(models.Model):
         return f"<MenuItem {self.name} at {self.cafe.name}>"
 
     def __str__(self) -> str:
-        return self.name
\ No newline at end of file
+        return self.name
+
+class MenuDocument(models.Model):
+    """
+    A cafe's menu pre-encoded as the JSON the menu endpoint returns, rebuilt
+    whenever one of its menu items changes (see cafes.menu_documents).
+    `version` goes up by one on every rebuild.
+    """
+    cafe: Any = models.OneToOneField(
+        Cafe, on_delete=models.CASCADE, primary_key=True, related_name="menu_document"
+    )
+    version: int = models.PositiveIntegerField(default=1)
+    body: bytes = models.BinaryField()
+    item_count: int = models.PositiveIntegerField(default=0)
+    updated: datetime = models.DateTimeField()
+
+    class Meta:
+        verbose_name: str = "menu document"
+        verbose_name_plural: str = "menu documents"
+
+    def __repr__(self) -> str:
+        return f"<MenuDocument {self.cafe_id} v{self.version}>"
@@ -0,0 +1,59 @@
+from datetime import time
+from typing import Any, List, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def opening_spans(opening: time, closing: time) -> List[Tuple[int, int]]:
+    """
+    Half-open `[start, end)` minute-of-day spans a cafe is open for.
+
+    Hours that wrap past midnight (22:00-02:00) become two spans, so every
+    stored span satisfies `start < end` and "open at minute m" is the plain
+    range test `start <= m < end`. Equal opening and closing times mean the
+    cafe never closes.
+    """
+    start, end = minute_of_day(opening), minute_of_day(closing)
+    if start == end:
+        return [(0, MINUTES_PER_DAY)]
+    if start < end:
+        return [(start, end)]
+    return [(start, MINUTES_PER_DAY), (0, end)]
+
+
+def store_opening_intervals(cafe: Any) -> None:
+    """
+    Replace the stored opening intervals of `cafe` with its current hours.
+    """
+    OpeningInterval = cafe.opening_intervals.model
+    OpeningInterval.objects.filter(cafe=cafe).delete()
+    OpeningInterval.objects.bulk_create(
+        [
+            OpeningInterval(cafe=cafe, start_minute=start, end_minute=end)
+            for start, end in opening_spans(cafe.opening_time, cafe.closing_time)
+        ]
+    )
+
+
+def rebuild_opening_intervals(Cafe: Any, OpeningInterval: Any, batch_size: int = 5000) -> None:
+    """
+    Recompute the intervals of every cafe, e.g. after cafes were bulk
+    inserted without signals. The models are passed in so migrations can
+    hand over their historical versions.
+    """
+    OpeningInterval.objects.all().delete()
+    rows = Cafe.objects.order_by("pk").values_list("pk", "opening_time", "closing_time")
+    batch = []
+    for cafe_id, opening, closing in rows.iterator(chunk_size=batch_size):
+        batch.extend(
+            OpeningInterval(cafe_id=cafe_id, start_minute=start, end_minute=end)
+            for start, end in opening_spans(opening, closing)
+        )
+        if len(batch) >= batch_size:
+            OpeningInterval.objects.bulk_create(batch)
+            batch = []
+    OpeningInterval.objects.bulk_create(batch)
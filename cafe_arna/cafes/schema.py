@@ -1,5 +1,6 @@
-from datetime import datetime
-from typing import Any, List, Optional, Union
+from datetime import datetime, time
+from typing import Any, Dict, List, Optional, Union
+from django.db.models.fields.files import FieldFile
 from pydantic import BaseModel, HttpUrl, validator
 
 # Validators for common fields
@@ -13,6 +14,26 @@ def confirm_slug(value: str) -> str:
         raise ValueError("Slug cannot be empty.")
     return value
 
+def confirm_latitude(value: Optional[float]) -> Optional[float]:
+    if value is not None and not -90 <= value <= 90:
+        raise ValueError("Latitude must be between -90 and 90.")
+    return value
+
+def confirm_longitude(value: Optional[float]) -> Optional[float]:
+    if value is not None and not -180 <= value <= 180:
+        raise ValueError("Longitude must be between -180 and 180.")
+    return value
+
+# Conversions of model attributes for the response schemas
+def file_url(value: Any) -> Optional[str]:
+    # Empty when no file was uploaded
+    if isinstance(value, FieldFile):
+        return value.url if value else None
+    return value
+
+def user_pk(value: Any) -> Any:
+    return getattr(value, "pk", value)
+
 class CafeBase(BaseModel):
     """
     Base fields for cafes.
@@ -20,14 +41,18 @@ class CafeBase(BaseModel):
     name: str
     location: str
     slug: str
-    opening_time: datetime
-    closing_time: datetime
+    opening_time: time
+    closing_time: time
     is_active: bool
     thumbnail: Optional[Union[HttpUrl, str]] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     # Field-level validations
     _confirm_name = validator("name", allow_reuse=True)(confirm_name)
     _confirm_slug = validator("slug", allow_reuse=True)(confirm_slug)
+    _confirm_latitude = validator("latitude", allow_reuse=True)(confirm_latitude)
+    _confirm_longitude = validator("longitude", allow_reuse=True)(confirm_longitude)
 
 class CreateCafe(CafeBase):
     """
@@ -40,6 +65,30 @@ class UpdateCafe(CafeBase):
     Fields for updating a cafe.
     """
     updated_by: Optional[Any]
+    # The `updated` value last read; the write fails with 409 if it changed
+    updated: Optional[datetime] = None
+
+class PatchCafe(BaseModel):
+    """
+    Fields for partially updating a cafe. Only the fields sent are written.
+    """
+    name: str = None
+    location: str = None
+    slug: str = None
+    opening_time: time = None
+    closing_time: time = None
+    is_active: bool = None
+    thumbnail: Optional[Union[HttpUrl, str]] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    updated_by: Optional[Any] = None
+    updated: Optional[datetime] = None
+
+    # Field-level validations
+    _confirm_name = validator("name", allow_reuse=True)(confirm_name)
+    _confirm_slug = validator("slug", allow_reuse=True)(confirm_slug)
+    _confirm_latitude = validator("latitude", allow_reuse=True)(confirm_latitude)
+    _confirm_longitude = validator("longitude", allow_reuse=True)(confirm_longitude)
 
 class CafeOut(CafeBase):
     """
@@ -51,6 +100,9 @@ class CafeOut(CafeBase):
     created_by: Optional[Any]
     updated_by: Optional[Any]
 
+    _file_url = validator("thumbnail", pre=True, allow_reuse=True)(file_url)
+    _user_pk = validator("created_by", "updated_by", pre=True, allow_reuse=True)(user_pk)
+
     class Config:
         from_attributes = True
 
@@ -88,6 +140,22 @@ class UpdateMenuItem(MenuItemBase):
     Fields for updating a menu item.
     """
     updated_by: Optional[Any]
+    # The `updated` value last read; the write fails with 409 if it changed
+    updated: Optional[datetime] = None
+
+class PatchMenuItem(BaseModel):
+    """
+    Fields for partially updating a menu item. Only the fields sent are written.
+    """
+    name: str = None
+    description: Optional[str] = None
+    price: float = None
+    is_available: bool = None
+    updated_by: Optional[Any] = None
+    updated: Optional[datetime] = None
+
+    # Field-level validations
+    _confirm_name = validator("name", allow_reuse=True)(confirm_name)
 
 class MenuItemOut(MenuItemBase):
     """
@@ -100,6 +168,8 @@ class MenuItemOut(MenuItemBase):
     created_by: Optional[Any]
     updated_by: Optional[Any]
 
+    _user_pk = validator("created_by", "updated_by", pre=True, allow_reuse=True)(user_pk)
+
     class Config:
         from_attributes = True
 
@@ -114,3 +184,105 @@ class MenuItemListOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BulkUpdateMenuItem(MenuItemBase):
+    """
+    Fields for updating a menu item inside a bulk request.
+    """
+    id: int
+
+class BulkDeleteMenuItems(BaseModel):
+    """
+    Ids of the menu items to delete in a bulk request.
+    """
+    ids: List[int]
+
+class BulkItemResult(BaseModel):
+    """
+    Outcome of a single row of a bulk request.
+    """
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class CafeMenu(BaseModel):
+    """
+    One cafe's menu in a batched menu response. Items only carry the
+    fields that were asked for.
+    """
+    id: int
+    slug: str
+    name: str
+    menu_items: List[Dict[str, Any]]
+
+class CafeMenusOut(BaseModel):
+    """
+    Response schema for menus of several cafes; `missing` lists unknown slugs.
+    """
+    menus: List[CafeMenu]
+    missing: List[str]
+
+class NearbyCafe(BaseModel):
+    """
+    A cafe near a point, with its great-circle distance in kilometres.
+    """
+    id: int
+    name: str
+    slug: str
+    location: str
+    latitude: float
+    longitude: float
+    distance_km: float
+
+class ThumbnailOut(BaseModel):
+    """
+    A cafe thumbnail URL. `ready` is false, and the size unknown, while the
+    resized variants are still being generated and the upload is returned.
+    """
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = None
+    ready: bool
+
+class ThumbnailUploadOut(BaseModel):
+    """
+    A stored thumbnail upload. `duplicate` is true when the cafe already
+    had this exact image and nothing was written.
+    """
+    url: str
+    content_type: str
+    size: int
+    width: int
+    height: int
+    sha256: str
+    duplicate: bool
+
+class CafeSearchHit(BaseModel):
+    """
+    A cafe matching a search, with its relevance score.
+    """
+    id: int
+    name: str
+    slug: str
+    location: str
+    score: float
+
+class MenuItemSearchHit(BaseModel):
+    """
+    A menu item matching a search, with its relevance score.
+    """
+    id: int
+    name: str
+    price: float
+    cafe_id: int
+    score: float
+
+class SearchResults(BaseModel):
+    """
+    Response schema for catalogue search, each list best match first.
+    """
+    cafes: List[CafeSearchHit]
+    menu_items: List[MenuItemSearchHit]
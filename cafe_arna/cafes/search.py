@@ -0,0 +1,307 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from django.db import connections
+from django.db.models import Case, FloatField, Model, QuerySet, Value, When
+from django.db.models.expressions import RawSQL
+
+# Text fields searched for each model
+SEARCH_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "cafes.Cafe": ("name", "location"),
+    "cafes.MenuItem": ("name", "description"),
+}
+
+TOKEN_RE = re.compile(r"\w+")
+
+# BM25 tuning constants
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Hits checked against a filtered queryset per query, best first
+FILTER_BATCH_SIZE = 500
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split `text` into lowercase ASCII-folded word tokens.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over the text fields of one model, ranked
+    with BM25. The last query term also matches as a prefix so partial
+    words ("capp") find results while typing.
+
+    It is built from the database on first use and kept current through
+    `add`/`remove`. Every process holds its own copy, which is why MySQL
+    deployments use FULLTEXT indexes instead.
+    """
+
+    def __init__(self, model: Type[Model], fields: Tuple[str, ...]):
+        self.model = model
+        self.fields = fields
+        self.postings: Dict[str, Dict[Any, int]] = {}
+        self.lengths: Dict[Any, int] = {}
+        self.terms: Dict[Any, Tuple[str, ...]] = {}
+        self.total_length = 0
+        self.built = False
+        self._vocabulary: Optional[List[str]] = None
+        self._lock = threading.RLock()
+
+    def build(self) -> None:
+        with self._lock:
+            self.postings.clear()
+            self.lengths.clear()
+            self.terms.clear()
+            self.total_length = 0
+            self._vocabulary = None
+            rows = self.model._default_manager.values_list("pk", *self.fields)
+            for pk, *values in rows.iterator(chunk_size=2000):
+                self._add(pk, values)
+            self.built = True
+
+    def ensure_built(self) -> None:
+        if not self.built:
+            self.build()
+
+    def _add(self, pk: Any, values: Iterable[Optional[str]]) -> None:
+        tokens = [token for value in values for token in tokenize(value)]
+        counts = Counter(tokens)
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[pk] = count
+        self.terms[pk] = tuple(counts)
+        self.lengths[pk] = len(tokens)
+        self.total_length += len(tokens)
+        self._vocabulary = None
+
+    def _remove(self, pk: Any) -> None:
+        if pk not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(pk)
+        for token in self.terms.pop(pk):
+            del self.postings[token][pk]
+            if not self.postings[token]:
+                del self.postings[token]
+        self._vocabulary = None
+
+    def add(self, obj: Model) -> None:
+        """
+        Index `obj`, replacing what was indexed for it before.
+        """
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(obj.pk)
+            self._add(obj.pk, [getattr(obj, field) for field in self.fields])
+
+    def remove(self, pk: Any) -> None:
+        with self._lock:
+            if self.built:
+                self._remove(pk)
+
+    def refresh(self, pks: Iterable[Any]) -> None:
+        """
+        Re-read the given rows from the database, e.g. after bulk writes
+        that don't send model signals.
+        """
+        pks = list(pks)
+        with self._lock:
+            if not self.built or not pks:
+                return
+            for pk in pks:
+                self._remove(pk)
+            rows = self.model._default_manager.filter(pk__in=pks).values_list(
+                "pk", *self.fields
+            )
+            for pk, *values in rows:
+                self._add(pk, values)
+
+    def _expand(self, term: str) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect_left(self._vocabulary, term)
+        matches = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """
+        Return `(pk, score)` pairs for `query`, best match first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self.ensure_built()
+            documents = len(self.lengths)
+            if not documents:
+                return []
+            average_length = self.total_length / documents or 1
+            matched = []
+            for position, term in enumerate(terms):
+                tokens = [term] if term in self.postings else []
+                if position == len(terms) - 1:
+                    tokens = self._expand(term)
+                matched.extend(tokens)
+            # Like MySQL's natural language mode, terms found in more than half
+            # of the rows carry almost no weight; skip them when rarer terms
+            # are there to rank by, rather than scoring most of the corpus.
+            rare = [token for token in matched if len(self.postings[token]) * 2 <= documents]
+            scores: Dict[Any, float] = {}
+            for token in rare or matched:
+                docs = self.postings[token]
+                idf = math.log(1 + (documents - len(docs) + 0.5) / (len(docs) + 0.5))
+                for pk, frequency in docs.items():
+                    norm = 1 - BM25_B + BM25_B * self.lengths[pk] / average_length
+                    scores[pk] = scores.get(pk, 0.0) + idf * (
+                        frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+                    )
+        if limit is not None:
+            return heapq.nlargest(limit, scores.items(), key=lambda hit: hit[1])
+        return sorted(scores.items(), key=lambda hit: hit[1], reverse=True)
+
+
+class LatencyRecorder:
+    """
+    Keeps the most recent search durations to report latency percentiles.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.samples: deque = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, milliseconds: float) -> None:
+        self.samples.append(milliseconds)
+        self.count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count}
+
+        def percentile(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+        return {
+            "count": self.count,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+
+indexes: Dict[str, InvertedIndex] = {}
+latency = LatencyRecorder()
+
+
+def get_index(model: Type[Model]) -> InvertedIndex:
+    label = model._meta.label
+    if label not in indexes:
+        indexes[label] = InvertedIndex(model, SEARCH_FIELDS[label])
+    return indexes[label]
+
+
+def uses_fulltext(queryset: QuerySet) -> bool:
+    """
+    MySQL answers searches from its FULLTEXT indexes; other backends (the
+    SQLite test runs) use the in-process inverted index.
+    """
+    return connections[queryset.db].vendor == "mysql"
+
+
+def top_hits(
+    queryset: QuerySet, hits: List[Tuple[Any, float]], limit: int
+) -> List[Tuple[Any, float]]:
+    """
+    The best `limit` of `hits` (best first) among the rows `queryset`
+    keeps. The index holds every row, so without this check inactive cafes
+    or unavailable items could take the top slots and crowd out matches
+    the queryset keeps. Hits are checked a batch at a time, so a search
+    only reads past the first batch when most of it was filtered out.
+    """
+    if not queryset.query.has_filters():
+        return hits[:limit]
+    kept: List[Tuple[Any, float]] = []
+    for start in range(0, len(hits), FILTER_BATCH_SIZE):
+        batch = hits[start : start + FILTER_BATCH_SIZE]
+        allowed = set(
+            queryset.filter(pk__in=[pk for pk, _ in batch]).values_list("pk", flat=True)
+        )
+        kept.extend(hit for hit in batch if hit[0] in allowed)
+        if len(kept) >= limit:
+            break
+    return kept[:limit]
+
+
+def ranked_search(queryset: QuerySet, query: str, limit: Optional[int] = None) -> QuerySet:
+    """
+    Narrow `queryset` to rows matching `query`, annotated with a relevance
+    `score` and ordered best match first. With `limit`, only that many of
+    the best matches are considered.
+    """
+    model = queryset.model
+    fields = SEARCH_FIELDS[model._meta.label]
+    if uses_fulltext(queryset):
+        qn = connections[queryset.db].ops.quote_name
+        columns = ", ".join(
+            f"{qn(model._meta.db_table)}.{qn(model._meta.get_field(field).column)}"
+            for field in fields
+        )
+        score = RawSQL(f"MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)", [query])
+        queryset = queryset.annotate(score=score).filter(score__gt=0).order_by("-score")
+        return queryset[:limit] if limit is not None else queryset
+
+    hits = get_index(model).search(query)
+    if limit is not None:
+        hits = top_hits(queryset, hits, limit)
+    if not hits:
+        return queryset.annotate(score=Value(0.0, output_field=FloatField())).none()
+    score = Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in hits],
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=[pk for pk, _ in hits])
+        .annotate(score=score)
+        .order_by("-score")
+    )
+
+
+def timed_search(search, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run `search` and record how long it took.
+    """
+    start = time.perf_counter()
+    try:
+        return search(*args, **kwargs)
+    finally:
+        latency.record((time.perf_counter() - start) * 1000)
+
+
+def search_stats() -> Dict[str, Any]:
+    return {
+        "latency": latency.stats(),
+        "indexes": {
+            label: {
+                "built": index.built,
+                "documents": len(index.lengths),
+                "terms": len(index.postings),
+            }
+            for label, index in indexes.items()
+        },
+    }
@@ -0,0 +1,112 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .geo import cafe_locations
+from .menu_documents import rebuild_on_commit
+from .models import Cafe, MenuItem
+from .opening_hours import store_opening_intervals
+from .search import get_index
+from .thumbnails import thumbnail_workers
+
+
+@receiver(post_save, sender=Cafe)
+@receiver(post_save, sender=MenuItem)
+def index_saved(sender, instance, **kwargs):
+    """
+    Keep the in-process search index current with saved rows.
+    """
+    get_index(sender).add(instance)
+
+
+@receiver(post_delete, sender=Cafe)
+@receiver(post_delete, sender=MenuItem)
+def unindex_deleted(sender, instance, **kwargs):
+    """
+    Drop deleted rows, including cascaded menu items, from the search index.
+    """
+    get_index(sender).remove(instance.pk)
+
+
+@receiver(post_save, sender=Cafe)
+def sync_opening_intervals(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Recompute the opening intervals behind the "open now" filter when a
+    cafe's hours may have changed.
+    """
+    if created or update_fields is None or {"opening_time", "closing_time"} & set(update_fields):
+        store_opening_intervals(instance)
+
+
+@receiver(post_save, sender=Cafe)
+def locate_saved(sender, instance, update_fields=None, **kwargs):
+    """
+    Move a saved cafe in the nearest-cafe index, whether it was saved
+    through the API or the admin.
+    """
+    if update_fields is None or {"latitude", "longitude", "is_active"} & set(update_fields):
+        cafe_locations.add(instance)
+
+
+@receiver(post_delete, sender=Cafe)
+def unlocate_deleted(sender, instance, **kwargs):
+    cafe_locations.remove(instance.pk)
+
+
+@receiver(post_init, sender=Cafe)
+def note_loaded_thumbnail(sender, instance, **kwargs):
+    """
+    Remember the thumbnail a cafe was loaded with, so saves that keep it
+    queue no work. A deferred thumbnail is unknown (None).
+    """
+    if "thumbnail" in instance.__dict__:
+        value = instance.__dict__["thumbnail"]
+        instance._loaded_thumbnail = getattr(value, "name", value) or ""
+    else:
+        instance._loaded_thumbnail = None
+
+
+@receiver(post_save, sender=Cafe)
+def render_thumbnails(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Queue the resized variants of a new or replaced thumbnail; replacing or
+    clearing it also drops the variants of the previous one.
+    """
+    if update_fields is not None and "thumbnail" not in update_fields:
+        return
+    source = instance.thumbnail.name or ""
+    previous = "" if created else getattr(instance, "_loaded_thumbnail", None)
+    if source == previous:
+        return
+    instance._loaded_thumbnail = source
+    thumbnail_workers.schedule(instance)
+
+
+@receiver(post_init, sender=MenuItem)
+def note_loaded_cafe(sender, instance, **kwargs):
+    """
+    Remember which cafe an item was loaded with, so moving it to another
+    cafe (e.g. in the admin) rebuilds both menus. A deferred cafe is
+    unknown (None).
+    """
+    instance._loaded_cafe_id = instance.__dict__.get("cafe_id")
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def rebuild_menu(sender, instance, **kwargs):
+    """
+    Rebuild the menu document of the cafe whose item was saved or deleted,
+    once the transaction commits. Bulk writes through MenuItemCRUD don't
+    send signals and schedule the rebuild themselves.
+    """
+    rebuild_on_commit([instance.cafe_id, getattr(instance, "_loaded_cafe_id", None)])
+    instance._loaded_cafe_id = instance.cafe_id
+
+
+@receiver(post_save, sender=Cafe)
+def build_menu(sender, instance, created, **kwargs):
+    """
+    Give a new cafe its menu document, so its menu has validators from the
+    start; reads never build one.
+    """
+    if created:
+        rebuild_on_commit([instance.pk])
@@ -1,3 +1,892 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import random
+import tempfile
+import threading
+from datetime import datetime, time, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils.text import slugify
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import ExifTags, Image
+
+from cafe_arna.asgi import app
+from cafe_arna.utils import allocate_unique_slug
+from cafes.admin import MenuItemAdmin
+from cafes.cafe_api import (
+    MAX_MENU_CAFES,
+    MAX_NEARBY_CAFES,
+    cafe_cache,
+    cafe_crud,
+    menu_item_cache,
+    menu_item_crud,
+)
+from cafes.geo import SpatialIndex, cafe_locations, haversine_km
+from cafes.models import Cafe, MenuDocument, MenuItem, ThumbnailVariant
+from cafes.opening_hours import opening_spans
+from cafes.schema import CreateCafe, PatchMenuItem
+from cafes.search import indexes as search_indexes
+from cafes.thumbnails import (
+    generate_variants,
+    render_variants,
+    supported_formats,
+    thumbnail_workers,
+    variant_widths,
+)
+
+API = "/api/fa/v1/cafes"
+
+
+def make_cafe(name: str = "Blue Door", **fields) -> Cafe:
+    values = {
+        "slug": slugify(name),
+        "location": "Main Street",
+        "opening_time": time(8),
+        "closing_time": time(20),
+        **fields,
+    }
+    return Cafe.objects.create(name=name, **values)
+
+
+def make_menu_item(cafe: Cafe, name: str = "Latte", **fields) -> MenuItem:
+    return MenuItem.objects.create(cafe=cafe, name=name, **{"price": "3.50", **fields})
+
+
+class APITestCase(TransactionTestCase):
+    """
+    Sends requests through the whole ASGI app. Its ORM calls run on other
+    threads than the test, so the rows a test creates are committed rather
+    than rolled back with a per-test transaction.
+    """
+
+    def setUp(self):
+        self.api = TestClient(app)
+        cafe_cache.clear()
+        menu_item_cache.clear()
+        # Let thumbnail jobs queued by the test finish before its rows go
+        self.addCleanup(thumbnail_workers.shutdown)
+
+
+class AsyncCafeEndpointsTests(APITestCase):
+    def test_create_returns_the_cafe_with_its_slug(self):
+        response = self.api.post(
+            f"{API}/cafes/",
+            json={
+                "name": "Blue Door",
+                "location": "Main Street",
+                "slug": "ignored",
+                "opening_time": "08:00:00",
+                "closing_time": "20:00:00",
+                "is_active": True,
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["slug"], "blue-door")
+        self.assertEqual(response.json()["opening_time"], "08:00:00")
+        self.assertEqual(Cafe.objects.get().opening_time, time(8))
+
+    def test_get_cafe(self):
+        cafe = make_cafe()
+        response = self.api.get(f"{API}/cafes/blue-door/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], cafe.id)
+        self.assertIsNone(response.json()["thumbnail"])
+
+    def test_get_unknown_cafe_is_404(self):
+        self.assertEqual(self.api.get(f"{API}/cafes/nowhere/").status_code, 404)
+
+    def test_list_cafes(self):
+        make_cafe("Blue Door")
+        make_cafe("Amber Cup")
+        response = self.api.get(f"{API}/cafes/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([cafe["slug"] for cafe in response.json()], ["amber-cup", "blue-door"])
+
+    def test_delete_cafe(self):
+        make_cafe()
+        self.assertEqual(self.api.delete(f"{API}/cafes/blue-door/").status_code, 200)
+        self.assertFalse(Cafe.objects.exists())
+
+    def test_concurrent_requests_query_on_separate_threads(self):
+        make_cafe()
+        threads = set()
+
+        def opened(sender, connection, **kwargs):
+            threads.add(threading.current_thread().name)
+
+        async def send_concurrently():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(
+                    *(client.get(f"{API}/cafes/") for _ in range(10))
+                )
+
+        connection_created.connect(opened)
+        self.addCleanup(connection_created.disconnect, opened)
+        responses = asyncio.run(send_concurrently())
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertGreater(len(threads), 1)
+
+
+class MenuItemEndpointsTests(APITestCase):
+    def test_get_menu_item_by_id(self):
+        item = make_menu_item(make_cafe())
+        response = self.api.get(f"{API}/menu-items/{item.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Latte")
+        self.assertEqual(response.json()["cafe"]["slug"], "blue-door")
+
+    def test_get_unknown_menu_item_is_404(self):
+        self.assertEqual(self.api.get(f"{API}/menu-items/999/").status_code, 404)
+
+    def test_delete_menu_item_by_id(self):
+        item = make_menu_item(make_cafe())
+        self.api.get(f"{API}/menu-items/{item.pk}/")
+        self.assertEqual(self.api.delete(f"{API}/menu-items/{item.pk}/").status_code, 200)
+        self.assertEqual(self.api.get(f"{API}/menu-items/{item.pk}/").status_code, 404)
+
+
+class MenuItemAdminTests(TestCase):
+    def setUp(self):
+        menu_item_cache.clear()
+        self.item = make_menu_item(make_cafe())
+
+    def test_admin_save_invalidates_the_menu_item(self):
+        menu_item_crud.get(self.item.pk)
+        request = RequestFactory().post("/")
+        request.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        self.item.price = Decimal("4.20")
+        MenuItemAdmin(MenuItem, admin.site).save_model(request, self.item, None, True)
+        self.assertEqual(menu_item_crud.get(self.item.pk).price, Decimal("4.20"))
+
+    def test_admin_delete_invalidates_the_menu_item(self):
+        menu_item_crud.get(self.item.pk)
+        pk = self.item.pk
+        MenuItemAdmin(MenuItem, admin.site).delete_model(RequestFactory().post("/"), self.item)
+        with self.assertRaises(HTTPException):
+            menu_item_crud.get(pk)
+
+
+class ExportTests(APITestCase):
+    def export(self, path, **params):
+        response = self.api.get(f"{API}/export/{path}/", params=params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_ndjson_rows_match_the_api_types(self):
+        item = make_menu_item(make_cafe(), price="3.50")
+        rows = [json.loads(line) for line in self.export("menu-items").text.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["price"], 3.5)
+        self.assertEqual(rows[0]["cafe_slug"], "blue-door")
+        listed = self.api.get(f"{API}/menu-items/").json()[0]
+        self.assertEqual(rows[0]["price"], listed["price"])
+        self.assertEqual(rows[0]["id"], item.pk)
+
+    def test_export_spans_chunks(self):
+        for number in range(5):
+            make_cafe(f"Cafe {number}")
+        lines = self.export("cafes", chunk_size=2).text.splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines], [f"Cafe {n}" for n in range(5)])
+
+    def test_csv_has_a_header_and_a_row_per_cafe(self):
+        make_cafe()
+        lines = self.export("cafes", format="csv").text.splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "name", "slug"])
+        self.assertEqual(len(lines), 2)
+
+
+class BulkMenuItemTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cafe = make_cafe()
+
+    def item(self, name, price=3.5):
+        return {"name": name, "price": price, "is_available": True}
+
+    def test_bulk_create_reports_every_row(self):
+        make_menu_item(self.cafe, "Latte")
+        response = self.api.post(
+            f"{API}/cafes/blue-door/menu-items/bulk/",
+            json=[self.item("Mocha"), self.item("Latte"), self.item("Mocha"), self.item("Chai")],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["status"] for row in response.json()],
+            ["created", "conflict", "conflict", "created"],
+        )
+        self.assertEqual(
+            sorted(self.cafe.menu_items.values_list("name", flat=True)), ["Chai", "Latte", "Mocha"]
+        )
+
+    def test_bulk_update_reports_missing_and_conflicting_rows(self):
+        latte = make_menu_item(self.cafe, "Latte")
+        mocha = make_menu_item(self.cafe, "Mocha")
+        response = self.api.put(
+            f"{API}/menu-items/bulk/",
+            json=[
+                {"id": latte.pk, **self.item("Flat White", 4.0)},
+                {"id": mocha.pk, **self.item("Flat White")},
+                {"id": 999, **self.item("Chai")},
+            ],
+        )
+        self.assertEqual(
+            [row["status"] for row in response.json()], ["updated", "conflict", "not_found"]
+        )
+        latte.refresh_from_db()
+        self.assertEqual((latte.name, latte.price), ("Flat White", Decimal("4.00")))
+
+    def test_bulk_delete_reports_unknown_ids(self):
+        latte = make_menu_item(self.cafe, "Latte")
+        response = self.api.post(f"{API}/menu-items/bulk-delete/", json={"ids": [latte.pk, 999]})
+        self.assertEqual([row["status"] for row in response.json()], ["deleted", "not_found"])
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_oversized_batch_is_400(self):
+        response = self.api.post(f"{API}/menu-items/bulk-delete/", json={"ids": list(range(1001))})
+        self.assertEqual(response.status_code, 400)
+
+
+class UpdateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = make_menu_item(make_cafe())
+
+    def body(self, **fields):
+        return {
+            "name": "Latte",
+            "description": None,
+            "price": 3.5,
+            "is_available": True,
+            "updated_by": None,
+            **fields,
+        }
+
+    def test_put_menu_item_by_id(self):
+        self.api.get(f"{API}/menu-items/{self.item.pk}/")
+        response = self.api.put(f"{API}/menu-items/{self.item.pk}/", json=self.body(price=4.25))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["price"], 4.25)
+        # The cached copy was dropped
+        self.assertEqual(self.api.get(f"{API}/menu-items/{self.item.pk}/").json()["price"], 4.25)
+
+    def test_patch_writes_only_the_fields_sent(self):
+        response = self.api.patch(f"{API}/menu-items/{self.item.pk}/", json={"is_available": False})
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.name, self.item.is_available), ("Latte", False))
+
+    def test_put_unknown_menu_item_is_404(self):
+        self.assertEqual(self.api.put(f"{API}/menu-items/999/", json=self.body()).status_code, 404)
+
+    def test_stale_updated_is_409(self):
+        read = self.api.get(f"{API}/menu-items/{self.item.pk}/").json()["updated"]
+        first = self.api.put(f"{API}/menu-items/{self.item.pk}/", json=self.body(price=4, updated=read))
+        self.assertEqual(first.status_code, 200)
+        second = self.api.put(f"{API}/menu-items/{self.item.pk}/", json=self.body(price=5, updated=read))
+        self.assertEqual(second.status_code, 409)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, Decimal("4.00"))
+
+    def test_update_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as captured:
+            menu_item_crud.update(PatchMenuItem(price=6), self.item.pk, partial=True)
+        updates = [
+            q["sql"] for q in captured.captured_queries if q["sql"].startswith('UPDATE "cafes_menuitem"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"price"', updates[0])
+        self.assertNotIn('"name"', updates[0])
+
+    def test_unchanged_update_writes_nothing(self):
+        with CaptureQueriesContext(connection) as captured:
+            menu_item_crud.update(PatchMenuItem(name="Latte"), self.item.pk, partial=True)
+        self.assertFalse([q for q in captured.captured_queries if q["sql"].startswith("UPDATE")])
+
+
+class SlugAllocationTests(TestCase):
+    def test_free_slug_is_the_slugified_name(self):
+        self.assertEqual(allocate_unique_slug(Cafe, "Blue Door"), "blue-door")
+
+    def test_next_suffix_follows_the_largest_in_use(self):
+        make_cafe("Blue Door")
+        make_cafe("Blue Door 5", slug="blue-door-5")
+        make_cafe("Blue Doorway")
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_unique_slug(Cafe, "Blue  door!"), "blue-door-6")
+
+    def test_create_allocates_past_a_taken_slug(self):
+        make_cafe("Blue Door")
+        cafe = cafe_crud.create(
+            CreateCafe(
+                name="Blue-Door",
+                location="Main Street",
+                slug="x",
+                opening_time=time(8),
+                closing_time=time(20),
+                is_active=True,
+            )
+        )
+        self.assertEqual(cafe.slug, "blue-door-2")
+
+    def test_create_with_a_taken_name_is_409(self):
+        make_cafe("Blue Door")
+        with self.assertRaises(HTTPException) as raised:
+            cafe_crud.create(
+                CreateCafe(
+                    name="Blue Door",
+                    location="Elsewhere",
+                    slug="x",
+                    opening_time=time(8),
+                    closing_time=time(20),
+                    is_active=True,
+                )
+            )
+        self.assertEqual(raised.exception.status_code, 409)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        search_indexes.clear()
+
+    def test_inactive_cafes_do_not_take_the_top_slots(self):
+        for number in range(3):
+            make_cafe(f"Espresso Espresso {number}", location="Espresso Row", is_active=False)
+        active = make_cafe("Espresso Corner", location="Harbour")
+        make_cafe("Tea House", location="Harbour")
+        hits = list(Cafe.objects.filtered_search("espresso", 1))
+        self.assertEqual(hits, [active])
+        self.assertEqual(len(Cafe.objects.full_search("espresso", 2)), 2)
+
+    def test_unavailable_items_do_not_take_the_top_slots(self):
+        cafe = make_cafe()
+        for number in range(3):
+            make_menu_item(cafe, f"Mocha Mocha {number}", is_available=False)
+        available = make_menu_item(cafe, "Iced Mocha")
+        self.assertEqual(list(MenuItem.objects.filtered_search("mocha", 2)), [available])
+
+    def test_ranks_by_relevance_and_matches_prefixes(self):
+        make_cafe("Harbour Cafe", location="Pier")
+        best = make_cafe("Cappuccino Cappuccino", location="Cappuccino Lane")
+        make_cafe("Cappuccino Bar", location="Dock")
+        self.assertEqual(Cafe.objects.filtered_search("capp", 5)[0], best)
+        self.assertEqual(len(Cafe.objects.filtered_search("capp")), 2)
+
+    def test_zero_limit_returns_nothing(self):
+        make_cafe("Espresso Corner")
+        self.assertEqual(len(Cafe.objects.filtered_search("espresso", 0)), 0)
+
+
+class SearchEndpointTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        search_indexes.clear()
+
+    def test_search(self):
+        cafe = make_cafe("Espresso Corner")
+        make_menu_item(cafe, "Espresso")
+        body = self.api.get(f"{API}/search/", params={"q": "espresso"}).json()
+        self.assertEqual([hit["slug"] for hit in body["cafes"]], ["espresso-corner"])
+        self.assertEqual([hit["name"] for hit in body["menu_items"]], ["Espresso"])
+
+    def test_limit_is_bounded(self):
+        for limit in (0, -1, 101):
+            response = self.api.get(f"{API}/search/", params={"q": "espresso", "limit": limit})
+            self.assertEqual(response.status_code, 422)
+
+
+class BatchedMenuTests(APITestCase):
+    def test_menus_are_grouped_in_request_order(self):
+        blue, red = make_cafe("Blue Door"), make_cafe("Red Door")
+        make_menu_item(blue, "Mocha")
+        make_menu_item(blue, "Latte")
+        make_menu_item(red, "Tea")
+        response = self.api.get(
+            f"{API}/menus/", params={"slugs": ["red-door", "nowhere", "blue-door"]}
+        )
+        body = response.json()
+        self.assertEqual([menu["slug"] for menu in body["menus"]], ["red-door", "blue-door"])
+        self.assertEqual(
+            [item["name"] for item in body["menus"][1]["menu_items"]], ["Latte", "Mocha"]
+        )
+        self.assertEqual(body["menus"][1]["menu_items"][0]["price"], 3.5)
+        self.assertEqual(body["missing"], ["nowhere"])
+
+    def test_any_number_of_cafes_takes_two_queries(self):
+        for name in ("Blue Door", "Red Door", "Green Door"):
+            make_menu_item(make_cafe(name))
+        with self.assertNumQueries(2):
+            menus = menu_item_crud.get_by_cafes(["blue-door", "red-door", "green-door"])
+        self.assertEqual(len(menus["menus"]), 3)
+
+    def test_fields_project_the_menu_items(self):
+        make_menu_item(make_cafe())
+        response = self.api.get(
+            f"{API}/menus/", params={"slugs": "blue-door", "fields": ["name", "price"]}
+        )
+        self.assertEqual(
+            response.json()["menus"][0]["menu_items"], [{"name": "Latte", "price": 3.5}]
+        )
+
+    def test_unknown_field_is_400(self):
+        response = self.api.get(f"{API}/menus/", params={"slugs": "blue-door", "fields": "cafe"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_cafes_is_400(self):
+        slugs = [f"cafe-{number}" for number in range(MAX_MENU_CAFES + 1)]
+        response = self.api.get(f"{API}/menus/", params={"slugs": slugs})
+        self.assertEqual(response.status_code, 400)
+
+
+class OpenNowTests(TestCase):
+    def setUp(self):
+        self.day = make_cafe("Day Cafe")
+        self.night = make_cafe("Night Owl", opening_time=time(22), closing_time=time(2))
+        self.always = make_cafe("Always Open", opening_time=time(0), closing_time=time(0))
+
+    def open_at(self, moment):
+        return set(Cafe.objects.all().open_at(moment).values_list("name", flat=True))
+
+    def test_wrapping_hours_become_two_spans(self):
+        self.assertEqual(opening_spans(time(8), time(20)), [(480, 1200)])
+        self.assertEqual(opening_spans(time(22), time(2)), [(1320, 1440), (0, 120)])
+        self.assertEqual(opening_spans(time(6), time(6)), [(0, 1440)])
+
+    def test_open_at(self):
+        self.assertEqual(self.open_at(time(12)), {"Day Cafe", "Always Open"})
+        self.assertEqual(self.open_at(time(23, 30)), {"Night Owl", "Always Open"})
+        self.assertEqual(self.open_at(time(1, 59)), {"Night Owl", "Always Open"})
+        # Closing times are exclusive
+        self.assertEqual(self.open_at(time(2)), {"Always Open"})
+        self.assertEqual(self.open_at(time(20)), {"Always Open"})
+
+    def test_changed_hours_move_the_intervals(self):
+        self.day.closing_time = time(23)
+        self.day.save(update_fields=["closing_time"])
+        self.assertIn("Day Cafe", self.open_at(time(22, 30)))
+
+    def test_open_now_uses_the_local_time(self):
+        noon = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+        with mock.patch("cafes.managers.django_timezone.localtime", return_value=noon):
+            self.assertEqual(
+                set(Cafe.objects.open_now().values_list("name", flat=True)),
+                {"Day Cafe", "Always Open"},
+            )
+
+
+class SpatialIndexTests(SimpleTestCase):
+    def test_nearest_matches_a_full_scan(self):
+        index = SpatialIndex(Cafe, cell_degrees=0.5)
+        index.built = True
+        rng = random.Random(7)
+        points = {pk: (rng.uniform(50, 54), rng.uniform(-2, 2)) for pk in range(500)}
+        for pk, (lat, lng) in points.items():
+            index.insert(pk, lat, lng)
+        for lat, lng, radius_km in ((52.0, 0.0, None), (50.1, -1.9, 30), (60.0, 10.0, None)):
+            expected = sorted(
+                (haversine_km(lat, lng, plat, plng), pk) for pk, (plat, plng) in points.items()
+            )
+            if radius_km is not None:
+                expected = [hit for hit in expected if hit[0] <= radius_km]
+            hits = index.nearest(lat, lng, k=5, radius_km=radius_km)
+            self.assertEqual([pk for pk, _ in hits], [pk for _, pk in expected[:5]])
+
+    def test_longitudes_wrap_around(self):
+        index = SpatialIndex(Cafe, cell_degrees=1)
+        index.built = True
+        index.insert("east", 0, 179.9)
+        index.insert("far", 0, 170)
+        self.assertEqual(index.nearest(0, -179.9, k=1)[0][0], "east")
+
+
+class NearbyCafeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cafe_locations.built = False
+        self.addCleanup(setattr, cafe_locations, "built", False)
+
+    def test_nearest_active_cafes_first(self):
+        make_cafe("Far", latitude=51.6, longitude=0.0)
+        make_cafe("Near", latitude=51.51, longitude=0.0)
+        make_cafe("Closed", latitude=51.5, longitude=0.0, is_active=False)
+        make_cafe("Nowhere")
+        response = self.api.get(f"{API}/cafes/nearby/", params={"lat": 51.5, "lng": 0.0})
+        body = response.json()
+        self.assertEqual([cafe["name"] for cafe in body], ["Near", "Far"])
+        self.assertAlmostEqual(body[0]["distance_km"], 1.11, places=2)
+
+    def test_radius_and_saves_are_applied(self):
+        near = make_cafe("Near", latitude=51.51, longitude=0.0)
+        make_cafe("Far", latitude=51.6, longitude=0.0)
+        params = {"lat": 51.5, "lng": 0.0, "radius_km": 5}
+        names = [cafe["name"] for cafe in self.api.get(f"{API}/cafes/nearby/", params=params).json()]
+        self.assertEqual(names, ["Near"])
+        near.is_active = False
+        near.save()
+        self.assertEqual(self.api.get(f"{API}/cafes/nearby/", params=params).json(), [])
+
+    def test_copies_rebuild_after_a_change_in_another_process(self):
+        here = SpatialIndex(Cafe, cache_alias="default")
+        elsewhere = SpatialIndex(Cafe, cache_alias="default")
+        self.addCleanup(caches["default"].delete, here.generation_key)
+        near = make_cafe("Near", latitude=51.51, longitude=0.0)
+        self.assertEqual([pk for pk, _ in here.nearest(51.5, 0.0)], [near.pk])
+
+        # Saves made here keep this copy current
+        here.add(near)
+        with self.assertNumQueries(0):
+            here.nearest(51.5, 0.0)
+
+        nearer = make_cafe("Nearer", latitude=51.505, longitude=0.0)
+        elsewhere.add(nearer)
+        self.assertEqual([pk for pk, _ in here.nearest(51.5, 0.0)], [nearer.pk, near.pk])
+
+    def test_cafes_deactivated_elsewhere_are_not_listed(self):
+        make_cafe("Near", latitude=51.51, longitude=0.0)
+        params = {"lat": 51.5, "lng": 0.0}
+        self.assertEqual(len(self.api.get(f"{API}/cafes/nearby/", params=params).json()), 1)
+        # An update that sends no signals, like one made by another process
+        Cafe.objects.update(is_active=False)
+        self.assertEqual(self.api.get(f"{API}/cafes/nearby/", params=params).json(), [])
+
+    def test_k_is_bounded(self):
+        response = self.api.get(
+            f"{API}/cafes/nearby/", params={"lat": 0, "lng": 0, "k": MAX_NEARBY_CAFES + 1}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(APITestCase):
+    def assertRevalidates(self, path):
+        first = self.api.get(path)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["etag"]
+        response = self.api.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(response.content, b"")
+        response = self.api.get(path, headers={"If-None-Match": f"W/{etag}"})
+        self.assertEqual(response.status_code, 304)
+        response = self.api.get(
+            path, headers={"If-Modified-Since": first.headers["last-modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_cafe(self):
+        make_cafe()
+        etag = self.assertRevalidates(f"{API}/cafes/blue-door/")
+        self.api.patch(f"{API}/cafes/blue-door/", json={"location": "High Street"})
+        response = self.api.get(f"{API}/cafes/blue-door/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], etag)
+
+    def test_menu_item(self):
+        item = make_menu_item(make_cafe())
+        etag = self.assertRevalidates(f"{API}/menu-items/{item.pk}/")
+        self.api.patch(f"{API}/menu-items/{item.pk}/", json={"name": "Flat White"})
+        response = self.api.get(f"{API}/menu-items/{item.pk}/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Flat White")
+
+    def test_unknown_menu_item_is_404(self):
+        response = self.api.get(f"{API}/menu-items/999/", headers={"If-None-Match": '"x"'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_menu(self):
+        item = make_menu_item(make_cafe())
+        path = f"{API}/cafes/blue-door/menu-items/"
+        etag = self.assertRevalidates(path)
+        self.api.patch(f"{API}/menu-items/{item.pk}/", json={"price": 4})
+        response = self.api.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["price"], 4.0)
+
+
+def image_bytes(size=(800, 600), mode="RGB", format="PNG", **save) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format, **save)
+    return buffer.getvalue()
+
+
+class ThumbnailVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def variant(self, format, width):
+        return ThumbnailVariant(format=format, width=width)
+
+    def test_widths_never_upscale(self):
+        self.assertEqual(variant_widths(2000), [160, 320, 640, 1280])
+        self.assertEqual(variant_widths(500), [160, 320, 500])
+        self.assertEqual(variant_widths(100), [100])
+
+    def test_pick_the_narrowest_wide_enough_variant(self):
+        variants = [
+            self.variant(format, width) for format in ("webp", "jpeg") for width in (160, 320, 640)
+        ]
+        picked = ThumbnailVariant.pick(variants, width=300, format="jpeg")
+        self.assertEqual((picked.format, picked.width), ("jpeg", 320))
+        picked = ThumbnailVariant.pick(variants, width=1000)
+        self.assertEqual((picked.format, picked.width), ("webp", 640))
+        picked = ThumbnailVariant.pick(variants[:3], format="jpeg")
+        self.assertEqual((picked.format, picked.width), ("webp", 640))
+        self.assertIsNone(ThumbnailVariant.pick([]))
+
+    def test_rotated_sources_are_sized_as_shown(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        data = image_bytes((400, 200), format="JPEG", exif=exif)
+        sizes = {(width, height) for _, width, height, _ in render_variants(data)}
+        self.assertEqual(sizes, {(160, 320), (200, 400)})
+
+    def test_transparent_sources_render_to_jpeg(self):
+        data = image_bytes((200, 100), mode="RGBA")
+        formats = {format for format, *_ in render_variants(data)}
+        self.assertIn("jpeg", formats)
+
+    def test_generate_variants_replaces_the_previous_set(self):
+        cafe = make_cafe()
+        cafe.thumbnail.save("first.png", ContentFile(image_bytes((400, 300))))
+        first = cafe.thumbnail.name
+        written = generate_variants(cafe.pk, first)
+        self.assertEqual(written, 3 * len(supported_formats()))
+        self.assertEqual(generate_variants(cafe.pk, first), 0)
+        old_files = list(cafe.thumbnail_variants.values_list("file", flat=True))
+
+        cafe.thumbnail.save("second.png", ContentFile(image_bytes((200, 100))))
+        # A job queued for the replaced thumbnail does nothing
+        self.assertEqual(generate_variants(cafe.pk, first), 0)
+        generate_variants(cafe.pk, cafe.thumbnail.name)
+        self.assertEqual(
+            set(cafe.thumbnail_variants.values_list("source", flat=True)), {cafe.thumbnail.name}
+        )
+        storage = ThumbnailVariant._meta.get_field("file").storage
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+
+
+class ThumbnailUploadTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        # Variants are rendered by ThumbnailVariantTests
+        self.submit = self.enterContext(mock.patch.object(thumbnail_workers, "submit"))
+        make_cafe()
+
+    def upload(self, content, **kwargs):
+        return self.api.put(f"{API}/cafes/blue-door/thumbnail/", content=content, **kwargs)
+
+    def test_upload_and_duplicate(self):
+        data = image_bytes((64, 32))
+        response = self.upload(data, headers={"Content-Type": "image/jpeg"})
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(
+            (body["content_type"], body["width"], body["height"], body["size"]),
+            ("image/png", 64, 32, len(data)),
+        )
+        self.assertEqual(Cafe.objects.get().thumbnail.url, body["url"])
+        self.submit.assert_called_once()
+        response = self.upload(data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["duplicate"])
+        self.submit.assert_called_once()
+
+    def test_upload_refreshes_cached_menu_items(self):
+        item = make_menu_item(Cafe.objects.get())
+        self.api.get(f"{API}/menu-items/{item.pk}/")
+        url = self.upload(image_bytes()).json()["url"]
+        response = self.api.get(f"{API}/menu-items/{item.pk}/")
+        self.assertEqual(response.json()["cafe"]["thumbnail"], url)
+
+    def test_saves_that_keep_the_thumbnail_queue_nothing(self):
+        self.upload(image_bytes())
+        cafe = Cafe.objects.get()
+        cafe.name = "Renamed"
+        cafe.save()
+        Cafe.objects.get().save(update_fields=["name", "thumbnail"])
+        self.submit.assert_called_once()
+        cafe.thumbnail = ""
+        cafe.save()
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_declared_oversize_is_413(self):
+        with mock.patch("cafes.endpoints.MAX_UPLOAD_SIZE", 100):
+            response = self.upload(image_bytes())
+        self.assertEqual(response.status_code, 413)
+
+    def test_streamed_oversize_is_413(self):
+        def chunks():
+            yield image_bytes()[:64]
+            yield bytes(4096)
+
+        # A chunked body declares no Content-Length
+        with mock.patch("cafes.endpoints.MAX_UPLOAD_SIZE", 1024):
+            response = self.upload(chunks())
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Cafe.objects.get().thumbnail)
+
+    def test_non_image_is_415(self):
+        response = self.upload(b"GIF but not really", headers={"Content-Type": "image/gif"})
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.upload(b"tiny").status_code, 415)
+
+    def test_unreadable_image_is_400(self):
+        self.assertEqual(self.upload(b"\x89PNG\r\n\x1a\n" + bytes(64)).status_code, 400)
+
+    def test_empty_upload_is_400(self):
+        self.assertEqual(self.upload(b"").status_code, 400)
+
+
+class MenuDocumentTests(APITestCase):
+    def version(self, cafe):
+        return MenuDocument.objects.get(cafe=cafe).version
+
+    def test_new_cafes_get_a_document(self):
+        cafe = make_cafe()
+        self.assertEqual(self.version(cafe), 1)
+        self.assertEqual(json.loads(bytes(MenuDocument.objects.get(cafe=cafe).body)), [])
+
+    def test_one_rebuild_per_transaction(self):
+        cafe = make_cafe()
+        with transaction.atomic():
+            for name in ("Latte", "Mocha", "Tea"):
+                make_menu_item(cafe, name)
+            self.assertEqual(self.version(cafe), 1)
+        self.assertEqual(self.version(cafe), 2)
+        self.assertEqual(MenuDocument.objects.get(cafe=cafe).item_count, 3)
+
+    def test_a_rolled_back_transaction_does_not_swallow_later_rebuilds(self):
+        cafe = make_cafe()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_menu_item(cafe, "Latte")
+            make_menu_item(cafe, "Latte")
+        with transaction.atomic():
+            make_menu_item(cafe, "Mocha")
+        self.assertEqual(MenuDocument.objects.get(cafe=cafe).item_count, 1)
+
+    def test_moving_an_item_rebuilds_both_menus(self):
+        first, second = make_cafe(), make_cafe("Red Door")
+        item = MenuItem.objects.get(pk=make_menu_item(first).pk)
+        item.cafe = second
+        with CaptureQueriesContext(connection) as queries:
+            item.save()
+        # The cafe it moved from is known without reading the row again
+        self.assertTrue(queries[0]["sql"].startswith("UPDATE"))
+        self.assertEqual(MenuDocument.objects.get(cafe=first).item_count, 0)
+        self.assertEqual(MenuDocument.objects.get(cafe=second).item_count, 1)
+
+    def test_reads_never_write_documents(self):
+        cafe = make_cafe()
+        make_menu_item(cafe)
+        MenuDocument.objects.all().delete()
+        response = self.api.get(f"{API}/cafes/blue-door/menu-items/")
+        self.assertEqual([item["name"] for item in response.json()], ["Latte"])
+        self.assertNotIn("etag", response.headers)
+        response = self.api.get(
+            f"{API}/cafes/blue-door/menu-items/", headers={"If-None-Match": '"x"'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(MenuDocument.objects.exists())
+
+    def test_unknown_cafe_is_404(self):
+        self.assertEqual(self.api.get(f"{API}/cafes/nowhere/menu-items/").status_code, 404)
+
+    def test_backfill_builds_missing_documents(self):
+        first, second = make_cafe(), make_cafe("Red Door")
+        MenuDocument.objects.filter(cafe=second).delete()
+        out = io.StringIO()
+        call_command("build_menu_documents", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Built 1 menu document(s).")
+        self.assertEqual((self.version(first), self.version(second)), (1, 1))
+
+
+class LargeTableAdminTests(TestCase):
+    changelist = "/admin/cafes/menuitem/"
+
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin_user)
+        blue, red = make_cafe("Blue Door"), make_cafe("Red Door")
+        for number in range(23):
+            make_menu_item(blue if number % 2 else red, f"Item {number:02d}")
+
+    def test_keyset_pages_list_every_row_once(self):
+        names, path, pages = [], self.changelist, 0
+        while path:
+            changelist = self.client.get(path).context["cl"]
+            names += [item.name for item in changelist.result_list]
+            path = changelist.next_page_url and self.changelist + changelist.next_page_url
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(names), [f"Item {number:02d}" for number in range(23)])
+        self.assertEqual(len(set(names)), 23)
+
+    def test_rows_load_only_the_listed_fields(self):
+        changelist = self.client.get(self.changelist).context["cl"]
+        item = changelist.result_list[0]
+        self.assertIn("description", item.get_deferred_fields())
+        with self.assertNumQueries(0):
+            item.cafe.name
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_counts_are_capped(self):
+        response = self.client.get(self.changelist)
+        changelist = response.context["cl"]
+        self.assertEqual((changelist.count_kind, changelist.result_count), ("capped", 5))
+        self.assertContains(response, "More than 5 menu items")
+
+    def test_search_by_prefix_across_the_cafe(self):
+        changelist = self.client.get(self.changelist, {"q": "Blue"}).context["cl"]
+        self.assertEqual({item.cafe.name for item in changelist.result_list}, {"Blue Door"})
+        changelist = self.client.get(self.changelist, {"q": "Item 0"}).context["cl"]
+        self.assertEqual(len(changelist.result_list), 10)
+        changelist = self.client.get(self.changelist, {"q": "tem"}).context["cl"]
+        self.assertEqual(len(changelist.result_list), 0)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.changelist, {"after": "not-a-cursor"})
+        self.assertRedirects(response, f"{self.changelist}?e=1", fetch_redirect_response=False)
+
+
+class SchemaTests(TestCase):
+    def test_migrations_match_the_models(self):
+        out = io.StringIO()
+        call_command("makemigrations", "--check", "--dry-run", stdout=out)
+
+    def test_access_path_indexes_exist(self):
+        for model in (Cafe, MenuItem):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                )
+            for index in model._meta.indexes:
+                with self.subTest(index=index.name):
+                    self.assertIn(index.name, constraints)
+                    self.assertEqual(
+                        constraints[index.name]["columns"],
+                        [model._meta.get_field(field).column for field in index.fields],
+                    )
@@ -0,0 +1,219 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import ExifTags, Image, ImageOps, features
+from .models import Cafe, ThumbnailVariant
+
+logger = logging.getLogger(__name__)
+
+# Pillow's save() format name for each variant format
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+SAVE_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "webp": {"method": 4},
+    "jpeg": {"optimize": True, "progressive": True},
+}
+
+
+def variant_widths(source_width: int) -> List[int]:
+    """
+    Configured widths narrower than the source, plus the source's own width
+    when it is narrower than the widest one. Nothing is upscaled.
+    """
+    widths = [width for width in settings.THUMBNAIL_WIDTHS if width < source_width]
+    if source_width < max(settings.THUMBNAIL_WIDTHS):
+        widths.append(source_width)
+    return widths
+
+
+def supported_formats() -> List[str]:
+    return [
+        name
+        for name in settings.THUMBNAIL_FORMATS
+        if name != "webp" or features.check("webp")
+    ]
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    if format == "jpeg" and image.mode == "RGBA":
+        # JPEG has no alpha channel: flatten onto white
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        PIL_FORMATS[format],
+        quality=settings.THUMBNAIL_QUALITY,
+        **SAVE_OPTIONS[format],
+    )
+    return buffer.getvalue()
+
+
+def render_variants(data: bytes) -> List[Tuple[str, int, int, bytes]]:
+    """
+    Resize an uploaded image into every configured width and format.
+    Returns `(format, width, height, encoded bytes)` tuples.
+    """
+    image = Image.open(io.BytesIO(data))
+    # Orientations 5-8 are stored rotated a quarter turn
+    rotated = image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8)
+    shown_width, shown_height = (image.height, image.width) if rotated else image.size
+    widths = variant_widths(shown_width)
+    # Let JPEG sources decode at a reduced scale that still covers the
+    # widest variant; other formats ignore this
+    target = (max(widths), max(1, max(widths) * shown_height // shown_width))
+    image.draft("RGB", target[::-1] if rotated else target)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    rendered = []
+    # Widest first, each step resized from the previous one, which is
+    # cheaper than going back to the full-size source every time
+    current = image
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        if current.width != width:
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for format in supported_formats():
+            rendered.append((format, width, height, encode(current, format)))
+    return rendered
+
+
+def variant_name(cafe: Cafe, format: str, width: int, data: bytes) -> str:
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+    return "%s/%s/%sw-%s.%s" % (
+        settings.THUMBNAIL_DIR, cafe.slug, width, digest, EXTENSIONS[format]
+    )
+
+
+def generate_variants(cafe_id: int, source: str) -> int:
+    """
+    Build the variants of cafe `cafe_id`'s thumbnail `source` and drop those
+    of any earlier thumbnail. Does nothing when the cafe's thumbnail has
+    changed again since the job was queued or the variants already exist.
+    Returns the number of variants written.
+    """
+    cafe = Cafe.objects.filter(pk=cafe_id).first()
+    if cafe is None or (cafe.thumbnail.name or "") != source:
+        return 0
+    variants = ThumbnailVariant.objects.filter(cafe=cafe)
+    if source and variants.filter(source=source).exists():
+        return 0
+
+    created = []
+    if source:
+        with cafe.thumbnail.open("rb") as upload:
+            data = upload.read()
+        storage = ThumbnailVariant._meta.get_field("file").storage
+        for format, width, height, encoded in render_variants(data):
+            name = variant_name(cafe, format, width, encoded)
+            # The name is a content hash, so an existing file is this one
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(encoded))
+            created.append(
+                ThumbnailVariant(
+                    cafe=cafe,
+                    source=source,
+                    format=format,
+                    width=width,
+                    height=height,
+                    size=len(encoded),
+                    file=name,
+                )
+            )
+
+    with transaction.atomic():
+        stale = list(variants.exclude(source=source).values_list("file", flat=True))
+        variants.exclude(source=source).delete()
+        ThumbnailVariant.objects.bulk_create(created, ignore_conflicts=True)
+    in_use = {variant.file.name for variant in created}
+    storage = ThumbnailVariant._meta.get_field("file").storage
+    for name in set(stale) - in_use:
+        storage.delete(name)
+    return len(created)
+
+
+class ThumbnailWorkers:
+    """
+    Background pool that renders thumbnail variants off the request path.
+
+    Resizing and encoding run inside Pillow's C code with the GIL released,
+    so a small thread pool keeps several cores busy. Jobs are queued once the
+    saving transaction commits; each thread holds its own database
+    connection, closed again once it goes stale.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.THUMBNAIL_WORKERS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="thumbnails"
+                )
+            return self._executor
+
+    def run(self, cafe_id: int, source: str) -> int:
+        close_old_connections()
+        try:
+            written = generate_variants(cafe_id, source)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.exception("Could not generate thumbnails of cafe %s", cafe_id)
+            raise
+        finally:
+            close_old_connections()
+        with self._lock:
+            self.completed += 1
+        return written
+
+    def submit(self, cafe_id: int, source: str) -> Future:
+        with self._lock:
+            self.submitted += 1
+        return self.executor.submit(self.run, cafe_id, source)
+
+    def schedule(self, cafe: Cafe) -> None:
+        """
+        Queue `cafe`'s current thumbnail once the surrounding transaction
+        (if any) commits, so the worker reads the saved row.
+        """
+        cafe_id, source = cafe.pk, cafe.thumbnail.name or ""
+        transaction.on_commit(lambda: self.submit(cafe_id, source))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+thumbnail_workers = ThumbnailWorkers()
+
+
+def thumbnail_stats() -> Dict[str, Any]:
+    return {
+        "workers": thumbnail_workers.workers,
+        "submitted": thumbnail_workers.submitted,
+        "completed": thumbnail_workers.completed,
+        "failed": thumbnail_workers.failed,
+        "formats": supported_formats(),
+        "widths": list(settings.THUMBNAIL_WIDTHS),
+    }
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
+from cafe_arna.admin_tables import LargeTableAdminMixin
 from .forms import UserAdminChangeForm, UserAdminCreationForm
 
 # Unregister the default user admin
@@ -10,7 +11,8 @@ admin.site.unregister(get_user_model())
 # Register your models here.
 User = get_user_model()
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
+    # Large-table mode: see cafe_arna.admin_tables
     # The forms to add and change user instances
     add_form = UserAdminCreationForm
     form = UserAdminChangeForm
@@ -33,8 +35,11 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('id', 'email', 'get_full_name', 'is_active', 'is_staff')
     list_display_links = ['email']
     list_filter = ('is_superuser', 'is_staff', 'is_active', 'groups')
-    search_fields = ('email', 'first_name', 'last_name')  # search by first and last name
+    search_fields = ('^email', '^first_name', '^last_name')  # search by email, first and last name prefix
     ordering = ('email',)
+    # Served by users.models.USER_EMAIL_INDEX, created by a DBA
+    keyset_ordering = ('email', 'id')
+    list_only = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff')
     list_per_page = 10
     filter_horizontal = ('groups', 'user_permissions',)
 
@@ -2,3 +2,9 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 # Create your models here.
+
+# The user admin pages by keyset on (email, id) (see users.admin). auth.User
+# belongs to django.contrib.auth, so no migration of this project may add
+# the index that serves it; on a large install a DBA creates it by hand:
+#     CREATE INDEX user_email_id_idx ON auth_user (email, id);
+USER_EMAIL_INDEX = models.Index(fields=['email', 'id'], name='user_email_id_idx')
@@ -1,3 +1,29 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from cafe_arna.utils import generate_username, save_with_generated_username
+
+User = get_user_model()
+
+
+class GenerateUsernameTests(TestCase):
+    def generate(self, full_name):
+        return generate_username(User(), full_name, User)
+
+    def test_initial_and_last_name_first(self):
+        self.assertEqual(self.generate("Ada Lovelace"), "alovelace")
+
+    def test_first_name_and_last_initial_next(self):
+        User.objects.create(username="alovelace")
+        self.assertEqual(self.generate("Ada Lovelace"), "adal")
+
+    def test_numbered_after_the_largest_number_in_use(self):
+        for username in ["alovelace", "adal", "ada2", "ada10", "adam99", "ada9x"]:
+            User.objects.create(username=username)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.generate("Ada Lovelace"), "ada11")
+
+    def test_save_with_generated_username(self):
+        User.objects.create(username="alovelace")
+        user = save_with_generated_username(User(email="ada@example.com"), "Ada Lovelace")
+        self.assertEqual(User.objects.get(pk=user.pk).username, "adal")